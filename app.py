@@ -1,15 +1,62 @@
 import os
-from flask import Flask, render_template, request, jsonify, send_from_directory
-import requests
-import google.generativeai as genai
+from flask import Flask, Request, render_template, request, jsonify, send_from_directory, Response, g
 from dotenv import load_dotenv
 import logging
-from newspaper import Article
+import importlib
 
 import re
 import io
-import PIL.Image
-from datetime import datetime # Added from teammate's imports, though not directly used in snippet provided by them
+import json
+import sqlite3
+import threading
+import time
+import hashlib
+import codecs
+import gzip
+import tempfile
+import random
+import math
+import uuid
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import warnings
+from datetime import datetime, timedelta, timezone # Added from teammate's imports, though not directly used in snippet provided by them
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from collections import OrderedDict, Counter, deque
+from functools import partial, lru_cache
+try:
+    import brotli # Optional: "br" responses for clients that accept them, gzip otherwise
+except ImportError:
+    brotli = None
+
+
+class LazyModule:
+    # Stands in for a heavy module until its first attribute access, which imports it (and the
+    # listed submodules). Workers boot and serve the dashboard and /api/news without paying for
+    # the AI, scraping and imaging stacks; the first request that needs one imports it.
+    def __init__(self, name, *submodules):
+        self._name = name
+        self._submodules = submodules
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            for submodule in self._submodules:
+                importlib.import_module(f"{self._name}.{submodule}")
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+requests = LazyModule("requests", "adapters")
+genai = LazyModule("google.generativeai")
+google_exceptions = LazyModule("google.api_core.exceptions")
+newspaper = LazyModule("newspaper")
+PIL = LazyModule("PIL", "Image", "ImageOps")
+np = LazyModule("numpy")
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,52 +68,1079 @@ NEWS_API_KEY = os.environ.get('NEWS_API_KEY')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') # Centralized, from .env
 FMP_API_KEY = os.environ.get('FMP_API_KEY')    
 
-GEMINI_API_URL = 'https://generativelanguage.googleapis.com' # From original
+GEMINI_API_URL = os.environ.get('GEMINI_API_URL', 'https://generativelanguage.googleapis.com') # From original
+# Upstream base URLs are overridable so bench/ can point the app at local stand-ins
+NEWS_API_BASE_URL = os.environ.get('NEWS_API_BASE_URL', 'https://newsapi.org/v2/')
+FMP_BASE_URL = os.environ.get('FMP_BASE_URL', 'https://financialmodelingprep.com/api/v3').rstrip('/')
 DEFAULT_COUNTRY = 'us'
 GLOBAL_TOPIC = 'economy OR business OR politics relevant to economy'
 DEFAULT_LOCAL_TOPIC = "Economy OR business OR finance"
 DEFAULT_PAGE_SIZE = 20
+MAX_BATCH_COMPANIES = 20 # Cap for /api/company_profiles
+UPSTREAM_MAX_WORKERS = int(os.environ.get('UPSTREAM_MAX_WORKERS', 16)) # Shared pool for Gemini/FMP fan-out
+# Ask for every profile field in one JSON response; per-field prompts only re-ask for what's missing
+GEMINI_CONSOLIDATED_PROMPTS = os.environ.get('GEMINI_CONSOLIDATED_PROMPTS', '1') != '0'
+
+# Buy/Wait/Sell signals: moves inside both neutral bands (or no stock data) are answered "Wait" locally;
+# model answers are memoized per ticker and bucketed day/month move. The percentages are divisors,
+# so zero or negative settings are clamped to a small positive band.
+RECOMMENDATION_MIN_PCT = 0.01
+RECOMMENDATION_NEUTRAL_DAY_PCT = max(RECOMMENDATION_MIN_PCT, float(os.environ.get('RECOMMENDATION_NEUTRAL_DAY_PCT', 1.0)))
+RECOMMENDATION_NEUTRAL_MONTH_PCT = max(RECOMMENDATION_MIN_PCT, float(os.environ.get('RECOMMENDATION_NEUTRAL_MONTH_PCT', 3.0)))
+RECOMMENDATION_MEMO_TTL = int(os.environ.get('RECOMMENDATION_MEMO_TTL', 900))
+RECOMMENDATION_MEMO_BUCKET_PCT = max(RECOMMENDATION_MIN_PCT, float(os.environ.get('RECOMMENDATION_MEMO_BUCKET_PCT', 2.0)))
+
+# On-disk cache (survives restarts). Defaults to Flask's instance folder.
+CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', os.path.join(app.instance_path, 'cache.sqlite3'))
+# Where every cache lives: "sqlite" (CACHE_DB_PATH, shared by the workers on one host), "redis"
+# (REDIS_URL, shared by every worker on every host) or "memory" (per process)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite').strip().lower()
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_KEY_PREFIX = os.environ.get('REDIS_KEY_PREFIX', 'econdecode')
+RESOLUTION_CACHE_TTL = int(os.environ.get('RESOLUTION_CACHE_TTL', 30 * 24 * 3600)) # company -> ticker/domain
+RESOLUTION_CACHE_NEGATIVE_TTL = int(os.environ.get('RESOLUTION_CACHE_NEGATIVE_TTL', 24 * 3600)) # PRIVATE/UNKNOWN answers
+RESOLUTION_CACHE_MAX_ENTRIES = int(os.environ.get('RESOLUTION_CACHE_MAX_ENTRIES', 5000))
+QUOTE_CACHE_TTL = int(os.environ.get('QUOTE_CACHE_TTL', 60)) # FMP quotes; historical closes are cached until the next UTC day
+MARKET_DATA_CACHE_MAX_ENTRIES = int(os.environ.get('MARKET_DATA_CACHE_MAX_ENTRIES', 2000))
+PRICE_HISTORY_DAYS = int(os.environ.get('PRICE_HISTORY_DAYS', 260)) # Daily closes kept per ticker (~1 year), also the first download
+SUMMARY_CACHE_TTL = int(os.environ.get('SUMMARY_CACHE_TTL', 7 * 24 * 3600)) # Parsed /api/gemini-summary results
+SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get('SUMMARY_CACHE_MAX_ENTRIES', 2000))
+
+# /api/chat answers for repeated questions: exact normalized matches, or near-duplicates by TF-IDF cosine similarity
+CHAT_CACHE_TTL = int(os.environ.get('CHAT_CACHE_TTL', 24 * 3600))
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', 1000))
+CHAT_CACHE_MIN_SIMILARITY = float(os.environ.get('CHAT_CACHE_MIN_SIMILARITY', 0.85))
+CHAT_CACHE_MAX_QUESTION_CHARS = int(os.environ.get('CHAT_CACHE_MAX_QUESTION_CHARS', 300)) # Longer messages (pasted articles) aren't cached
+
+# Watchlist profile snapshots: served immediately, rebuilt in the background once stale
+PROFILE_SNAPSHOT_FRESH_SECONDS = int(os.environ.get('PROFILE_SNAPSHOT_FRESH_SECONDS', 300))
+PROFILE_SNAPSHOT_TTL = int(os.environ.get('PROFILE_SNAPSHOT_TTL', 7 * 24 * 3600)) # Stale snapshots are still served while rebuilding
+PROFILE_SNAPSHOT_MAX_ENTRIES = int(os.environ.get('PROFILE_SNAPSHOT_MAX_ENTRIES', 1000))
+PROFILE_REFRESH_MAX_WORKERS = int(os.environ.get('PROFILE_REFRESH_MAX_WORKERS', 2))
+PROFILE_PUSH_POLL_SECONDS = float(os.environ.get('PROFILE_PUSH_POLL_SECONDS', 5)) # How often open streams check for rebuilt snapshots
+# Each Flask push stream holds a worker thread, so they are off unless the server is threaded; the
+# dashboard polls instead. asgi_app.py streams don't hold threads and ignore both settings.
+PROFILE_PUSH_MAX_STREAMS = int(os.environ.get('PROFILE_PUSH_MAX_STREAMS', 0)) # Per process
+PROFILE_PUSH_MAX_SECONDS = float(os.environ.get('PROFILE_PUSH_MAX_SECONDS', 300)) # Then an "end" event closes the stream
+
+# HTTP caching and compression of API responses
+NEWS_RESPONSE_MAX_AGE = int(os.environ.get('NEWS_RESPONSE_MAX_AGE', 60)) # Browsers reuse an /api/news page this long before revalidating
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_COMPRESS_LEVEL = int(os.environ.get('GZIP_COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5)) # 11 is far slower for a few % more
+
+# Background news ingestion: /api/news pages are served from a local store the worker keeps fresh
+NEWS_DB_PATH = os.environ.get('NEWS_DB_PATH', os.path.join(app.instance_path, 'news.sqlite3'))
+NEWS_INGEST_INTERVAL = int(os.environ.get('NEWS_INGEST_INTERVAL', 900)) # Seconds between polls of each feed
+NEWS_INGEST_PAGES = int(os.environ.get('NEWS_INGEST_PAGES', 1)) # NewsAPI pages (of 100) per feed per poll
+NEWS_STORE_MAX_AGE_DAYS = int(os.environ.get('NEWS_STORE_MAX_AGE_DAYS', 7))
+NEWS_FEED_IDLE_INTERVALS = int(os.environ.get('NEWS_FEED_IDLE_INTERVALS', 4)) # Polling stops after this many intervals without a request
+NEWS_COLD_FEED_RETRY_SECONDS = int(os.environ.get('NEWS_COLD_FEED_RETRY_SECONDS', 30)) # A failed first ingest is retried after this, not a whole interval
+
+# Background summary warming for the top headlines of each freshly ingested feed
+PRESUMMARIZE_TOP_N = int(os.environ.get('PRESUMMARIZE_TOP_N', 5)) # Articles per feed per ingest (0 disables)
+PRESUMMARIZE_MAX_WORKERS = int(os.environ.get('PRESUMMARIZE_MAX_WORKERS', 2)) # Separate from UPSTREAM_EXECUTOR
+PRESUMMARIZE_GEMINI_BUDGET_PER_HOUR = int(os.environ.get('PRESUMMARIZE_GEMINI_BUDGET_PER_HOUR', 40))
+
+# Article scraping (summary path and bulk pre-summarization)
+SCRAPE_TIMEOUT = float(os.environ.get('SCRAPE_TIMEOUT', 7))
+SCRAPE_MAX_WORKERS = int(os.environ.get('SCRAPE_MAX_WORKERS', 8)) # Batch scraping pool
+SCRAPE_PER_DOMAIN_CONCURRENCY = int(os.environ.get('SCRAPE_PER_DOMAIN_CONCURRENCY', 2))
+SCRAPE_PER_DOMAIN_MIN_INTERVAL = float(os.environ.get('SCRAPE_PER_DOMAIN_MIN_INTERVAL', 1.0)) # Seconds between requests to one publisher
+SCRAPE_FRESH_SECONDS = int(os.environ.get('SCRAPE_FRESH_SECONDS', 15 * 60)) # Served without revalidation
+SCRAPE_CACHE_TTL = int(os.environ.get('SCRAPE_CACHE_TTL', 2 * 24 * 3600)) # Kept for ETag/Last-Modified revalidation
+SCRAPE_CACHE_MAX_ENTRIES = int(os.environ.get('SCRAPE_CACHE_MAX_ENTRIES', 500))
+SCRAPE_MAX_BYTES = int(os.environ.get('SCRAPE_MAX_BYTES', 3 * 1024 * 1024))
+
+# Product image analysis: uploads are downscaled before Gemini sees them, and identifications are
+# cached by perceptual hash so rescans of the same product skip the multimodal call
+PRODUCT_IMAGE_MAX_DIMENSION = int(os.environ.get('PRODUCT_IMAGE_MAX_DIMENSION', 768)) # Longest side, pixels
+PRODUCT_IMAGE_JPEG_QUALITY = int(os.environ.get('PRODUCT_IMAGE_JPEG_QUALITY', 85))
+PRODUCT_IMAGE_HASH_MAX_DISTANCE = int(os.environ.get('PRODUCT_IMAGE_HASH_MAX_DISTANCE', 6)) # Differing bits of 64
+PRODUCT_IMAGE_CACHE_TTL = int(os.environ.get('PRODUCT_IMAGE_CACHE_TTL', 30 * 24 * 3600))
+PRODUCT_IMAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PRODUCT_IMAGE_CACHE_MAX_ENTRIES', 2000))
+PRODUCT_IMAGE_MAX_PIXELS = int(os.environ.get('PRODUCT_IMAGE_MAX_PIXELS', 50_000_000)) # Larger images are rejected before decoding
+
+# Request bodies: anything over MAX_CONTENT_LENGTH is refused with a 413; file uploads beyond
+# UPLOAD_SPOOL_MEMORY_BYTES are spooled to a temp file instead of being held in memory
+MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+UPLOAD_SPOOL_MEMORY_BYTES = int(os.environ.get('UPLOAD_SPOOL_MEMORY_BYTES', 256 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+
+# Gemini client: every generate_content call goes through GeminiClient's limits
+GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 8)) # In-flight calls across the process
+GEMINI_ENDPOINT_MAX_CONCURRENCY = int(os.environ.get('GEMINI_ENDPOINT_MAX_CONCURRENCY', 4)) # Per endpoint (chat, summary, ...)
+GEMINI_RATE_PER_MINUTE = float(os.environ.get('GEMINI_RATE_PER_MINUTE', 60)) # Match the project's RPM quota
+GEMINI_RATE_BURST = int(os.environ.get('GEMINI_RATE_BURST', 10))
+GEMINI_CALL_DEADLINE = float(os.environ.get('GEMINI_CALL_DEADLINE', 30)) # Seconds per call, queueing and retries included
+GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 3))
+GEMINI_BACKOFF_BASE = float(os.environ.get('GEMINI_BACKOFF_BASE', 0.5))
+GEMINI_BACKOFF_MAX = float(os.environ.get('GEMINI_BACKOFF_MAX', 8))
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('GEMINI_BREAKER_FAILURE_THRESHOLD', 5)) # Consecutive transient failures
+GEMINI_BREAKER_RESET_SECONDS = float(os.environ.get('GEMINI_BREAKER_RESET_SECONDS', 30))
+GEMINI_HEALTH_CHECK_TIMEOUT = float(os.environ.get('GEMINI_HEALTH_CHECK_TIMEOUT', 10)) # The startup models.get check
+GEMINI_INIT_WAIT_SECONDS = float(os.environ.get('GEMINI_INIT_WAIT_SECONDS', 15)) # AI requests arriving during startup wait this long, then 503
+
+# Configure logging. Every line carries the trace ID of the request it belongs to ("-" outside requests).
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:[%(trace_id)s] %(message)s")
+TRACE_ID = contextvars.ContextVar('trace_id', default='-')
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = TRACE_ID.get()
+        return True
+
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(TraceIdFilter())
+
+# --- Metrics ---
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def format_metric_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+class Metrics:
+    # Minimal in-process Prometheus registry: counters and fixed-bucket latency histograms,
+    # keyed by metric name and label set. Rendered by /metrics in the text exposition format.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {} # (name, labels) -> value
+        self.histograms = {} # (name, labels) -> [per-bucket counts, sum, count]
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def span(self, upstream, operation):
+        # Times one upstream call; exceptions are counted as errors and re-raised.
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("econdecode_upstream_errors_total", upstream=upstream, operation=operation)
+            raise
+        finally:
+            self.observe("econdecode_upstream_duration_seconds", time.perf_counter() - start, upstream=upstream, operation=operation)
+
+    def render(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, [list(h[0]), h[1], h[2]]) for key, h in self.histograms.items())
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_metric_labels(labels)} {value}")
+        for (name, labels), (buckets, total, count) in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', bound),))} {bucket_count}")
+            lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_metric_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_metric_labels(labels)} {count}")
+        return lines
+
+METRICS = Metrics()
+
+
+@app.before_request
+def start_request_trace():
+    # Reuse an upstream proxy's request ID when there is one, so logs line up across hops
+    g.request_started = time.perf_counter()
+    g.trace_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])[:64]
+    TRACE_ID.set(g.trace_id)
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched" # Raw paths would explode label cardinality
+    if 'request_started' in g: # Streaming responses are timed to their first byte
+        METRICS.observe("econdecode_http_request_duration_seconds", time.perf_counter() - g.request_started, route=route, method=request.method)
+    METRICS.inc("econdecode_http_requests_total", route=route, method=request.method, status=response.status_code)
+    response.headers['X-Request-ID'] = g.get('trace_id', '-')
+    return response
+
+
+# --- HTTP Caching & Compression ---
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html", "text/plain", "text/css", "application/javascript"}
+
+def response_etag(version):
+    # `version` describes the underlying data plus every request argument that shapes the body
+    return hashlib.sha1(repr(version).encode("utf-8")).hexdigest()[:32]
+
+def http_last_modified(timestamp):
+    return datetime.fromtimestamp(int(timestamp), timezone.utc) if timestamp else None
+
+def client_copy_current(if_none_match, if_modified_since, etag, last_modified):
+    # RFC 9110: If-None-Match wins when present; If-Modified-Since is only a fallback
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    return bool(last_modified and if_modified_since and last_modified <= if_modified_since)
+
+def conditional_response(version, last_modified, build, cache_control):
+    # Answers a conditional GET without building the body when the client's copy is current.
+    # The ETag is weak because compression changes the bytes but not the meaning.
+    etag = response_etag(version)
+    last_modified = http_last_modified(last_modified)
+    not_modified = client_copy_current(request.if_none_match, request.if_modified_since, etag, last_modified)
+    response = Response(status=304) if not_modified else build()
+    if response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.after_request
+def compress_response(response):
+    # gzip (or brotli, when installed and accepted) for buffered text responses; streams and files pass through
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    if brotli and request.accept_encodings['br']:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_COMPRESS_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+# --- Gemini Client ---
+class GeminiUnavailableError(Exception):
+    # Raised without calling Gemini: circuit open, or no slot/token before the deadline.
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token and returns 0 if one is available, else the seconds until one will be.
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def acquire(self, deadline):
+        # Blocks until a token is available; False if that would be after `deadline` (monotonic).
+        while True:
+            wait_for = self.reserve()
+            if wait_for == 0:
+                return True
+            if time.monotonic() + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `reset_seconds` one trial call
+    # is let through (half-open) and its outcome closes or re-opens the circuit.
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None # A trial that never reports back is retried after reset_seconds
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_seconds and (self.trial_started_at is None or now - self.trial_started_at >= self.reset_seconds):
+                self.trial_started_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def release_trial(self):
+        # For a call that ended without telling us whether Gemini is up (an unexpected error, a
+        # cancellation): frees a half-open trial slot for the next caller instead of holding it for reset_seconds
+        with self.lock:
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_started_at = None
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logging.warning(f"Gemini circuit opened after {self.failures} consecutive failures.")
+                self.opened_at = time.monotonic()
+
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+
+@lru_cache(maxsize=None)
+def gemini_retryable_errors():
+    # A function so the SDK's exception classes are only imported once Gemini is in use
+    return (
+        google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError, google_exceptions.DeadlineExceeded, google_exceptions.GatewayTimeout,
+        requests.exceptions.ConnectionError, requests.exceptions.Timeout, TimeoutError, ConnectionError
+    )
+
+@lru_cache(maxsize=None)
+def gemini_answered_errors():
+    # Gemini answered, just not usefully (bad request, blocked prompt): it is up
+    return (google_exceptions.InvalidArgument, genai.types.BlockedPromptException)
+
+@lru_cache(maxsize=None)
+def gemini_auth_errors():
+    # A revoked or misconfigured key: not worth retrying, but every call will fail until it is fixed
+    return (google_exceptions.PermissionDenied, google_exceptions.Unauthenticated)
+
+class BreakerTrackedStream:
+    # A streaming GenerateContentResponse whose mid-stream transport and auth errors are recorded
+    # by the client's breaker; everything else (prompt_feedback, ...) is the wrapped response's
+    def __init__(self, response, client, endpoint):
+        self.response = response
+        self.client = client
+        self.endpoint = endpoint
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __iter__(self):
+        try:
+            yield from self.response
+        except (*gemini_retryable_errors(), *gemini_auth_errors()) as e:
+            self.client.record_stream_failure(self.endpoint, e)
+            raise
+
+class GeminiClient:
+    # Drop-in wrapper for the GenerativeModel: generate_content() takes an extra endpoint= label and
+    # goes through the global and per-endpoint semaphores, the token bucket, a deadline, jittered
+    # exponential backoff on retryable errors, and the circuit breaker. Streaming calls hold their
+    # slot until the stream is open. Anything else (model_name, ...) is the wrapped model's.
+    def __init__(self, model):
+        self.model = model
+        self.global_slots = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+        self.endpoint_slots = {}
+        self.bucket = TokenBucket(GEMINI_RATE_PER_MINUTE, GEMINI_RATE_BURST)
+        self.breaker = CircuitBreaker(GEMINI_BREAKER_FAILURE_THRESHOLD, GEMINI_BREAKER_RESET_SECONDS)
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def _endpoint_semaphore(self, endpoint):
+        with self.lock:
+            if endpoint not in self.endpoint_slots:
+                self.endpoint_slots[endpoint] = threading.BoundedSemaphore(GEMINI_ENDPOINT_MAX_CONCURRENCY)
+            return self.endpoint_slots[endpoint]
+
+    def _reject(self, endpoint, reason):
+        self._count("rejected")
+        logging.warning(f"Gemini call for '{endpoint}' rejected: {reason}")
+        raise GeminiUnavailableError(f"AI service is temporarily unavailable ({reason}).")
+
+    def generate_content(self, *args, endpoint="default", deadline=None, **kwargs):
+        deadline_at = time.monotonic() + (deadline or GEMINI_CALL_DEADLINE)
+        if not self.breaker.allow():
+            self._reject(endpoint, "circuit open")
+        endpoint_slot = self._endpoint_semaphore(endpoint)
+        if not endpoint_slot.acquire(timeout=max(0, deadline_at - time.monotonic())):
+            self._reject(endpoint, "too many concurrent requests")
+        try:
+            if not self.global_slots.acquire(timeout=max(0, deadline_at - time.monotonic())):
+                self._reject(endpoint, "too many concurrent requests")
+            try:
+                return self._call_with_retries(endpoint, deadline_at, args, kwargs)
+            finally:
+                self.global_slots.release()
+        finally:
+            endpoint_slot.release()
+
+    def _call_with_retries(self, endpoint, deadline_at, args, kwargs):
+        request_options = dict(kwargs.pop("request_options", None) or {})
+        request_options.setdefault("retry", None) # This loop does the retrying; the SDK's own retry ignores the deadline
+        caller_timeout = request_options.get("timeout")
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            if not self.bucket.acquire(deadline_at):
+                self._reject(endpoint, "rate limit")
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self._reject(endpoint, "deadline exceeded")
+            self._count("calls")
+            try:
+                with METRICS.span("gemini", endpoint):
+                    timeout = min(caller_timeout, remaining) if isinstance(caller_timeout, (int, float)) else remaining
+                    response = self.model.generate_content(*args, request_options={**request_options, "timeout": timeout}, **kwargs)
+            except gemini_retryable_errors() as e:
+                self.breaker.record_failure()
+                self._count("failures")
+                backoff = random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt))) # Full jitter
+                if attempt == GEMINI_MAX_RETRIES or time.monotonic() + backoff >= deadline_at or not self.breaker.allow():
+                    raise
+                logging.warning(f"Gemini '{endpoint}' call failed ({type(e).__name__}), retrying in {backoff:.2f}s.")
+                self._count("retries")
+                time.sleep(backoff)
+                continue
+            except gemini_answered_errors():
+                self.breaker.record_success()
+                raise
+            except gemini_auth_errors():
+                self.breaker.record_failure()
+                self._count("failures")
+                raise
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+            self.breaker.record_success()
+            return BreakerTrackedStream(response, self, endpoint) if kwargs.get("stream") else response
+
+    def record_stream_failure(self, endpoint, error):
+        # A streamed call counted as a success once it opened; a transport or auth error while reading it still counts
+        logging.warning(f"Gemini '{endpoint}' stream failed mid-response ({type(error).__name__}).")
+        self.breaker.record_failure()
+        self._count("failures")
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {**counters, "circuit": self.breaker.state()}
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 
 # --- API Initialization ---
+# The SDK import, configuration and a models.get health check run on the gemini-init thread,
+# started with the background workers, so a fresh worker serves the dashboard and /api/news
+# immediately. GEMINI_MODEL stays None until it is done; AI routes wait up to
+# GEMINI_INIT_WAIT_SECONDS for it and /readyz/ai reports when it is ready.
 GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
 GEMINI_MODEL = None
-if GEMINI_API_KEY:
+GEMINI_INIT_DONE = threading.Event()
+GEMINI_STATUS = {"state": "starting", "model": None, "error": None, "init_seconds": None}
+if not GEMINI_API_KEY:
+    logging.warning("GEMINI_API_KEY not set. AI features will not be available.")
+    GEMINI_STATUS["state"] = "disabled"
+    GEMINI_INIT_DONE.set()
+
+def check_gemini_model(model_name):
+    # models.get costs no quota and proves the key, the endpoint and the model name
+    genai.get_model(f"models/{model_name}", request_options={"timeout": GEMINI_HEALTH_CHECK_TIMEOUT})
+
+def init_gemini_model():
+    global GEMINI_MODEL, GEMINI_MODEL_NAME
+    started = time.perf_counter()
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        GEMINI_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        logging.info(f"Gemini model '{GEMINI_MODEL_NAME}' initialized.")
+        if GEMINI_API_URL.rstrip('/') != 'https://generativelanguage.googleapis.com':
+            # Custom endpoints (e.g. bench/fake_upstreams.py) only speak the REST transport
+            genai.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_URL})
+        else:
+            genai.configure(api_key=GEMINI_API_KEY)
+        model_name, health_error = GEMINI_MODEL_NAME, None
+        try:
+            check_gemini_model(model_name)
+        except google_exceptions.NotFound as e:
+            logging.error(f"Gemini model '{model_name}' not found. Trying gemini-pro. Error: {e}")
+            model_name = 'gemini-pro' # Fallback
+            check_gemini_model(model_name)
+        except gemini_retryable_errors() as e:
+            # Gemini unreachable right now: serve anyway, the client's retries and circuit breaker handle outages
+            health_error = e
+        GEMINI_MODEL_NAME = model_name
+        GEMINI_MODEL = GeminiClient(genai.GenerativeModel(model_name))
+        GEMINI_STATUS.update(state="degraded" if health_error else "ready", model=model_name, error=str(health_error) if health_error else None)
+        logging.info(f"Gemini model '{model_name}' initialized ({GEMINI_STATUS['state']}).")
     except Exception as e:
-        logging.error(f"Error initializing Gemini model '{GEMINI_MODEL_NAME}'. Trying gemini-pro. Error: {e}")
-        GEMINI_MODEL_NAME = 'gemini-pro' # Fallback
+        logging.error(f"Error initializing Gemini model '{GEMINI_MODEL_NAME}'. AI features unavailable. Error: {e}")
+        GEMINI_MODEL = None
+        GEMINI_STATUS.update(state="failed", error=str(e))
+    finally:
+        GEMINI_STATUS["init_seconds"] = round(time.perf_counter() - started, 3)
+        GEMINI_INIT_DONE.set()
+    # Import the rest of the lazily loaded stack now rather than on some user's first summary or scan
+    for module in (newspaper, PIL, np):
         try:
-             GEMINI_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME)
-             logging.info(f"Fallback Gemini model '{GEMINI_MODEL_NAME}' initialized.")
-        except Exception as e_pro:
-             logging.error(f"Error initializing fallback Gemini model '{GEMINI_MODEL_NAME}'. AI features unavailable. Error: {e_pro}")
-             GEMINI_MODEL = None
-else:
-    logging.warning("GEMINI_API_KEY not set. AI features will not be available.")
+            module.load()
+        except Exception as e:
+            logging.warning(f"Background import of {module._name} failed: {e}")
+
+
+# --- Concurrent Upstream Execution ---
+# One bounded pool shared by all requests, so a burst of profile lookups queues here
+# instead of opening an unbounded number of Gemini/FMP connections.
+UPSTREAM_EXECUTOR = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS, thread_name_prefix='upstream')
+
+def run_task_graph(tasks):
+    # tasks: {name: (func, [dependency names])}. Each func is called with the results of its
+    # dependencies (in the listed order) as soon as they are all available, so independent
+    # calls run in parallel and total latency is the longest dependency chain.
+    # Tasks must not call run_task_graph themselves (they would wait on the same pool).
+    for name, (_, deps) in tasks.items():
+        missing = [d for d in deps if d not in tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown task(s): {missing}")
+
+    results = {}
+    pending = dict(tasks)
+    running = {}
+    while pending or running:
+        ready = [name for name, (_, deps) in pending.items() if all(d in results for d in deps)]
+        for name in ready:
+            func, deps = pending.pop(name)
+            # copy_context() carries the trace ID into the worker thread's log lines
+            running[UPSTREAM_EXECUTOR.submit(contextvars.copy_context().run, func, *[results[d] for d in deps])] = name
+        if not running:
+            raise ValueError(f"Task graph has a dependency cycle: {sorted(pending)}")
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[running.pop(future)] = future.result()
+    return results
+
+def namespace_tasks(prefix, tasks):
+    # Prefixes task names (and dependencies on sibling tasks) so several copies of the same
+    # sub-graph can share one run_task_graph call. Dependencies outside `tasks` are kept as-is.
+    return {
+        f"{prefix}:{name}": (func, [f"{prefix}:{d}" if d in tasks else d for d in deps])
+        for name, (func, deps) in tasks.items()
+    }
+
+def task_results_for(prefix, results):
+    return {name.split(":", 1)[1]: value for name, value in results.items() if name.startswith(f"{prefix}:")}
+
+def is_tradable_ticker(ticker):
+    return bool(ticker) and ticker.upper() not in ["PRIVATE", "UNKNOWN", "N/A"]
+
+
+# --- Caching ---
+# Cache backends share one interface: get(key, default=CACHE_MISS), set(key, value, ttl), keys() and
+# stats(), with JSON-serializable values. make_cache picks one per CACHE_BACKEND.
+CACHE_MISS = object() # Lets callers cache None (e.g. "no domain") and still tell it apart from a miss
+
+class SQLiteTTLCache:
+    # Persistent key -> JSON value cache with per-entry TTL and LRU eviction. One table per cache,
+    # all sharing CACHE_DB_PATH. A single connection behind a lock keeps it safe for the upstream pool.
+    def __init__(self, path, table, max_entries):
+        self.table = table
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL") # Lets several gunicorn workers read while one writes
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            f"expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)")
+        self.conn.commit()
+
+    def get(self, key, default=CACHE_MISS):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            if row[1] <= now:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.conn.commit()
+                self.misses += 1
+                return default
+            self.conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now)
+            )
+            self.conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+            overflow = self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if overflow > 0: # Evict least recently used
+                self.conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+            self.conn.commit()
+
+    def keys(self):
+        # Unexpired keys, for callers that match on something other than key equality
+        with self.lock:
+            rows = self.conn.execute(f"SELECT key FROM {self.table} WHERE expires_at > ?", (time.time(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        with self.lock:
+            size = self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size, "max_entries": self.max_entries}
+
+
+class TTLCache:
+    # In-process counterpart of SQLiteTTLCache: an LRU dict with per-entry expiry. Values are kept
+    # as-is rather than JSON-encoded, so what get() returns is shared and must not be mutated.
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # key -> (expires_at, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=CACHE_MISS):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def keys(self):
+        now = time.time()
+        with self.lock:
+            return [key for key, (expires_at, _) in self.entries.items() if expires_at > now]
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "max_entries": self.max_entries}
+
+
+class RedisTTLCache:
+    # Shared counterpart of SQLiteTTLCache for several hosts. Each entry is a Redis string with its TTL
+    # (Redis expires it); a sorted set per table scores keys by last access for LRU eviction beyond
+    # max_entries. Redis being unreachable degrades to misses and unsaved entries rather than errors.
+    def __init__(self, url, table, max_entries):
+        import redis # Only needed with CACHE_BACKEND=redis
+        self.redis_errors = redis.exceptions.RedisError
+        self.client = redis.Redis.from_url(url)
+        self.entry_prefix = f"{REDIS_KEY_PREFIX}:{table}:entry:"
+        self.lru_key = f"{REDIS_KEY_PREFIX}:{table}:lru"
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=CACHE_MISS):
+        try:
+            raw = self.client.get(self.entry_prefix + key)
+            if raw is not None:
+                self.client.zadd(self.lru_key, {key: time.time()})
+        except self.redis_errors as e:
+            logging.warning(f"Redis cache read failed for {self.lru_key}: {e}")
+            raw = None
+        with self.lock:
+            if raw is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl):
+        try:
+            pipe = self.client.pipeline()
+            pipe.set(self.entry_prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.zcard(self.lru_key)
+            overflow = pipe.execute()[-1] - self.max_entries
+            if overflow > 0: # Evict least recently used
+                evicted = [k.decode() for k in self.client.zrange(self.lru_key, 0, overflow - 1)]
+                pipe = self.client.pipeline()
+                pipe.delete(*(self.entry_prefix + k for k in evicted))
+                pipe.zrem(self.lru_key, *evicted)
+                pipe.execute()
+        except self.redis_errors as e:
+            logging.warning(f"Redis cache write failed for {self.lru_key}: {e}")
+
+    def keys(self):
+        # Keys Redis already expired linger in the LRU index until seen here
+        try:
+            keys = [k.decode() for k in self.client.zrange(self.lru_key, 0, -1)]
+            pipe = self.client.pipeline()
+            for k in keys:
+                pipe.exists(self.entry_prefix + k)
+            live = [k for k, exists in zip(keys, pipe.execute()) if exists]
+            if len(live) < len(keys):
+                self.client.zrem(self.lru_key, *set(keys).difference(live))
+            return live
+        except self.redis_errors as e:
+            logging.warning(f"Redis cache scan failed for {self.lru_key}: {e}")
+            return []
+
+    def stats(self):
+        try:
+            size = self.client.zcard(self.lru_key)
+        except self.redis_errors:
+            size = None
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size, "max_entries": self.max_entries}
+
+
+def make_cache(table, max_entries):
+    # The cache named `table` on the configured CACHE_BACKEND
+    if CACHE_BACKEND == "redis":
+        return RedisTTLCache(REDIS_URL, table, max_entries)
+    if CACHE_BACKEND == "memory":
+        return TTLCache(max_entries)
+    return SQLiteTTLCache(CACHE_DB_PATH, table, max_entries)
+
+if CACHE_BACKEND not in ("sqlite", "redis", "memory"):
+    logging.warning(f"[-] Unknown CACHE_BACKEND '{CACHE_BACKEND}', using sqlite.")
+
+
+class SingleFlight:
+    # Coalesces concurrent calls for the same key: the first caller does the work and
+    # everyone else asking for that key meanwhile waits for (and shares) its result.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {} # key -> Future
+        self.coalesced = 0
+
+    def do_many(self, keys, fetch):
+        # fetch(keys_to_fetch) -> {key: value} is only called for keys nobody else is already fetching
+        keys = list(dict.fromkeys(keys))
+        leading, following = [], {}
+        with self.lock:
+            for key in keys:
+                if key in self.in_flight:
+                    following[key] = self.in_flight[key]
+                else:
+                    self.in_flight[key] = Future()
+                    leading.append(key)
+            self.coalesced += len(following)
+
+        results = {}
+        if leading:
+            futures = {key: self.in_flight[key] for key in leading}
+            try:
+                fetched = fetch(leading)
+                for key in leading:
+                    futures[key].set_result(fetched[key])
+            except BaseException as e:
+                for key in leading:
+                    if not futures[key].done():
+                        futures[key].set_exception(e)
+                raise
+            finally:
+                with self.lock:
+                    for key in leading:
+                        del self.in_flight[key]
+            results.update(fetched)
+        for key, future in following.items():
+            results[key] = future.result()
+        return results
+
+    def do(self, key, fetch):
+        return self.do_many([key], lambda keys: {key: fetch()})[key]
+
+    def lead_or_follow(self, key):
+        # For work that can't run inside do() (a streaming generator, a coroutine): returns
+        # (future, leading). The leader must settle the future and then call done(key).
+        with self.lock:
+            if key in self.in_flight:
+                self.coalesced += 1
+                return self.in_flight[key], False
+            future = self.in_flight[key] = Future()
+            return future, True
+
+    def done(self, key):
+        with self.lock:
+            self.in_flight.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.in_flight), "coalesced": self.coalesced}
+
+
+RESOLUTION_CACHE = make_cache('company_resolution', RESOLUTION_CACHE_MAX_ENTRIES)
+
+COMPANY_NAME_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+    "llc", "plc", "ag", "sa", "nv", "se", "group", "holdings"
+}
+
+def normalize_company_name(company_name):
+    # "Apple Inc.", "apple" and "APPLE" all map to "apple"
+    words = re.sub(r"[^a-z0-9&]+", " ", (company_name or "").lower()).split()
+    while len(words) > 1 and words[-1] in COMPANY_NAME_SUFFIXES:
+        words.pop()
+    if len(words) > 1 and words[0] == "the":
+        words.pop(0)
+    return " ".join(words)
+
+QUOTE_CACHE = make_cache('fmp_quotes', MARKET_DATA_CACHE_MAX_ENTRIES)
+# Symbol -> last stored day, until the next UTC day. It indexes PRICE_HISTORY, which is in this host's
+# CACHE_DB_PATH, so it stays beside it whatever CACHE_BACKEND says: a shared "refreshed today" marker
+# would make other hosts skip downloads their own store never got.
+HISTORICAL_CACHE = SQLiteTTLCache(CACHE_DB_PATH, 'fmp_historical', MARKET_DATA_CACHE_MAX_ENTRIES)
+MARKET_DATA_FLIGHTS = SingleFlight()
+
+class PriceHistoryStore:
+    # Daily closes per ticker. Persisted in SQLite, one row per symbol and day, so an update only
+    # inserts the new days; held in memory as NumPy arrays, oldest first: (dates as datetime64[D],
+    # closes as float64). Only the most recent `max_days` are kept per symbol.
+    def __init__(self, path, max_days, max_symbols):
+        self.max_days = max_days
+        self.max_symbols = max_symbols
+        self.arrays = OrderedDict() # SYMBOL -> (dates, closes) or None, LRU
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS price_history (symbol TEXT NOT NULL, date TEXT NOT NULL, "
+            "close REAL NOT NULL, PRIMARY KEY (symbol, date)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def series(self, symbol):
+        # (dates, closes) or None when nothing is stored for the symbol
+        with self.lock:
+            if symbol in self.arrays:
+                self.arrays.move_to_end(symbol)
+                return self.arrays[symbol]
+            rows = self.conn.execute("SELECT date, close FROM price_history WHERE symbol = ? ORDER BY date", (symbol,)).fetchall()
+            series = (np.array([r[0] for r in rows], dtype="datetime64[D]"), np.array([r[1] for r in rows], dtype=np.float64)) if rows else None
+            self.arrays[symbol] = series
+            if len(self.arrays) > self.max_symbols:
+                self.arrays.popitem(last=False)
+            return series
+
+    def last_date(self, symbol):
+        series = self.series(symbol)
+        return str(series[0][-1]) if series is not None else None
+
+    def merge(self, symbol, bars):
+        # Adds FMP {"date", "close"} bars (any order). Days already stored are overwritten, since
+        # the latest one may have been fetched intraday.
+        rows = [(symbol, str(bar["date"])[:10], float(bar["close"])) for bar in bars
+                if isinstance(bar, dict) and bar.get("date") and isinstance(bar.get("close"), (int, float))]
+        with self.lock:
+            if rows:
+                self.conn.executemany("INSERT OR REPLACE INTO price_history (symbol, date, close) VALUES (?, ?, ?)", rows)
+                self.conn.execute(
+                    "DELETE FROM price_history WHERE symbol = ? AND date NOT IN "
+                    "(SELECT date FROM price_history WHERE symbol = ? ORDER BY date DESC LIMIT ?)",
+                    (symbol, symbol, self.max_days)
+                )
+                self.conn.commit()
+            self.arrays.pop(symbol, None) # Reloaded on next use, which also picks up other workers' rows
+
+    def stats(self):
+        with self.lock:
+            symbols, rows = self.conn.execute("SELECT COUNT(DISTINCT symbol), COUNT(*) FROM price_history").fetchone()
+            return {"symbols": symbols, "rows": rows, "in_memory": len(self.arrays)}
+
+PRICE_HISTORY = PriceHistoryStore(CACHE_DB_PATH, PRICE_HISTORY_DAYS, MARKET_DATA_CACHE_MAX_ENTRIES)
+
+PRICE_RETURN_HORIZONS = {"return_1w": 5, "return_1m": 21, "return_3m": 63} # Trading days back
+TRADING_DAYS_PER_YEAR = 252
+
+def compute_price_analytics(series_list):
+    # Analytics for a list of (dates, closes) series (None entries allowed), in one vectorized pass:
+    # the series are right-aligned into a (series x days) matrix padded with NaN and every metric is
+    # a column operation over it. Returns a list of dicts in the same order (None for missing
+    # series); percentages are rounded to 2 places and are None where a series is too short.
+    present = [i for i, series in enumerate(series_list) if series is not None and len(series[1])]
+    results = [None] * len(series_list)
+    if not present:
+        return results
+    lengths = np.array([len(series_list[i][1]) for i in present])
+    width = int(lengths.max())
+    rows = np.repeat(np.arange(len(present)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(width - lengths, lengths)
+    closes = np.full((len(present), width), np.nan)
+    closes[rows, cols] = np.concatenate([series_list[i][1] for i in present])
+    dates = np.full((len(present), width), np.datetime64("NaT"), dtype="datetime64[D]")
+    dates[rows, cols] = np.concatenate([series_list[i][0] for i in present])
+
+    metrics = {}
+    last = closes[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # nan* reductions over all-NaN rows
+        for name, days in PRICE_RETURN_HORIZONS.items():
+            metrics[name] = (last / closes[:, -1 - days] - 1) * 100 if width > days else np.full(len(present), np.nan)
+        # Year to date: against the last close before January 1st of the current year
+        before_year = dates < np.datetime64(f"{datetime.now(timezone.utc).year}-01-01")
+        base_index = width - 1 - np.argmax(before_year[:, ::-1], axis=1)
+        metrics["return_ytd"] = np.where(before_year.any(axis=1), (last / closes[np.arange(len(present)), base_index] - 1) * 100, np.nan)
+        # Annualized volatility of the last 3 months of daily log returns
+        log_returns = np.diff(np.log(closes[:, -(PRICE_RETURN_HORIZONS["return_3m"] + 1):]), axis=1)
+        volatility = np.nanstd(log_returns, axis=1, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+        metrics["volatility_3m"] = np.where(np.sum(~np.isnan(log_returns), axis=1) >= 20, volatility, np.nan)
+        # Drawdowns from the running peak over the stored history
+        drawdowns = (closes / np.fmax.accumulate(closes, axis=1) - 1) * 100
+        metrics["drawdown"] = drawdowns[:, -1]
+        metrics["max_drawdown"] = np.nanmin(drawdowns, axis=1)
+        for days in (20, 50):
+            metrics[f"sma_{days}"] = closes[:, -days:].mean(axis=1) if width >= days else np.full(len(present), np.nan)
+
+    for row, i in enumerate(present):
+        analytics = {name: (round(float(values[row]), 2) if np.isfinite(values[row]) else None) for name, values in metrics.items()}
+        analytics["history_days"] = int(lengths[row])
+        analytics["as_of"] = str(series_list[i][0][-1])
+        results[i] = analytics
+    return results
+
+def watchlist_price_analytics(historicals):
+    # {SYMBOL: analytics or None} for fetch_fmp_historicals' results, all symbols in one pass
+    symbols = list(historicals)
+    return dict(zip(symbols, compute_price_analytics([historicals[t][0] for t in symbols])))
+
+def seconds_until_next_utc_day():
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max((tomorrow - now).total_seconds(), 60)
+
+def cached_market_data(kind, cache, ttl, symbols, fetch_uncached):
+    # Serves {SYMBOL: (data, error)} from `cache`; misses are fetched once across concurrent
+    # requests. Only successful results are cached, errors are shared but retried next time.
+    results, missing = {}, []
+    for t in symbols:
+        cached = cache.get(t)
+        if cached is CACHE_MISS:
+            missing.append(t)
+        else:
+            results[t] = (cached, None)
+
+    def fetch(keys):
+        fetched = fetch_uncached([key.split(":", 1)[1] for key in keys])
+        for t, (data, _) in fetched.items():
+            if data is not None:
+                cache.set(t, data, ttl() if callable(ttl) else ttl)
+        return {f"{kind}:{t}": result for t, result in fetched.items()}
+
+    if missing:
+        fetched = MARKET_DATA_FLIGHTS.do_many([f"{kind}:{t}" for t in missing], fetch)
+        results.update({key.split(":", 1)[1]: result for key, result in fetched.items()})
+    return results
+
+SUMMARY_CACHE = make_cache('article_summaries', SUMMARY_CACHE_MAX_ENTRIES)
+# Keyed like SUMMARY_CACHE. Values are (result, error, status, leader_specific); see summarize_article.
+SUMMARY_FLIGHTS = SingleFlight()
+ABANDONED_SUMMARY = (None, "The summary was abandoned before it finished.", 500, True) # A leading stream whose client left
+
+# Only names that are unambiguously tracking: generic ones like "cid" or "ref" are article IDs on some
+# publishers, and stripping them would merge distinct articles into one cache entry
+TRACKING_QUERY_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ocid", "cmpid", "igshid",
+    "_ga", "_gl", "ref_src", "smid", "smtyp", "guccounter", "guce_referrer", "guce_referrer_sig", "sr_share"
+}
+
+def canonicalize_article_url(url):
+    # Same article, same key: lowercase scheme/host, no fragment, default port, trailing slash,
+    # or tracking parameters (utm_*, fbclid, ...), remaining query params sorted.
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (scheme == "http" and parts.port == 80) and not (scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(("utm_", "ns_")) and k.lower() not in TRACKING_QUERY_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+def article_cache_key(url):
+    return hashlib.sha256(canonicalize_article_url(url).encode("utf-8")).hexdigest()
+
+def get_cached_resolution(kind, company_name):
+    return RESOLUTION_CACHE.get(f"{kind}:{normalize_company_name(company_name)}")
+
+def cache_resolution(kind, company_name, value, negative=False):
+    ttl = RESOLUTION_CACHE_NEGATIVE_TTL if negative else RESOLUTION_CACHE_TTL
+    RESOLUTION_CACHE.set(f"{kind}:{normalize_company_name(company_name)}", value, ttl)
 
 
 # --- Helper Functions (from Teammate's app.py, adapted) ---
+def clean_domain(raw_domain):
+    domain = raw_domain.strip().lower() if raw_domain else "unknown"
+    if domain == "unknown" or " " in domain or "." not in domain:
+        return None
+    return domain
+
+def clean_ticker(raw_ticker):
+    ticker = raw_ticker.strip().upper() if raw_ticker else "UNKNOWN"
+    if ' ' in ticker or len(ticker) > 10: # Basic cleanup if Gemini is verbose
+        if "PRIVATE" in ticker: return "PRIVATE"
+        # Try to extract a valid-looking ticker pattern
+        match = re.search(r'\b([A-Z0-9]{1,6}(\.[A-Z]{1,2})?)\b', ticker)
+        ticker = match.group(1) if match else "UNKNOWN"
+    return ticker
+
+def domain_prompt(company_name):
+    return f"What is the primary website domain for the company '{company_name}'? For example, for Starbucks, it's 'starbucks.com'. Respond with only the domain name. If unknown, respond 'UNKNOWN'."
+
+def ticker_prompt(company_name):
+    return f"What is the primary stock ticker symbol for '{company_name}'? Respond with ONLY the ticker (e.g., AAPL, MSFT, ADS.DE, 220630.KQ). If private/unknown, respond 'PRIVATE'."
+
 def get_company_domain_from_gemini(company_name):
+    cached = get_cached_resolution("domain", company_name)
+    if cached is not CACHE_MISS: return cached
     if not GEMINI_MODEL: return None
     try:
-        prompt = f"What is the primary website domain for the company '{company_name}'? For example, for Starbucks, it's 'starbucks.com'. Respond with only the domain name. If unknown, respond 'UNKNOWN'."
-        response = GEMINI_MODEL.generate_content(prompt)
-        domain = response.text.strip().lower() if response and hasattr(response, 'text') and response.text else "UNKNOWN"
-        if domain == "unknown" or " " in domain or "." not in domain:
-            return None
+        response = GEMINI_MODEL.generate_content(domain_prompt(company_name), endpoint="resolution")
+        domain = clean_domain(response.text if response and hasattr(response, 'text') and response.text else None)
+        cache_resolution("domain", company_name, domain, negative=domain is None)
         return domain
     except Exception as e:
         logging.error(f"Error getting domain for {company_name} from Gemini: {e}")
         return None
 
-def get_logo_url(company_name):
-    domain = get_company_domain_from_gemini(company_name)
+def logo_url_for_domain(domain):
     if domain:
         clearbit_url = f"https://logo.clearbit.com/{domain}"
         # You might want to add a check here to see if the logo actually exists
@@ -74,114 +1148,287 @@ def get_logo_url(company_name):
         return clearbit_url
     return None
 
-def get_ticker_from_gemini(company_name):
-    if not GEMINI_MODEL: return "UNKNOWN"
+def get_logo_url(company_name):
+    return logo_url_for_domain(get_company_domain_from_gemini(company_name))
+
+def lookup_ticker_with_gemini(company_name):
+    # (ticker, error): an error means the lookup itself failed, so its "UNKNOWN" is not a real "not public" answer
+    cached = get_cached_resolution("ticker", company_name)
+    if cached is not CACHE_MISS: return cached, None
+    if not GEMINI_MODEL: return "UNKNOWN", "AI model not available for ticker lookup."
     try:
-        prompt = f"What is the primary stock ticker symbol for '{company_name}'? Respond with ONLY the ticker (e.g., AAPL, MSFT, ADS.DE, 220630.KQ). If private/unknown, respond 'PRIVATE'."
-        response = GEMINI_MODEL.generate_content(prompt)
-        ticker = response.text.strip().upper() if response and hasattr(response, 'text') and response.text else "UNKNOWN"
-
-        if ' ' in ticker or len(ticker) > 10: # Basic cleanup if Gemini is verbose
-            if "PRIVATE" in ticker: return "PRIVATE"
-            # Try to extract a valid-looking ticker pattern
-            match = re.search(r'\b([A-Z0-9]{1,6}(\.[A-Z]{1,2})?)\b', ticker)
-            ticker = match.group(1) if match else "UNKNOWN"
+        response = GEMINI_MODEL.generate_content(ticker_prompt(company_name), endpoint="resolution")
+        ticker = clean_ticker(response.text if response and hasattr(response, 'text') and response.text else None)
         logging.info(f"Gemini ticker for {company_name}: {ticker}")
-        return ticker
+        cache_resolution("ticker", company_name, ticker, negative=not is_tradable_ticker(ticker))
+        return ticker, None
     except Exception as e:
-        logging.error(f"Gemini ticker error for {company_name}: {e}"); return "UNKNOWN"
+        logging.error(f"Gemini ticker error for {company_name}: {e}")
+        return "UNKNOWN", f"Error looking up ticker: {str(e)}"
+
+def get_ticker_from_gemini(company_name):
+    return lookup_ticker_with_gemini(company_name)[0]
 
 
-def get_enhanced_stock_data_from_fmp(ticker_symbol):
-    if not FMP_API_KEY:
-        return None, "FinancialModelingPrep API Key not configured."
-    if not ticker_symbol or ticker_symbol.upper() in ['PRIVATE', 'UNKNOWN', 'N/A']:
-        return None, "Ticker is not applicable or unknown for this company."
+def parse_gemini_json(text):
+    # Gemini sometimes wraps JSON in ```json fences even when asked not to.
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip(), flags=re.IGNORECASE)
+    return json.loads(cleaned)
 
-    stock_info = {}
-    error_messages = []
+def batch_resolution_prompt(company_names):
+    return (
+        "For each company below, give its primary stock ticker symbol (e.g., AAPL, MSFT, ADS.DE, 220630.KQ; "
+        "'PRIVATE' if private/unknown) and its primary website domain (e.g., 'starbucks.com'; 'UNKNOWN' if unknown). "
+        "Respond with ONLY a JSON object mapping each company name exactly as given to "
+        "{\"ticker\": \"...\", \"domain\": \"...\"}.\n"
+        + "\n".join(f"- {name}" for name in company_names)
+    )
 
-    # 1. Get current quote
-    quote_url = f"https://financialmodelingprep.com/api/v3/quote/{ticker_symbol}?apikey={FMP_API_KEY}"
-    try:
-        response = requests.get(quote_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data and isinstance(data, list) and len(data) > 0:
-            quote = data[0]
-            # Ensure the symbol matches, FMP can sometimes return data for a different symbol if the requested one is not found directly
-            if quote.get("symbol") and quote.get("symbol").upper() == ticker_symbol.upper():
-                stock_info["symbol"] = quote.get("symbol")
-                stock_info["price"] = quote.get("price")
-                stock_info["change"] = quote.get("change")
-                stock_info["change_percent"] = quote.get("changesPercentage")
-                stock_info["market_cap"] = quote.get("marketCap")
-                stock_info["name"] = quote.get("name") # Company name from FMP
-            else:
-                logging.warning(f"FMP quote symbol mismatch. Requested: {ticker_symbol}, Got: {quote.get('symbol')}")
-                error_messages.append(f"FMP quote data mismatch for {ticker_symbol}.")
-        elif isinstance(data, dict) and data.get("Error Message"):
-            error_messages.append(f"FMP API Error (quote): {data.get('Error Message')}")
+def apply_batch_resolution(response_text, company_names):
+    # Parses and caches a batch_resolution_prompt answer; returns {name: {"ticker", "domain"}} for the names it covered.
+    data = parse_gemini_json(response_text)
+    lookup = {str(k).strip().lower(): v for k, v in data.items() if isinstance(v, dict)} if isinstance(data, dict) else {}
+    resolved = {}
+    for name in company_names:
+        entry = lookup.get(name.strip().lower())
+        if entry:
+            ticker, domain = clean_ticker(entry.get("ticker")), clean_domain(entry.get("domain"))
+            cache_resolution("ticker", name, ticker, negative=not is_tradable_ticker(ticker))
+            cache_resolution("domain", name, domain, negative=domain is None)
+            resolved[name] = {"ticker": ticker, "domain": domain}
+    return resolved
+
+def resolve_companies_with_gemini(company_names):
+    # One prompt for the whole watchlist: {company_name: {"ticker": ..., "domain": ...}}, plus "ticker_error"
+    # for a single-company fallback lookup that failed.
+    # Cached companies are skipped; ones the model skips fall back to the single-company lookups.
+    resolved = {}
+    for name in company_names:
+        ticker, domain = get_cached_resolution("ticker", name), get_cached_resolution("domain", name)
+        if ticker is not CACHE_MISS and domain is not CACHE_MISS:
+            resolved[name] = {"ticker": ticker, "domain": domain}
+    to_resolve = [name for name in company_names if name not in resolved]
+
+    if GEMINI_MODEL and to_resolve:
+        try:
+            response = GEMINI_MODEL.generate_content(batch_resolution_prompt(to_resolve), endpoint="resolution")
+            resolved.update(apply_batch_resolution(response.text if response and hasattr(response, 'text') else None, to_resolve))
+        except Exception as e:
+            logging.error(f"Gemini batch ticker/domain resolution failed for {len(company_names)} companies: {e}")
+
+    for name in company_names:
+        if name not in resolved:
+            logging.info(f"Batch resolution missed '{name}', falling back to single lookups.")
+            ticker, ticker_error = lookup_ticker_with_gemini(name)
+            resolved[name] = {"ticker": ticker, "domain": get_company_domain_from_gemini(name), "ticker_error": ticker_error}
+    return resolved
+
+
+FMP_HISTORICAL_BATCH_SIZE = 5 # FMP caps comma-separated symbols on historical-price-full
+
+def fmp_quote_url(symbols):
+    return f"{FMP_BASE_URL}/quote/{','.join(symbols)}?apikey={FMP_API_KEY}"
+
+def parse_fmp_quotes(data, symbols):
+    if isinstance(data, dict) and data.get("Error Message"):
+        return {t: (None, f"FMP API Error (quote): {data.get('Error Message')}") for t in symbols}
+    # Only trust rows whose symbol matches a requested one, FMP can return data for a different symbol if the requested one is not found directly
+    quotes = {q.get("symbol").upper(): q for q in data if isinstance(q, dict) and q.get("symbol")} if isinstance(data, list) else {}
+    results = {}
+    for t in symbols:
+        if t in quotes:
+            results[t] = (quotes[t], None)
         else:
-             error_messages.append(f"No quote data or unexpected format from FMP for {ticker_symbol}.")
+            logging.warning(f"FMP quote missing for requested symbol {t}. Got: {list(quotes)}")
+            results[t] = (None, f"No quote data or unexpected format from FMP for {t}.")
+    return results
+
+def fetch_fmp_quotes_uncached(symbols):
+    # One /quote/ call for all symbols. Returns {SYMBOL: (quote dict, error message)}.
+    try:
+        with METRICS.span("fmp", "quote"):
+            response = requests.get(fmp_quote_url(symbols), timeout=10)
+            response.raise_for_status()
+            data = response.json()
+        return parse_fmp_quotes(data, symbols)
     except requests.exceptions.HTTPError as http_err:
-        logging.error(f"FMP quote HTTP error for {ticker_symbol}: {http_err}")
-        error_messages.append(f"Error fetching FMP quote (HTTP {http_err.response.status_code}).")
+        logging.error(f"FMP quote HTTP error for {symbols}: {http_err}")
+        return {t: (None, f"Error fetching FMP quote (HTTP {http_err.response.status_code}).") for t in symbols}
     except Exception as e:
-        logging.error(f"FMP quote general error for {ticker_symbol}: {e}")
-        error_messages.append(f"Error fetching FMP quote: {str(e)}")
+        logging.error(f"FMP quote general error for {symbols}: {e}")
+        return {t: (None, f"Error fetching FMP quote: {str(e)}") for t in symbols}
+
+
+def fetch_fmp_quotes(ticker_symbols):
+    symbols = list(dict.fromkeys(t.upper() for t in ticker_symbols))
+    return cached_market_data("quote", QUOTE_CACHE, QUOTE_CACHE_TTL, symbols, fetch_fmp_quotes_uncached)
+
+
+def fetch_fmp_quote(ticker_symbol):
+    # Returns (quote dict, error message). quote is None on failure.
+    return fetch_fmp_quotes([ticker_symbol])[ticker_symbol.upper()]
+
+
+def fmp_historical_url(symbols, since=None):
+    # FMP /historical-price-full/{symbols} gives daily bars, most recent first: the last
+    # PRICE_HISTORY_DAYS for symbols we have nothing stored for, else every day from `since` on.
+    window = f"from={since}" if since else f"timeseries={PRICE_HISTORY_DAYS}"
+    return f"{FMP_BASE_URL}/historical-price-full/{','.join(symbols)}?{window}&apikey={FMP_API_KEY}"
+
+def parse_fmp_historicals(data_hist, chunk):
+    # {SYMBOL: (bars, error)}. An empty list is a valid answer to an incremental request (no new days yet).
+    if isinstance(data_hist, dict) and data_hist.get("Error Message"):
+        return {t: (None, f"FMP API Error (historical): {data_hist.get('Error Message')}") for t in chunk}
+    # A single symbol comes back as {symbol, historical}; several as {historicalStockList: [...]}
+    stock_list = data_hist.get("historicalStockList", [data_hist]) if isinstance(data_hist, dict) else []
+    by_symbol = {str(item.get("symbol", "")).upper(): item.get("historical") for item in stock_list if isinstance(item, dict)}
+    return {t: (by_symbol[t] if isinstance(by_symbol.get(t), list) else [], None) for t in chunk}
+
+def price_history_requests(symbols):
+    # (url, chunk) pairs covering `symbols`, grouped by the last stored day so an update only downloads new bars
+    groups = {}
+    for t in symbols:
+        groups.setdefault(PRICE_HISTORY.last_date(t), []).append(t)
+    return [
+        (fmp_historical_url(group[i:i + FMP_HISTORICAL_BATCH_SIZE], since), group[i:i + FMP_HISTORICAL_BATCH_SIZE])
+        for since, group in groups.items() for i in range(0, len(group), FMP_HISTORICAL_BATCH_SIZE)
+    ]
+
+def apply_price_history_response(data_hist, chunk):
+    # Merges one historical-price-full response into PRICE_HISTORY. Returns {SYMBOL: (last stored day, error)}.
+    results = {}
+    for t, (bars, error) in parse_fmp_historicals(data_hist, chunk).items():
+        if error:
+            results[t] = (None, error)
+        else:
+            PRICE_HISTORY.merge(t, bars)
+            results[t] = (PRICE_HISTORY.last_date(t), None)
+    return results
+
+def refresh_price_history_uncached(symbols):
+    # Brings PRICE_HISTORY up to date for `symbols`. Returns {SYMBOL: (last stored day, error message)}.
+    results = {}
+    for url, chunk in price_history_requests(symbols):
+        try:
+            with METRICS.span("fmp", "historical"):
+                response_hist = requests.get(url, timeout=10)
+                response_hist.raise_for_status()
+                data_hist = response_hist.json()
+            results.update(apply_price_history_response(data_hist, chunk))
+        except requests.exceptions.HTTPError as http_err:
+            logging.error(f"FMP historical HTTP error for {chunk}: {http_err}")
+            results.update({t: (None, f"Error fetching FMP historical (HTTP {http_err.response.status_code}).") for t in chunk})
+        except Exception as e:
+            logging.error(f"FMP historical data general error for {chunk}: {e}")
+            results.update({t: (None, f"Error fetching FMP historical data: {str(e)}") for t in chunk})
+    return results
+
+def price_history_results(refreshed):
+    # {SYMBOL: ((dates, closes), error)} from refresh results. A stored series is used even when
+    # today's update failed; fewer than 22 closes can't give the 1-month change.
+    results = {}
+    for t, (_, error) in refreshed.items():
+        series = PRICE_HISTORY.series(t)
+        if series is not None and len(series[1]) >= 22:
+            results[t] = (series, None)
+        else:
+            results[t] = (None, error or "Not enough historical data from FMP for 1-month change calculation.")
+    return results
 
 
-    # 2. Get 1-month historical data for 1-month change %
-    # FMP /historical-price-full/{symbol}?timeseries=N gives last N trading days.
-    # The first item (index 0) is most recent, last item (index N-1) is oldest.
-    # We need data for approx 22 trading days for a month.
-    historical_url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{ticker_symbol}?timeseries=22&apikey={FMP_API_KEY}"
-    try:
-        response_hist = requests.get(historical_url, timeout=10)
-        response_hist.raise_for_status()
-        data_hist = response_hist.json()
-        
-        if data_hist and data_hist.get('historical') and isinstance(data_hist['historical'], list) and len(data_hist['historical']) >= 22:
-            historical_data = data_hist['historical']
-            latest_close_from_hist = historical_data[0].get('close') # Most recent trading day's close from historical
-            one_month_ago_close = historical_data[21].get('close') # ~1 month ago (22nd trading day back)
-
-            if stock_info.get("price") is None and latest_close_from_hist is not None:
-                # If live quote failed but historical gives a recent price, use it.
-                stock_info["price"] = latest_close_from_hist
-            
-            current_price_for_calc = stock_info.get("price") # Use live quote price if available, else historical
+def fetch_fmp_historicals(ticker_symbols):
+    # Returns {SYMBOL: ((dates, closes) oldest first, error message)}. HISTORICAL_CACHE remembers which
+    # symbols were already brought up to date today, so FMP is asked at most once per symbol per UTC day.
+    symbols = list(dict.fromkeys(t.upper() for t in ticker_symbols))
+    return price_history_results(cached_market_data("historical", HISTORICAL_CACHE, seconds_until_next_utc_day, symbols, refresh_price_history_uncached))
 
-            if current_price_for_calc is not None and one_month_ago_close is not None and one_month_ago_close != 0:
-                month_change_percent = ((current_price_for_calc - one_month_ago_close) / one_month_ago_close) * 100
-                stock_info["month_change_percent"] = round(month_change_percent, 2)
-            else:
-                error_messages.append("Could not calculate 1-month change (missing data or zero divisor).")
-        elif data_hist and isinstance(data_hist, dict) and data_hist.get("Error Message"):
-            error_messages.append(f"FMP API Error (historical): {data_hist.get('Error Message')}")
-        else:
-            error_messages.append("Not enough historical data from FMP for 1-month change calculation.")
 
-    except requests.exceptions.HTTPError as http_err:
-        logging.error(f"FMP historical HTTP error for {ticker_symbol}: {http_err}")
-        error_messages.append(f"Error fetching FMP historical (HTTP {http_err.response.status_code}).")
-    except Exception as e:
-        logging.error(f"FMP historical data general error for {ticker_symbol}: {e}")
-        error_messages.append(f"Error fetching FMP historical data: {str(e)}")
+def fetch_fmp_historical(ticker_symbol):
+    # Returns ((dates, closes) oldest first, error message). The series is None on failure.
+    return fetch_fmp_historicals([ticker_symbol])[ticker_symbol.upper()]
+
+
+def combine_fmp_stock_data(quote_result, historical_result, analytics=None):
+    # Merges the (quote, error) and (historical, error) pairs into (stock_info, error). Batch callers
+    # pass the series' compute_price_analytics result; otherwise it is computed here.
+    quote, quote_error = quote_result
+    historical_data, historical_error = historical_result
+    stock_info = {}
+    error_messages = [quote_error] if quote_error else []
+
+    # 1. Current quote
+    if quote:
+        stock_info["symbol"] = quote.get("symbol")
+        stock_info["price"] = quote.get("price")
+        stock_info["change"] = quote.get("change")
+        stock_info["change_percent"] = quote.get("changesPercentage")
+        stock_info["market_cap"] = quote.get("marketCap")
+        stock_info["name"] = quote.get("name") # Company name from FMP
+
+    # 2. 1-month change % from historical closes
+    if historical_data is not None:
+        closes = historical_data[1]
+        latest_close_from_hist = float(closes[-1]) # Most recent trading day's close from historical
+        one_month_ago_close = float(closes[-22]) # ~1 month ago (22nd trading day back)
+        stock_info["analytics"] = analytics if analytics is not None else compute_price_analytics([historical_data])[0]
+
+        if stock_info.get("price") is None and latest_close_from_hist is not None:
+            # If live quote failed but historical gives a recent price, use it.
+            stock_info["price"] = latest_close_from_hist
+
+        current_price_for_calc = stock_info.get("price") # Use live quote price if available, else historical
+
+        if current_price_for_calc is not None and one_month_ago_close is not None and one_month_ago_close != 0:
+            month_change_percent = ((current_price_for_calc - one_month_ago_close) / one_month_ago_close) * 100
+            stock_info["month_change_percent"] = round(month_change_percent, 2)
+        else:
+            error_messages.append("Could not calculate 1-month change (missing data or zero divisor).")
+    elif historical_error:
+        error_messages.append(historical_error)
 
     if not stock_info.get("price"): # If after all attempts, no price, then it's a failure for core data
         final_error = ". ".join(error_messages) if error_messages else "Failed to retrieve essential stock data."
         return None, final_error
-    
+
     # If we got here, stock_info has at least 'price'. Errors are secondary.
     return stock_info, ". ".join(error_messages) if error_messages else None
 
 
-def get_gemini_buy_wait_sell_recommendation(company_name, stock_data=None):
-    if not GEMINI_MODEL:
-        return "N/A", "AI model not available for recommendation."
+def stock_data_tasks(ticker_task):
+    # Graph nodes that fetch quote and history in parallel once `ticker_task` has resolved.
+    # Non-tradable tickers short-circuit to (None, None), matching the routes' old behaviour.
+    def fetch_if_tradable(fetch, ticker):
+        return fetch(ticker) if is_tradable_ticker(ticker) and FMP_API_KEY else (None, None)
+
+    def combine_if_tradable(ticker, quote_result, historical_result):
+        if not is_tradable_ticker(ticker):
+            return None, None
+        if not FMP_API_KEY:
+            return None, "FinancialModelingPrep API Key not configured."
+        return combine_fmp_stock_data(quote_result, historical_result)
+
+    return {
+        "quote": (partial(fetch_if_tradable, fetch_fmp_quote), [ticker_task]),
+        "historical": (partial(fetch_if_tradable, fetch_fmp_historical), [ticker_task]),
+        "stock": (combine_if_tradable, [ticker_task, "quote", "historical"]),
+    }
 
+
+def get_enhanced_stock_data_from_fmp(ticker_symbol):
+    if not FMP_API_KEY:
+        return None, "FinancialModelingPrep API Key not configured."
+    if not ticker_symbol or ticker_symbol.upper() in ['PRIVATE', 'UNKNOWN', 'N/A']:
+        return None, "Ticker is not applicable or unknown for this company."
+
+    tasks = {"ticker": (lambda: ticker_symbol, [])}
+    tasks.update(stock_data_tasks("ticker"))
+    return run_task_graph(tasks)["stock"]
+
+
+RECOMMENDATION_SIGNALS = ["Strong Buy", "Buy", "Wait", "Sell", "Strong Sell"]
+RECOMMENDATION_MEMO = make_cache('recommendation_memo', MARKET_DATA_CACHE_MAX_ENTRIES)
+
+def describe_stock_for_recommendation(stock_data):
     stock_info_str = "not publicly traded or stock data unavailable"
     if stock_data and stock_data.get('price') is not None: # Check for price specifically
         stock_info_str = (
@@ -190,8 +1437,57 @@ def get_gemini_buy_wait_sell_recommendation(company_name, stock_data=None):
         )
         if stock_data.get('month_change_percent') is not None:
             stock_info_str += f" Month's % change: {stock_data.get('month_change_percent')}%."
+    return stock_info_str
 
-    prompt = (
+
+def stock_move_percents(stock_data):
+    # (day %, month %) as floats, None where missing or unparseable
+    def percent(value):
+        try:
+            return float(str(value).strip().rstrip("%"))
+        except (TypeError, ValueError):
+            return None
+    stock_data = stock_data or {}
+    return percent(stock_data.get("change_percent")), percent(stock_data.get("month_change_percent"))
+
+def rule_based_recommendation(stock_data):
+    # Answers the cases the model would call "Wait" anyway, None when it has to be asked: no price
+    # (private, unknown or unavailable), or a move score under 1, the largest move in units of its neutral band.
+    if not stock_data or stock_data.get("price") is None:
+        return "Wait"
+    day, month = stock_move_percents(stock_data)
+    if day is None and month is None:
+        return "Wait"
+    score = max(abs(day or 0) / RECOMMENDATION_NEUTRAL_DAY_PCT, abs(month or 0) / RECOMMENDATION_NEUTRAL_MONTH_PCT)
+    return "Wait" if score < 1 else None
+
+def recommendation_memo_key(stock_data):
+    # "SYMBOL:day bucket:month bucket", so a memoized answer is reused while the stock stays in the same move range
+    symbol = (stock_data or {}).get("symbol")
+    if not symbol:
+        return None
+    buckets = [str(int(move // RECOMMENDATION_MEMO_BUCKET_PCT)) if move is not None else "-" for move in stock_move_percents(stock_data)]
+    return f"{symbol.upper()}:{':'.join(buckets)}"
+
+def settled_recommendation(stock_data):
+    # (signal, "rules" | "memo") without a model call, or (None, None) when the model has to be asked
+    recommendation = rule_based_recommendation(stock_data)
+    if recommendation:
+        return recommendation, "rules"
+    memo_key = recommendation_memo_key(stock_data)
+    recommendation = RECOMMENDATION_MEMO.get(memo_key) if memo_key else CACHE_MISS
+    return (None, None) if recommendation is CACHE_MISS else (recommendation, "memo")
+
+def remember_recommendation(stock_data, recommendation):
+    METRICS.inc("econdecode_recommendations_total", source="model")
+    memo_key = recommendation_memo_key(stock_data)
+    if memo_key and recommendation in RECOMMENDATION_SIGNALS:
+        RECOMMENDATION_MEMO.set(memo_key, recommendation, RECOMMENDATION_MEMO_TTL)
+
+
+def recommendation_prompt(company_name, stock_data):
+    stock_info_str = describe_stock_for_recommendation(stock_data)
+    return (
         f"Consider the company '{company_name}'. "
         f"Stock snapshot: {stock_info_str}. "
         f"Based on general market sentiment, recent major news (if any you are aware of for this company), "
@@ -201,73 +1497,205 @@ def get_gemini_buy_wait_sell_recommendation(company_name, stock_data=None):
         f"This is for a general audience and not financial advice. "
         f"If unsure or the situation is very neutral, respond 'Wait'."
     )
-    try:
-        generation_config = genai.types.GenerationConfig(temperature=0.5, max_output_tokens=10) # Small tokens for one phrase
-        response = GEMINI_MODEL.generate_content(prompt, generation_config=generation_config)
-        
-        recommendation = "Wait" # Default
-        if response and response.parts: # Check parts as per teammate's code structure
-            raw_text = "".join(part.text for part in response.parts if hasattr(part, 'text')).strip()
-            valid_signals = ["Strong Buy", "Buy", "Wait", "Sell", "Strong Sell"]
-            # Case-insensitive check for robustness, then use standardized casing
-            matched_signal = next((s for s in valid_signals if s.lower() == raw_text.lower()), None)
-            if matched_signal:
-                recommendation = matched_signal
-            else:
-                logging.warning(f"Gemini recommendation for {company_name} was not a standard signal: '{raw_text}'. Defaulting to Wait.")
-                # No need to explicitly set 'Wait' again, it's the default
-        elif response and response.prompt_feedback and response.prompt_feedback.block_reason:
-            logging.warning(f"Gemini recommendation for {company_name} blocked: {response.prompt_feedback.block_reason.name}")
-            return "N/A", f"AI content generation issue ({response.prompt_feedback.block_reason.name})."
+
+def recommendation_generation_config():
+    return genai.types.GenerationConfig(temperature=0.5, max_output_tokens=10) # Small tokens for one phrase
+
+def recommendation_from_response(company_name, response):
+    recommendation = "Wait" # Default
+    if response and response.parts: # Check parts as per teammate's code structure
+        raw_text = "".join(part.text for part in response.parts if hasattr(part, 'text')).strip()
+        # Case-insensitive check for robustness, then use standardized casing
+        matched_signal = next((s for s in RECOMMENDATION_SIGNALS if s.lower() == raw_text.lower()), None)
+        if matched_signal:
+            recommendation = matched_signal
         else:
-            logging.warning(f"Gemini recommendation for {company_name} produced no usable text. Full response: {response}")
-            # No need to explicitly set 'Wait' again
-            
-        return recommendation, None
+            logging.warning(f"Gemini recommendation for {company_name} was not a standard signal: '{raw_text}'. Defaulting to Wait.")
+            # No need to explicitly set 'Wait' again, it's the default
+    elif response and response.prompt_feedback and response.prompt_feedback.block_reason:
+        logging.warning(f"Gemini recommendation for {company_name} blocked: {response.prompt_feedback.block_reason.name}")
+        return "N/A", f"AI content generation issue ({response.prompt_feedback.block_reason.name})."
+    else:
+        logging.warning(f"Gemini recommendation for {company_name} produced no usable text. Full response: {response}")
+        # No need to explicitly set 'Wait' again
+    return recommendation, None
+
+def get_gemini_buy_wait_sell_recommendation(company_name, stock_data=None):
+    settled, source = settled_recommendation(stock_data)
+    if settled:
+        METRICS.inc("econdecode_recommendations_total", source=source)
+        return settled, None
+    if not GEMINI_MODEL:
+        return "N/A", "AI model not available for recommendation."
+    try:
+        response = GEMINI_MODEL.generate_content(
+            recommendation_prompt(company_name, stock_data), generation_config=recommendation_generation_config(), endpoint="insights"
+        )
+        recommendation, error = recommendation_from_response(company_name, response)
+        if not error:
+            remember_recommendation(stock_data, recommendation)
+        return recommendation, error
     except Exception as e:
         logging.error(f"Gemini recommendation error for {company_name}: {e}", exc_info=True)
         return "N/A", f"Error getting AI recommendation: {str(e)}"
 
 
-def get_watched_company_brief_from_gemini(company_name, stock_data=None):
-    if not GEMINI_MODEL: return {"error": "Gemini model not available."}
-    brief_data = {}
-    
-    recommendation, rec_error = get_gemini_buy_wait_sell_recommendation(company_name, stock_data)
-    brief_data["recommendation"] = recommendation
+def generate_insight_text(prompt_text, generation_config):
+    # (text, error) for one short free-text insight; failures still get the placeholder strings the cards filter out.
+    try:
+        return insight_text_from_response(GEMINI_MODEL.generate_content(prompt_text, generation_config=generation_config, endpoint="insights"))
+    except Exception as e:
+        text = f"Error fetching this insight. ({e})" # Match teammate's error format
+        return text, text
+
+def insight_text_from_response(response):
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        text = f"AI content issue ({response.prompt_feedback.block_reason.name})."
+        return text, text
+    elif response.parts: # Check parts as per teammate's code structure
+        full_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
+        if full_text.strip():
+            return full_text.strip(), None
+        return "AI is quiet on this one.", "AI returned no text for this insight."
+    else: # Teammate's code implies this case
+        return "AI gave an empty response.", "AI returned no text for this insight."
+
+
+def combined_insights_request(company_name, stock_data, prompts, generation_config, with_recommendation=True):
+    # (prompt, generation config) for one JSON-schema-constrained call covering every free-text field
+    # in `prompts`, plus the recommendation unless it is already settled.
+    fields = (["recommendation"] if with_recommendation else []) + list(prompts)
+    properties = {key: {"type": "string"} for key in prompts}
+    field_instructions = "\n".join(f'- "{key}": {prompt_text}' for key, prompt_text in prompts.items())
+    if with_recommendation:
+        properties = {"recommendation": {"type": "string", "enum": RECOMMENDATION_SIGNALS}, **properties}
+        field_instructions = (
+            f'- "recommendation": a very brief, simplified investment signal based on general market sentiment, recent major news '
+            f"and typical sector performance. One of {', '.join(RECOMMENDATION_SIGNALS)}. Not financial advice; if unsure or neutral, use Wait.\n"
+            f"{field_instructions}"
+        )
+    schema = {"type": "object", "properties": properties, "required": fields}
+    prompt = (
+        f"You are writing a short profile of the company '{company_name}' for young, non-expert readers. "
+        f"Stock snapshot: {describe_stock_for_recommendation(stock_data)}. "
+        f"Respond with a JSON object containing exactly these fields:\n"
+        f"{field_instructions}"
+    )
+    combined_config = genai.types.GenerationConfig(
+        temperature=generation_config.temperature,
+        max_output_tokens=generation_config.max_output_tokens * len(fields),
+        response_mime_type="application/json",
+        response_schema=schema,
+    )
+    return prompt, combined_config
+
+
+def combined_insights_from_response(company_name, response, prompts, with_recommendation=True):
+    # Returns only the fields that came back valid; the caller re-asks for the rest one by one.
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        logging.warning(f"Combined insights for {company_name} blocked: {response.prompt_feedback.block_reason.name}")
+        return {}
+    data = parse_gemini_json(response.text)
+    if not isinstance(data, dict):
+        return {}
+
+    valid = {}
+    recommendation = str(data.get("recommendation") or "").strip()
+    matched_signal = next((s for s in RECOMMENDATION_SIGNALS if s.lower() == recommendation.lower()), None)
+    if matched_signal and with_recommendation:
+        valid["recommendation"] = matched_signal
+    for key in prompts:
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            valid[key] = value.strip()
+    missing = [key for key in (["recommendation"] if with_recommendation else []) + list(prompts) if key not in valid]
+    if missing:
+        logging.info(f"Combined insights for {company_name} missing {missing}; asking for those separately.")
+    return valid
+
+
+def generate_combined_insights(company_name, stock_data, prompts, generation_config):
+    # A settled recommendation is left out of the call and filled in by combined_recommendation_or_fallback
+    with_recommendation = settled_recommendation(stock_data)[0] is None
+    prompt, combined_config = combined_insights_request(company_name, stock_data, prompts, generation_config, with_recommendation)
+    try:
+        response = GEMINI_MODEL.generate_content(prompt, generation_config=combined_config, endpoint="insights")
+        combined = combined_insights_from_response(company_name, response, prompts, with_recommendation)
+        if "recommendation" in combined:
+            remember_recommendation(stock_data, combined["recommendation"])
+        return combined
+    except Exception as e:
+        logging.warning(f"Combined insights for {company_name} failed, falling back to per-field prompts: {e}")
+        return {}
+
+
+def combined_recommendation_or_fallback(company_name, combined, stock):
+    if "recommendation" in combined:
+        return combined["recommendation"], None
+    return get_gemini_buy_wait_sell_recommendation(company_name, stock[0])
+
+
+def combined_insight_or_fallback(key, prompt_text, generation_config, combined):
+    if key in combined:
+        return combined[key], None
+    return generate_insight_text(prompt_text, generation_config)
+
+
+def insight_tasks(company_name, stock_task, prompts, generation_config):
+    # Graph nodes for a profile brief. Consolidated mode makes one structured call once stock data
+    # is in and only re-asks for missing fields; otherwise only the recommendation waits on stock
+    # data and the free-text prompts start immediately.
+    if GEMINI_CONSOLIDATED_PROMPTS:
+        tasks = {
+            "combined": (lambda stock: generate_combined_insights(company_name, stock[0], prompts, generation_config), [stock_task]),
+            "recommendation": (partial(combined_recommendation_or_fallback, company_name), ["combined", stock_task]),
+        }
+        for key, prompt_text in prompts.items():
+            tasks[key] = (partial(combined_insight_or_fallback, key, prompt_text, generation_config), ["combined"])
+        return tasks
+
+    tasks = {"recommendation": (lambda stock: get_gemini_buy_wait_sell_recommendation(company_name, stock[0]), [stock_task])}
+    for key, prompt_text in prompts.items():
+        tasks[key] = (partial(generate_insight_text, prompt_text, generation_config), [])
+    return tasks
+
+
+def assemble_insights(results, prompts):
+    recommendation, rec_error = results["recommendation"]
+    insights = {"recommendation": recommendation}
     if rec_error:
-        brief_data["recommendation_error"] = rec_error
+        insights["recommendation_error"] = rec_error
+    for key in prompts:
+        insights[key], error = results[key]
+        if error:
+            insights[f"{key}_error"] = error
+    return insights
 
-    prompts = {
+
+def get_watched_company_brief_prompts(company_name):
+    return {
         "investment_news": f"For '{company_name}', what's 1-2 recent major news items an investor might care about (e.g., earnings, new product, lawsuit)? Super brief, 1-2 sentences or 2-3 bullet points max. If nothing major, say 'No big news lately'.",
         "planet_impact_brief": f"Quick take on '{company_name}' and the planet: 1-2 key good or bad points. (1-2 sentences or 2-3 bullet points max).",
         "social_vibe_brief": f"'{company_name}' social vibe: How are they with people (employees, community)? 1-2 key good or bad points. (1-2 sentences or 2-3 bullet points max)."
     }
-    generation_config = genai.types.GenerationConfig(temperature=0.6, max_output_tokens=100)
-    for key, prompt_text in prompts.items():
-        try:
-            response = GEMINI_MODEL.generate_content(prompt_text, generation_config=generation_config)
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                brief_data[key] = f"AI content issue ({response.prompt_feedback.block_reason.name})."
-            elif response.parts: # Check parts as per teammate's code structure
-                full_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-                brief_data[key] = full_text.strip() if full_text else "AI is quiet on this one."
-            else: # Teammate's code implies this case
-                brief_data[key] = "AI gave an empty response."
-        except Exception as e:
-            brief_data[key] = f"Error fetching this insight. ({e})" # Match teammate's error format
-    return brief_data
 
 
-def get_product_analyzer_company_details_from_gemini(company_name, stock_data_summary=None, stock_data_for_rec=None):
+def watched_company_brief_config():
+    return genai.types.GenerationConfig(temperature=0.6, max_output_tokens=100)
+
+
+def watched_company_brief_tasks(company_name, stock_task):
+    return insight_tasks(company_name, stock_task, get_watched_company_brief_prompts(company_name), watched_company_brief_config())
+
+
+def get_watched_company_brief_from_gemini(company_name, stock_data=None):
     if not GEMINI_MODEL: return {"error": "Gemini model not available."}
-    profile_data = {}
+    tasks = {"stock": (lambda: (stock_data, None), [])}
+    tasks.update(watched_company_brief_tasks(company_name, "stock"))
+    return assemble_insights(run_task_graph(tasks), get_watched_company_brief_prompts(company_name))
 
-    recommendation, rec_error = get_gemini_buy_wait_sell_recommendation(company_name, stock_data_for_rec)
-    profile_data["recommendation"] = recommendation
-    if rec_error:
-        profile_data["recommendation_error"] = rec_error
-        
+
+def get_product_analyzer_prompts(company_name, stock_data_summary=None):
     business_summary_prompt = (
         f"Give a short, snappy summary of what '{company_name}' is known for (2-3 sentences). "
         f"If public, any recent big news or stock vibe? (1-2 sentences). "
@@ -279,114 +1707,832 @@ def get_product_analyzer_company_details_from_gemini(company_name, stock_data_su
         "planet_impact": f"How's '{company_name}' doing with planet Earth? Any cool eco-friendly stuff or big oopsies? (2-3 sentences or few bullet points)",
         "competitors_alternatives": f"Who are '{company_name}'s main rivals or cooler alternatives young people might check out? (few names or 2-3 sentences)"
     }
-    generation_config = genai.types.GenerationConfig(temperature=0.7, max_output_tokens=180)
-    for key, prompt_text in prompts.items():
-        try:
-            response = GEMINI_MODEL.generate_content(prompt_text, generation_config=generation_config)
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                profile_data[key] = f"AI content issue ({response.prompt_feedback.block_reason.name})."
-            elif response.parts: # Check parts as per teammate's code structure
-                full_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-                profile_data[key] = full_text.strip() if full_text else "AI is quiet on this one."
-            else: # Teammate's code implies this case
-                profile_data[key] = "AI gave an empty response."
-        except Exception as e:
-            profile_data[key] = f"Error fetching this insight. ({e})" # Match teammate's error format
-    return profile_data
+    return prompts
 
 
-# --- Original Routes (News, Chat, Summary) ---
-@app.route('/')
-def index():
-    return render_template('dashboard.html')
+def product_analyzer_config():
+    return genai.types.GenerationConfig(temperature=0.7, max_output_tokens=180)
 
-@app.route('/api/news')
-def get_news():
-    if not NEWS_API_KEY:
-        return jsonify({"status": "error", "message": "News API key not configured."}), 500
 
-    news_type = request.args.get('type', 'local')
-    country = DEFAULT_COUNTRY
+def get_product_analyzer_company_details_from_gemini(company_name, stock_data_summary=None, stock_data_for_rec=None):
+    if not GEMINI_MODEL: return {"error": "Gemini model not available."}
+    prompts = get_product_analyzer_prompts(company_name, stock_data_summary)
+    tasks = {"stock": (lambda: (stock_data_for_rec, None), [])}
+    tasks.update(insight_tasks(company_name, "stock", prompts, product_analyzer_config()))
+    return assemble_insights(run_task_graph(tasks), prompts)
+
+
+def build_watched_company_profile(company_name):
+    # ticker -> (quote | historical) -> stock -> recommendation is the only real chain;
+    # the logo lookup and the brief prompts run alongside it.
+    tasks = {
+        "ticker_lookup": (lambda: lookup_ticker_with_gemini(company_name), []),
+        "ticker": (lambda lookup: lookup[0], ["ticker_lookup"]),
+        "logo_url": (lambda: get_logo_url(company_name), []),
+    }
+    tasks.update(stock_data_tasks("ticker"))
+    tasks.update(watched_company_brief_tasks(company_name, "stock"))
+    results = run_task_graph(tasks)
+
+    ticker, ticker_error = results["ticker_lookup"]
+    stock_data, stock_error = results["stock"]
+    return {
+        "company_name": company_name,
+        "ticker_symbol": ticker or "N/A",
+        "ticker_error": ticker_error, # The lookup failed, so UNKNOWN here is not a "not public" answer
+        "logo_url": results["logo_url"],
+        "stock_data": stock_data,
+        "stock_error": stock_error, # This will contain error messages from FMP if any
+        "profile_details": assemble_insights(results, get_watched_company_brief_prompts(company_name))
+    }
 
-    # Get pagination parameters from request, with defaults
-    try:
-        page = int(request.args.get('page', 1))
-        pageSize = int(request.args.get('pageSize', DEFAULT_PAGE_SIZE))
-    except ValueError:
-        return jsonify({"status": "error", "message": "Invalid page or pageSize parameters."}), 400
 
-    if page < 1:
-        page = 1
-    if pageSize < 1:
-        pageSize = DEFAULT_PAGE_SIZE
-    if pageSize > 100:
-        pageSize = 100  # NewsAPI max
+def build_watched_company_profiles(company_names):
+    # Batch variant of build_watched_company_profile: one Gemini prompt resolves every ticker
+    # and logo domain, one FMP call fetches every quote, history is fetched in comma-separated
+    # chunks, and each company's brief prompts then run in the same graph.
+    def tradable(resolved):
+        return [r["ticker"] for r in resolved.values() if is_tradable_ticker(r["ticker"])] if FMP_API_KEY else []
+
+    def company_stock(name, resolved, quotes, historicals, analytics):
+        ticker = resolved[name]["ticker"]
+        if not is_tradable_ticker(ticker):
+            return None, None
+        if not FMP_API_KEY:
+            return None, "FinancialModelingPrep API Key not configured."
+        return combine_fmp_stock_data(quotes[ticker.upper()], historicals[ticker.upper()], analytics.get(ticker.upper()))
+
+    tasks = {
+        "resolve": (lambda: resolve_companies_with_gemini(company_names), []),
+        "quotes": (lambda resolved: fetch_fmp_quotes(tradable(resolved)), ["resolve"]),
+        "historicals": (lambda resolved: fetch_fmp_historicals(tradable(resolved)), ["resolve"]),
+        "analytics": (watchlist_price_analytics, ["historicals"]), # The whole watchlist in one pass
+    }
+    for i, name in enumerate(company_names):
+        company_tasks = {"stock": (partial(company_stock, name), ["resolve", "quotes", "historicals", "analytics"])}
+        company_tasks.update(watched_company_brief_tasks(name, "stock"))
+        tasks.update(namespace_tasks(f"c{i}", company_tasks))
+    results = run_task_graph(tasks)
+
+    profiles = []
+    for i, name in enumerate(company_names):
+        company_results = task_results_for(f"c{i}", results)
+        resolved = results["resolve"][name]
+        stock_data, stock_error = company_results["stock"]
+        profiles.append({
+            "company_name": name,
+            "ticker_symbol": resolved["ticker"] or "N/A",
+            "ticker_error": resolved.get("ticker_error"),
+            "logo_url": logo_url_for_domain(resolved["domain"]),
+            "stock_data": stock_data,
+            "stock_error": stock_error,
+            "profile_details": assemble_insights(company_results, get_watched_company_brief_prompts(name))
+        })
+    return profiles
+
+
+# --- Watchlist Profile Snapshots ---
+# /api/company_profile(s) serve the last profile built for a company straight away and rebuild it
+# in the background once it is older than PROFILE_SNAPSHOT_FRESH_SECONDS, so upstream load follows
+# the number of distinct watched companies rather than page views. Snapshots live in SQLite, so
+# every worker process sees (and streams) the same ones.
+PROFILE_SNAPSHOTS = make_cache('company_profiles', PROFILE_SNAPSHOT_MAX_ENTRIES)
+PROFILE_REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=PROFILE_REFRESH_MAX_WORKERS, thread_name_prefix='profile-refresh')
+PROFILE_REFRESH_PENDING = set() # Snapshot keys queued or rebuilding
+PROFILE_REFRESH_LOCK = threading.Lock()
+PROFILE_FLIGHTS = SingleFlight() # One build per company at a time, for first views and background rebuilds alike
+
+def profile_snapshot_key(company_name):
+    return normalize_company_name(company_name)
+
+def profile_needs_retry(profile):
+    # Built while Gemini or FMP was failing: worth rebuilding on the next view rather than serving for minutes.
+    # Every builder that failed left a *_error flag (ticker lookup, recommendation, each insight).
+    details = profile.get("profile_details") or {}
+    insight_failed = any(key.endswith("_error") and value for key, value in details.items())
+    stock_failed = is_tradable_ticker(profile.get("ticker_symbol")) and FMP_API_KEY and not profile.get("stock_data")
+    return bool(profile.get("ticker_error") or insight_failed or stock_failed)
+
+def store_profile_snapshot(company_name, profile):
+    built_at = time.time()
+    if profile_needs_retry(profile):
+        built_at -= PROFILE_SNAPSHOT_FRESH_SECONDS # Stored already stale
+    snapshot = {"profile": profile, "built_at": built_at}
+    PROFILE_SNAPSHOTS.set(profile_snapshot_key(company_name), snapshot, PROFILE_SNAPSHOT_TTL)
+    return snapshot
+
+def get_profile_snapshot(company_name):
+    # {"profile", "built_at"} or None. Stale snapshots are still returned, and queued for a rebuild.
+    snapshot = peek_profile_snapshot(company_name)
+    if snapshot is not None and time.time() - snapshot["built_at"] >= PROFILE_SNAPSHOT_FRESH_SECONDS:
+        schedule_profile_refresh(company_name)
+    return snapshot
+
+def peek_profile_snapshot(company_name):
+    # get_profile_snapshot without queueing a rebuild
+    snapshot = PROFILE_SNAPSHOTS.get(profile_snapshot_key(company_name), None)
+    return None if snapshot is None else snapshot_for_caller(snapshot, company_name)
+
+def snapshot_for_caller(snapshot, company_name):
+    return dict(snapshot, profile=dict(snapshot["profile"], company_name=company_name)) # The caller's spelling, as a fresh build would have it
+
+def build_profile_snapshot(company_name):
+    # Builds and stores one snapshot, coalesced with any build of the same company already running
+    return PROFILE_FLIGHTS.do(
+        profile_snapshot_key(company_name), lambda: store_profile_snapshot(company_name, build_watched_company_profile(company_name))
+    )
 
-    if news_type == 'local':
-        country = DEFAULT_COUNTRY
-    elif news_type != 'global':
-        return jsonify({"status": "error", "message": "Invalid news type specified."}), 400
+def refresh_profile_snapshot(company_name, key):
+    try:
+        build_profile_snapshot(company_name)
+        logging.info(f"Rebuilt profile snapshot for '{company_name}'.")
+    except Exception as e:
+        logging.warning(f"Profile snapshot rebuild failed for '{company_name}': {e}")
+    finally:
+        with PROFILE_REFRESH_LOCK:
+            PROFILE_REFRESH_PENDING.discard(key)
+
+def schedule_profile_refresh(company_name):
+    if not GEMINI_MODEL: return
+    key = profile_snapshot_key(company_name)
+    with PROFILE_REFRESH_LOCK:
+        if key in PROFILE_REFRESH_PENDING: return
+        PROFILE_REFRESH_PENDING.add(key)
+    PROFILE_REFRESH_EXECUTOR.submit(refresh_profile_snapshot, company_name, key)
+
+def watched_company_profile_snapshot(company_name):
+    # {"profile", "built_at"}, built now if there is no snapshot yet
+    return get_profile_snapshot(company_name) or snapshot_for_caller(build_profile_snapshot(company_name), company_name)
+
+def watched_company_profile(company_name):
+    return watched_company_profile_snapshot(company_name)["profile"]
+
+def watched_company_profiles(company_names):
+    # Snapshots where there are any; one batch build for the companies nobody else is building
+    snapshots = {name: get_profile_snapshot(name) for name in company_names}
+    missing = {profile_snapshot_key(name): name for name in company_names if snapshots[name] is None}
+
+    def build(keys):
+        names = [missing[key] for key in keys]
+        return {key: store_profile_snapshot(name, profile) for key, name, profile in zip(keys, names, build_watched_company_profiles(names))}
+
+    built = PROFILE_FLIGHTS.do_many(list(missing), build) if missing else {}
+    return [(snapshots[name] or snapshot_for_caller(built[profile_snapshot_key(name)], name))["profile"] for name in company_names]
+
+def profile_push_fields(profile):
+    # The fields that change between rebuilds and that an open dashboard should see move
+    stock = profile.get("stock_data") or {}
+    details = profile.get("profile_details") or {}
+    return {
+        "price": stock.get("price"), "change": stock.get("change"),
+        "change_percent": stock.get("change_percent"), "month_change_percent": stock.get("month_change_percent"),
+        "recommendation": details.get("recommendation"),
+    }
+
+class ProfileWatch:
+    # One /api/company_profiles/stream connection: remembers which snapshot of each company the
+    # dashboard has, and turns newer snapshots with changed push fields into "profile" events.
+    def __init__(self, company_names):
+        self.company_names = company_names
+        self.seen = {} # name -> (built_at, push fields) the dashboard already has
+        for name in company_names:
+            snapshot = PROFILE_SNAPSHOTS.get(profile_snapshot_key(name), None)
+            if snapshot:
+                self.seen[name] = (snapshot["built_at"], profile_push_fields(snapshot["profile"]))
+
+    def poll(self):
+        # Returns SSE events for snapshots rebuilt since the last poll. It never queues rebuilds itself:
+        # those come from page loads and visible dashboards' refreshes, so an idle open tab costs no upstream calls.
+        events = []
+        for name in self.company_names:
+            snapshot = peek_profile_snapshot(name)
+            previous = self.seen.get(name)
+            if snapshot is None or (previous and previous[0] >= snapshot["built_at"]):
+                continue
+            fields = profile_push_fields(snapshot["profile"])
+            changes = {key: value for key, value in fields.items() if not previous or previous[1].get(key) != value}
+            self.seen[name] = (snapshot["built_at"], fields)
+            if changes:
+                events.append(sse_event({"company_name": name, "changes": changes, "profile": snapshot["profile"]}, event="profile"))
+        return events
+
+PROFILE_PUSH_STREAMS = threading.BoundedSemaphore(PROFILE_PUSH_MAX_STREAMS) # Open Flask push streams
+
+def stream_profile_updates(watch):
+    # Ends with an "end" event after PROFILE_PUSH_MAX_SECONDS, so no stream holds a worker for good
+    ends_at = time.monotonic() + PROFILE_PUSH_MAX_SECONDS
+    while True:
+        yield from watch.poll()
+        remaining = ends_at - time.monotonic()
+        if remaining <= 0:
+            yield sse_event({}, event="end")
+            return
+        yield ": keepalive\n\n" # Also how a closed connection is noticed
+        time.sleep(min(PROFILE_PUSH_POLL_SECONDS, remaining))
+
+
+# --- News Ingestion ---
+class NewsStore:
+    # Local article store. Articles are deduplicated by canonical URL; feed_articles records
+    # which feed(s) ("local:us", "global") each one came from.
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (
+                url_key TEXT PRIMARY KEY, published_at TEXT, fetched_at REAL NOT NULL, data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS feed_articles (
+                feed TEXT NOT NULL, url_key TEXT NOT NULL, published_at TEXT, PRIMARY KEY (feed, url_key));
+            CREATE INDEX IF NOT EXISTS feed_articles_by_date ON feed_articles (feed, published_at DESC);
+            CREATE TABLE IF NOT EXISTS feeds (
+                feed TEXT PRIMARY KEY, news_type TEXT NOT NULL, country TEXT,
+                last_attempt REAL NOT NULL DEFAULT 0, last_success REAL NOT NULL DEFAULT 0,
+                tracked INTEGER NOT NULL DEFAULT 0, last_requested REAL NOT NULL DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS article_terms (
+                term TEXT NOT NULL, url_key TEXT NOT NULL, PRIMARY KEY (term, url_key)) WITHOUT ROWID;
+        """)
+        # Stores created before feeds could go idle: every existing feed was tracked
+        feed_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(feeds)")}
+        if "tracked" not in feed_columns:
+            self.conn.execute("ALTER TABLE feeds ADD COLUMN tracked INTEGER NOT NULL DEFAULT 1")
+            self.conn.execute("ALTER TABLE feeds ADD COLUMN last_requested REAL NOT NULL DEFAULT 0")
+        self.requested_at = {} # feed -> last last_requested write by this process
+        # Backfill the inverted index for stores created before it existed
+        if self.conn.execute("SELECT 1 FROM article_terms LIMIT 1").fetchone() is None:
+            for url_key, data in self.conn.execute("SELECT url_key, data FROM articles").fetchall():
+                self._index_article(url_key, json.loads(data))
+        self.conn.commit()
+
+    def _index_article(self, url_key, article):
+        # Inverted index over title, description and source name (caller holds the lock)
+        self.conn.execute("DELETE FROM article_terms WHERE url_key = ?", (url_key,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO article_terms (term, url_key) VALUES (?, ?)",
+            [(term, url_key) for term in article_index_terms(article)]
+        )
 
-    base_url = "https://newsapi.org/v2/"
+    # A feed row exists once anyone asked for it; the worker only polls feeds that are tracked (their
+    # last successful ingest stored articles) and were requested within the idle window.
+    def register_feed(self, feed, news_type, country=None):
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO feeds (feed, news_type, country) VALUES (?, ?, ?)", (feed, news_type, country))
+            self.conn.commit()
+
+    def track_feed(self, feed, news_type, country=None):
+        # For feeds known to be good (the defaults): tracked and requested now, without an ingest first
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO feeds (feed, news_type, country, tracked, last_requested) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(feed) DO UPDATE SET tracked = 1, last_requested = MAX(last_requested, excluded.last_requested)",
+                (feed, news_type, country, now)
+            )
+            self.conn.commit()
+        self.requested_at[feed] = now
+
+    def tracked_feeds(self, idle_after=None):
+        query, params = "SELECT feed, news_type, country FROM feeds WHERE tracked = 1", []
+        if idle_after is not None:
+            query += " AND last_requested >= ?"
+            params.append(time.time() - idle_after)
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def mark_requested(self, feed):
+        # At most one write per feed per minute per process; enough resolution for the idle window
+        now = time.time()
+        if now - self.requested_at.get(feed, 0) < 60: return
+        self.requested_at[feed] = now
+        with self.lock:
+            self.conn.execute("UPDATE feeds SET last_requested = ? WHERE feed = ?", (now, feed))
+            self.conn.commit()
+
+    def claim_feed(self, feed, interval):
+        # Atomically marks the feed as being polled if it is due, so only one process
+        # (of several gunicorn workers sharing the file) hits NewsAPI per interval.
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE feeds SET last_attempt = ? WHERE feed = ? AND last_attempt <= ?", (now, feed, now - interval)
+            )
+            self.conn.commit()
+            return cursor.rowcount == 1
+
+    def rearm_feed(self, feed, interval, retry_after):
+        # Makes a claimed feed due again `retry_after` seconds from now, for an ingest that failed
+        with self.lock:
+            self.conn.execute("UPDATE feeds SET last_attempt = ? WHERE feed = ?", (time.time() - interval + retry_after, feed))
+            self.conn.commit()
+
+    def last_ingest_succeeded(self, feed):
+        # True once an ingest finished after the latest claim (an empty feed then really is empty)
+        with self.lock:
+            row = self.conn.execute("SELECT last_success > 0 AND last_success >= last_attempt FROM feeds WHERE feed = ?", (feed,)).fetchone()
+        return bool(row and row[0])
+
+    def mark_success(self, feed):
+        # Tracked from its first successful ingest that leaves articles stored; a feed that stays
+        # empty (a country NewsAPI has nothing for) stops being polled
+        with self.lock:
+            self.conn.execute(
+                "UPDATE feeds SET last_success = ?, tracked = EXISTS (SELECT 1 FROM feed_articles WHERE feed = ?) WHERE feed = ?",
+                (time.time(), feed, feed)
+            )
+            self.conn.commit()
+
+    def add_articles(self, feed, articles):
+        now = time.time()
+        with self.lock:
+            for article in articles:
+                url_key = canonicalize_article_url(article['url'])
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO articles (url_key, published_at, fetched_at, data) VALUES (?, ?, ?, ?)",
+                    (url_key, article.get('publishedAt'), now, json.dumps(article))
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO feed_articles (feed, url_key, published_at) VALUES (?, ?, ?)",
+                    (feed, url_key, article.get('publishedAt'))
+                )
+                self._index_article(url_key, article)
+            self.conn.commit()
+
+    def feed_version(self, feed):
+        # (last change, article count): any ingest touching the feed's articles (including one for
+        # another feed sharing a URL) moves the first, a prune moves the second
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(a.fetched_at), COUNT(*) FROM feed_articles f JOIN articles a ON a.url_key = f.url_key WHERE f.feed = ?", (feed,)
+            ).fetchone()
+        return (row[0] or 0, row[1])
+
+    def has_articles(self, feed):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM feed_articles WHERE feed = ? LIMIT 1", (feed,)).fetchone() is not None
+
+    def page(self, feed, page, page_size, keyword_phrases=None):
+        # Returns (articles, total count) for one page of a feed, newest first. With keyword_phrases
+        # (lists of tokens) only articles matching every token of at least one phrase are returned;
+        # tokens match indexed terms by prefix, so "crypto" finds "cryptocurrency".
+        where, params = "f.feed = ?", [feed]
+        if keyword_phrases:
+            phrase_queries = []
+            for tokens in keyword_phrases:
+                phrase_queries.append(" INTERSECT ".join(
+                    ["SELECT url_key FROM article_terms WHERE term >= ? AND term < ?"] * len(tokens)
+                ))
+                for token in tokens:
+                    params += [token, token + "{"] # '{' sorts right after 'z', closing the prefix range
+            where += f" AND f.url_key IN ({' UNION '.join(phrase_queries)})"
+
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM feed_articles f WHERE {where}", params).fetchone()[0]
+            rows = self.conn.execute(
+                "SELECT a.data FROM feed_articles f JOIN articles a ON a.url_key = f.url_key "
+                f"WHERE {where} ORDER BY f.published_at DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size]
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows], total
+
+    def prune(self, max_age_days):
+        cutoff = time.time() - max_age_days * 86400
+        with self.lock:
+            self.conn.execute("DELETE FROM articles WHERE fetched_at < ?", (cutoff,))
+            self.conn.execute("DELETE FROM feed_articles WHERE url_key NOT IN (SELECT url_key FROM articles)")
+            self.conn.execute("DELETE FROM article_terms WHERE url_key NOT IN (SELECT url_key FROM articles)")
+            self.conn.commit()
+
+
+def tokenize_news_text(text):
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(t) > 1]
+
+def article_index_terms(article):
+    source_name = (article.get('source') or {}).get('name')
+    return set(tokenize_news_text(" ".join(filter(None, [article.get('title'), article.get('description'), source_name]))))
+
+MAX_KEYWORD_PHRASES = 20
+MAX_TOKENS_PER_PHRASE = 5
+
+def parse_user_keywords(user_keywords):
+    # dashboard.js sends "electric vehicles OR housing"; commas work too. Returns token lists.
+    phrases = []
+    for phrase in re.split(r"\s+OR\s+|,", user_keywords or ""):
+        tokens = tokenize_news_text(phrase)[:MAX_TOKENS_PER_PHRASE]
+        if tokens and tokens not in phrases:
+            phrases.append(tokens)
+    return phrases[:MAX_KEYWORD_PHRASES]
+
+
+NEWS_STORE = NewsStore(NEWS_DB_PATH)
+
+def news_feed_key(news_type, country=None):
+    return f"local:{(country or DEFAULT_COUNTRY).lower()}" if news_type == 'local' else 'global'
+
+def fetch_newsapi_articles(news_type, country=None, page=1, page_size=DEFAULT_PAGE_SIZE):
+    # One NewsAPI request. Returns (articles, totalResults, error message, HTTP status for errors).
+    base_url = NEWS_API_BASE_URL if NEWS_API_BASE_URL.endswith('/') else NEWS_API_BASE_URL + '/'
     params = {
         'apiKey': NEWS_API_KEY,
         'language': 'en',
-        'pageSize': pageSize,
+        'pageSize': page_size,
         'page': page,
     }
 
     if news_type == 'local':
+        country = country or DEFAULT_COUNTRY
         url = base_url + "top-headlines"
         params['country'] = country.lower()
         params['category'] = 'business'
-        logging.info(f"Fetching local top-headlines for country={country}, page={page}, pageSize={pageSize}, params={params}")
+        logging.info(f"Fetching local top-headlines for country={country}, page={page}, pageSize={page_size}, params={params}")
     else:
         url = base_url + "everything"
         params['q'] = GLOBAL_TOPIC
         params['sortBy'] = 'relevancy'
-        logging.info(f"Fetching global everything for topic='{GLOBAL_TOPIC}', page={page}, pageSize={pageSize}, params={params}")
+        logging.info(f"Fetching global everything for topic='{GLOBAL_TOPIC}', page={page}, pageSize={page_size}, params={params}")
 
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        with METRICS.span("newsapi", news_type):
+            response = requests.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            data = response.json()
 
-        logging.info(f"Raw NewsAPI data: {data}")
         raw_articles = data.get('articles', [])
         logging.info(f"Number of raw articles from API: {len(raw_articles)}")
-        if raw_articles:
-            logging.info(f"First raw article: {raw_articles[0]}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG): # Payloads are large; only format them when asked to
+            logging.debug(f"Raw NewsAPI data: {data}")
 
         if data.get('status') != 'ok':
             api_message = data.get('message', 'Unknown API error from NewsAPI')
             logging.error(f"NewsAPI returned status '{data.get('status')}' with code '{data.get('code')}' and message: {api_message}")
-            return jsonify({"status": "error", "message": api_message, "articles": [], "totalResults": 0}), 500
+            return [], 0, api_message, 500
 
         articles = [
             a for a in raw_articles
             if a.get('title') and a.get('description') and a.get('url') and a.get('source') and a.get('source').get('name')
         ]
+        return articles, data.get('totalResults', 0), None, 200
+
+    except requests.exceptions.Timeout:
+        logging.error(f"NewsAPI request timed out for URL: {url} with params: {params}", exc_info=True)
+        return [], 0, "Request to news provider timed out.", 504
+    except requests.exceptions.RequestException as e:
+        logging.error(f"NewsAPI request failed: {e}", exc_info=True)
+        return [], 0, f"Could not connect to news provider: {str(e)}", 500
+    except Exception as e:
+        logging.error(f"An unexpected error occurred fetching news: {e}", exc_info=True)
+        return [], 0, "An internal server error occurred.", 500
+
+def ingest_news_feed(news_type, country=None):
+    # Pulls the latest NEWS_INGEST_PAGES pages of a feed into NEWS_STORE.
+    # Returns (articles stored, error message, HTTP status for errors).
+    feed = news_feed_key(news_type, country)
+    stored = 0
+    for page in range(1, NEWS_INGEST_PAGES + 1):
+        articles, total_results, error, status = fetch_newsapi_articles(news_type, country, page=page, page_size=100) # NewsAPI max
+        if error:
+            if stored: break # Keep what earlier pages gave us
+            return 0, error, status
+        NEWS_STORE.add_articles(feed, articles)
+        stored += len(articles)
+        if page * 100 >= total_results:
+            break
+    NEWS_STORE.mark_success(feed)
+    logging.info(f"Ingested {stored} articles into feed '{feed}'.")
+    schedule_presummarization(feed)
+    return stored, None, 200
+
+def news_ingestion_loop():
+    while True:
+        try:
+            for feed, news_type, country in NEWS_STORE.tracked_feeds(NEWS_FEED_IDLE_INTERVALS * NEWS_INGEST_INTERVAL):
+                if NEWS_STORE.claim_feed(feed, NEWS_INGEST_INTERVAL):
+                    ingest_news_feed(news_type, country)
+            NEWS_STORE.prune(NEWS_STORE_MAX_AGE_DAYS)
+        except Exception as e:
+            logging.error(f"News ingestion cycle failed: {e}", exc_info=True)
+        time.sleep(min(60, NEWS_INGEST_INTERVAL))
+
+COLD_FEED_FLIGHTS = SingleFlight()
+
+def ingest_cold_feed(feed, news_type, country):
+    # A request for a feed with nothing stored. claim_feed lets one process per NEWS_INGEST_INTERVAL
+    # call NewsAPI for it, and a failed call re-arms the claim after NEWS_COLD_FEED_RETRY_SECONDS.
+    # Requests that don't get the claim serve the empty page only when an ingest really came back
+    # empty (a country NewsAPI has nothing for); while one is pending or failed they get a 503.
+    # Concurrent requests in this process wait for the one ingest.
+    def ingest():
+        NEWS_STORE.register_feed(feed, news_type, country if news_type == 'local' else None)
+        if not NEWS_STORE.claim_feed(feed, NEWS_INGEST_INTERVAL):
+            if NEWS_STORE.last_ingest_succeeded(feed):
+                return 0, None, 200
+            return 0, "News for this feed is not available yet. Please try again shortly.", 503
+        result = None
+        try:
+            result = ingest_news_feed(news_type, country)
+        finally:
+            if result is None or result[1]:
+                NEWS_STORE.rearm_feed(feed, NEWS_INGEST_INTERVAL, NEWS_COLD_FEED_RETRY_SECONDS)
+        return result
+    return COLD_FEED_FLIGHTS.do(feed, ingest)
+
+# --- Summary Pre-warming ---
+class HourlyBudget:
+    # Sliding one-hour window of allowed calls
+    def __init__(self, limit):
+        self.limit = limit
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.calls and self.calls[0] <= now - 3600:
+            self.calls.popleft()
+
+    def try_acquire(self):
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            if len(self.calls) >= self.limit:
+                return False
+            self.calls.append(now)
+            return True
+
+    def used(self):
+        with self.lock:
+            self._expire(time.time())
+            return len(self.calls)
+
+
+PRESUMMARIZE_EXECUTOR = ThreadPoolExecutor(max_workers=PRESUMMARIZE_MAX_WORKERS, thread_name_prefix='presummarize')
+PRESUMMARIZE_BUDGET = HourlyBudget(PRESUMMARIZE_GEMINI_BUDGET_PER_HOUR)
+PRESUMMARIZE_PENDING = set() # Cache keys queued or running, so one article is never queued twice
+PRESUMMARIZE_LOCK = threading.Lock()
+PRESUMMARIZE_MAX_PENDING = max(PRESUMMARIZE_TOP_N * 4, 1)
+
+def presummarize_articles(urls_and_keys):
+    # Scrape the whole batch concurrently first, so the summaries below read from SCRAPE_CACHE
+    try:
+        scrape_articles([url for url, _ in urls_and_keys])
+    except Exception as e:
+        logging.warning(f"Batch scrape for pre-summarization failed: {e}")
+    for url, cache_key in urls_and_keys:
+        try:
+            _, error, _ = summarize_article(url, allow_fallback=False, gemini_budget=PRESUMMARIZE_BUDGET)
+            if error:
+                logging.info(f"Pre-summarization skipped for {url}: {error}")
+        except Exception as e:
+            logging.warning(f"Pre-summarization failed for {url}: {e}")
+        finally:
+            with PRESUMMARIZE_LOCK:
+                PRESUMMARIZE_PENDING.discard(cache_key)
+
+def schedule_presummarization(feed):
+    # Queue the feed's newest articles so clicking a headline usually hits SUMMARY_CACHE
+    if not GEMINI_MODEL or PRESUMMARIZE_TOP_N <= 0: return
+    articles, _ = NEWS_STORE.page(feed, 1, PRESUMMARIZE_TOP_N)
+    batch = []
+    for article in articles:
+        cache_key = article_cache_key(article['url'])
+        with PRESUMMARIZE_LOCK:
+            if cache_key in PRESUMMARIZE_PENDING or len(PRESUMMARIZE_PENDING) >= PRESUMMARIZE_MAX_PENDING:
+                continue
+            if SUMMARY_CACHE.get(cache_key) is not CACHE_MISS:
+                continue
+            PRESUMMARIZE_PENDING.add(cache_key)
+        batch.append((article['url'], cache_key))
+    if batch:
+        PRESUMMARIZE_EXECUTOR.submit(presummarize_articles, batch)
+        logging.info(f"Queued {len(batch)} articles from feed '{feed}' for pre-summarization.")
+
+
+BACKGROUND_WORKERS_LOCK = threading.Lock()
+BACKGROUND_WORKERS_STARTED = False
+
+@app.before_request
+def start_background_workers():
+    # Started lazily on the first request so the Werkzeug reloader's parent process and
+    # gunicorn's pre-fork master never run pollers; each serving process gets one.
+    global BACKGROUND_WORKERS_STARTED
+    if BACKGROUND_WORKERS_STARTED: return
+    with BACKGROUND_WORKERS_LOCK:
+        if BACKGROUND_WORKERS_STARTED: return
+        BACKGROUND_WORKERS_STARTED = True
+        if not GEMINI_INIT_DONE.is_set():
+            threading.Thread(target=init_gemini_model, name='gemini-init', daemon=True).start()
+        if NEWS_API_KEY:
+            NEWS_STORE.track_feed(news_feed_key('local'), 'local', DEFAULT_COUNTRY)
+            NEWS_STORE.track_feed(news_feed_key('global'), 'global')
+            threading.Thread(target=news_ingestion_loop, name='news-ingestion', daemon=True).start()
+            logging.info("News ingestion worker started.")
+
+AI_ENDPOINTS = {'chat_with_gemini', 'gemini_summary', 'company_profile_route', 'company_profiles_route', 'company_profiles_stream_route', 'analyze_product_image_route'}
+
+@app.before_request
+def wait_for_gemini_init():
+    # AI requests arriving while the model is still initializing wait for it rather than failing straight away
+    if request.endpoint in AI_ENDPOINTS and not GEMINI_INIT_DONE.is_set():
+        GEMINI_INIT_DONE.wait(GEMINI_INIT_WAIT_SECONDS)
 
-        total_results_from_api = data.get('totalResults', 0)
 
-        logging.info(f"NewsAPI successful: Fetched {len(articles)} {news_type} articles. API totalResults: {total_results_from_api}. Page: {page}")
+# --- Original Routes (News, Chat, Summary) ---
+@app.route('/')
+def index():
+    return render_template('dashboard.html')
 
+@app.route('/api/news')
+def get_news():
+    if not NEWS_API_KEY:
+        return jsonify({"status": "error", "message": "News API key not configured."}), 500
+
+    news_type = request.args.get('type', 'local')
+    country = (request.args.get('country') or DEFAULT_COUNTRY).strip().lower()
+    keyword_phrases = parse_user_keywords(request.args.get('user_keywords'))
+
+    # Get pagination parameters from request, with defaults
+    try:
+        page = int(request.args.get('page', 1))
+        pageSize = int(request.args.get('pageSize', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid page or pageSize parameters."}), 400
+
+    if page < 1:
+        page = 1
+    if pageSize < 1:
+        pageSize = DEFAULT_PAGE_SIZE
+    if pageSize > 100:
+        pageSize = 100  # NewsAPI max
+
+    if news_type == 'local':
+        if not re.fullmatch(r"[a-z]{2}", country):
+            return jsonify({"status": "error", "message": "Invalid country code."}), 400
+    elif news_type != 'global':
+        return jsonify({"status": "error", "message": "Invalid news type specified."}), 400
+
+    feed = news_feed_key(news_type, country)
+    if not NEWS_STORE.has_articles(feed):
+        # Cold start, or a country nobody asked for yet: ingest once inline, then the worker keeps it fresh
+        _, error, status = ingest_cold_feed(feed, news_type, country)
+        if error:
+            return jsonify({"status": "error", "message": error, "articles": [], "totalResults": 0}), status
+    NEWS_STORE.mark_requested(feed)
+
+    def build_page():
+        articles, total_results = NEWS_STORE.page(feed, page, pageSize, keyword_phrases)
+        logging.info(f"Served {len(articles)} {news_type} articles from store (feed={feed}, keywords={keyword_phrases}). Total: {total_results}. Page: {page}")
         return jsonify({
             "status": "ok",
-            "totalResults": total_results_from_api,
+            "totalResults": total_results,
             "articles": articles,
             "page": page
         })
 
-    except requests.exceptions.Timeout:
-        logging.error(f"NewsAPI request timed out for URL: {url} with params: {params}", exc_info=True)
-        return jsonify({"status": "error", "message": "Request to news provider timed out.", "articles": [], "totalResults": 0}), 504
-    except requests.exceptions.RequestException as e:
-        logging.error(f"NewsAPI request failed: {e}", exc_info=True)
-        return jsonify({"status": "error", "message": f"Could not connect to news provider: {str(e)}", "articles": [], "totalResults": 0}), 500
-    except Exception as e:
-        logging.error(f"An unexpected error occurred fetching news: {e}", exc_info=True)
-        return jsonify({"status": "error", "message": "An internal server error occurred.", "articles": [], "totalResults": 0}), 500
+    last_changed, article_count = NEWS_STORE.feed_version(feed)
+    return conditional_response(
+        ("news", feed, last_changed, article_count, page, pageSize, keyword_phrases), last_changed, build_page,
+        f"public, max-age={NEWS_RESPONSE_MAX_AGE}"
+    )
+
+# --- Chat Response Cache ---
+CHAT_STOPWORDS = frozenset(
+    "what whats is are was were be does do did how why when which who the an of to in on for and or about "
+    "me us my can could would you your please explain tell mean means meaning it its this that".split()
+)
+
+def normalize_chat_question(question):
+    # "What is inflation?" and "what is  inflation" share one exact-match key
+    return " ".join(tokenize_news_text(question))
+
+def chat_question_terms(question):
+    return Counter(t for t in tokenize_news_text(question) if t not in CHAT_STOPWORDS)
+
+class ChatResponseCache:
+    # Answers by question. An exact normalized match wins; otherwise the most similar known question
+    # is used if its TF-IDF cosine similarity (over non-stopword terms, IDF from the known questions)
+    # reaches min_similarity. Candidates come from an inverted term index, so a lookup only scores
+    # questions sharing a term. Answers live in `store` (a make_cache backend, so exact matches are
+    # shared by every worker); the similarity index is per process and learns questions as they are
+    # stored or found. Both are LRU-bounded to max_entries and expire `ttl` seconds after storing.
+    def __init__(self, store, max_entries, ttl, min_similarity):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self.entries = OrderedDict() # normalized question -> (expires_at, term counts), least recently used first
+        self.postings = {} # term -> normalized questions containing it
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, question):
+        # Cached answer for `question` or a near-duplicate of it, else None
+        key, terms = normalize_chat_question(question), chat_question_terms(question)
+        answer = self.store.get(key, None) if key else None
+        if answer is not None:
+            with self.lock:
+                self.hits += 1
+                if not self._live(key): # Stored by another worker
+                    self._index(key, terms, self.ttl)
+                self.entries.move_to_end(key)
+            return answer
+        with self.lock:
+            match = self._most_similar(terms)
+        answer = self.store.get(match, None) if match else None
+        with self.lock:
+            if answer is None:
+                self.misses += 1
+                return None
+            self.similar_hits += 1
+            if match in self.entries:
+                self.entries.move_to_end(match)
+        return answer
+
+    def set(self, question, answer):
+        key, terms = normalize_chat_question(question), chat_question_terms(question)
+        if not key:
+            return
+        self.store.set(key, answer, self.ttl)
+        with self.lock:
+            self._index(key, terms, self.ttl)
+
+    def _index(self, key, terms, ttl):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.time() + ttl, terms)
+        for term in terms:
+            self.postings.setdefault(term, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _live(self, key):
+        # Whether `key` is cached and unexpired; expired entries are dropped on sight
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= time.time():
+            self._remove(key)
+            entry = None
+        return entry is not None
+
+    def _remove(self, key):
+        for term in self.entries.pop(key)[1]:
+            keys = self.postings[term]
+            keys.discard(key)
+            if not keys:
+                del self.postings[term]
+
+    def _most_similar(self, terms):
+        candidates = [key for key in set().union(*(self.postings.get(t, ()) for t in terms)) if self._live(key)]
+        if not candidates:
+            return None
+        count = len(self.entries)
+        def weights(term_counts):
+            return {t: c * (math.log((1 + count) / (1 + len(self.postings.get(t, ())))) + 1) for t, c in term_counts.items()}
+        query = weights(terms)
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        best_key, best_score = None, self.min_similarity
+        for key in candidates:
+            doc = weights(self.entries[key][1])
+            score = sum(w * doc.get(t, 0.0) for t, w in query.items()) / (query_norm * math.sqrt(sum(w * w for w in doc.values())))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits + self.similar_hits, "similar_hits": self.similar_hits, "misses": self.misses,
+                    "size": len(self.entries), "max_entries": self.max_entries}
+
+CHAT_CACHE = ChatResponseCache(make_cache('chat_responses', CHAT_CACHE_MAX_ENTRIES), CHAT_CACHE_MAX_ENTRIES, CHAT_CACHE_TTL, CHAT_CACHE_MIN_SIMILARITY)
+
+def chat_cacheable(user_input):
+    return isinstance(user_input, str) and len(user_input) <= CHAT_CACHE_MAX_QUESTION_CHARS
+
+def cached_chat_answer(user_input):
+    return CHAT_CACHE.get(user_input) if chat_cacheable(user_input) else None
+
+def remember_chat_answer(user_input, answer):
+    if chat_cacheable(user_input):
+        CHAT_CACHE.set(user_input, answer)
+
+
+def chat_prompt(user_input):
+    # Using the prompt from the user's original app.py for general chat
+    return f"""You are an assistant helping young people understand economic news.
+Explain the following concept or news item simply and clearly for a young person, avoiding jargon where possible:
+{user_input}
+"""
+
+def chat_text_from_response(response):
+    # (text, answered): answered is False for the blocked/empty fallbacks, which aren't cached
+    if response and hasattr(response, 'text') and response.text:
+        logging.info("Gemini generated text response for chat.")
+        return response.text.replace('*', '').replace('#', ''), True # Basic Markdown removal
+    elif response and response.prompt_feedback and response.prompt_feedback.block_reason:
+         block_reason = response.prompt_feedback.block_reason.name
+         logging.warning(f"Gemini blocked content for chat: {block_reason}")
+         return f"Sorry, I couldn't generate a response for that due to content safety policy. (Reason: {block_reason}). Please try asking differently.", False
+    else:
+         logging.warning("Gemini generated no text response or had unexpected structure for chat.")
+         return "Sorry, I couldn't generate a response for that. Please try asking differently.", False
 
 @app.route('/api/chat', methods=['POST']) # Retained original, more feature-rich chat
 def chat_with_gemini():
@@ -400,30 +2546,169 @@ def chat_with_gemini():
     if not user_input:
         return jsonify({"error": "No message provided."}), 400
 
+    cached_answer = cached_chat_answer(user_input)
+    if cached_answer is not None:
+        logging.info(f"Chat cache hit: {user_input[:50]}...")
+        return event_stream_response(cached_chat_events(cached_answer)) if wants_event_stream() else jsonify({"response": cached_answer})
+
+    if wants_event_stream():
+        logging.info(f"Streaming chat prompt to Gemini (model: {GEMINI_MODEL_NAME}): {user_input[:50]}...")
+        return event_stream_response(stream_chat_events(user_input))
+
     try:
-        # Using the prompt from the user's original app.py for general chat
-        prompt = f"""You are an assistant helping young people understand economic news.
-Explain the following concept or news item simply and clearly for a young person, avoiding jargon where possible:
-{user_input}
-"""
         logging.info(f"Sending prompt to Gemini (model: {GEMINI_MODEL_NAME}): {user_input[:50]}...")
-        response = GEMINI_MODEL.generate_content(prompt)
-
-        if response and hasattr(response, 'text') and response.text:
-            bot_response = response.text.replace('*', '').replace('#', '') # Basic Markdown removal
-            logging.info("Gemini generated text response for chat.")
-        elif response and response.prompt_feedback and response.prompt_feedback.block_reason:
-             block_reason = response.prompt_feedback.block_reason.name
-             logging.warning(f"Gemini blocked content for chat: {block_reason}")
-             bot_response = f"Sorry, I couldn't generate a response for that due to content safety policy. (Reason: {block_reason}). Please try asking differently."
-        else:
-             logging.warning("Gemini generated no text response or had unexpected structure for chat.")
-             bot_response = "Sorry, I couldn't generate a response for that. Please try asking differently."
-        return jsonify({"response": bot_response})
+        response = GEMINI_MODEL.generate_content(chat_prompt(user_input), endpoint="chat")
+        answer, answered = chat_text_from_response(response)
+        if answered:
+            remember_chat_answer(user_input, answer)
+        return jsonify({"response": answer})
+    except GeminiUnavailableError as e:
+        return jsonify({"error": f"{e} Please try again in a minute."}), 503
     except Exception as e:
         logging.error(f"Error with Gemini API in chat: {e}", exc_info=True)
         return jsonify({"error": "An error occurred while processing your chat request. Please try again."}), 500
 
+# --- Streaming (Server-Sent Events) ---
+def wants_event_stream():
+    return request.args.get('stream') in ('1', 'true') or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def event_stream_response(events):
+    # X-Accel-Buffering stops nginx-style proxies from holding chunks back
+    return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stream_text_chunks(response):
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError: # Blocked or empty candidate, nothing to emit for this chunk
+            continue
+        if text:
+            yield text
+
+def cached_chat_events(answer):
+    # A cached answer in the same event shape as a streamed one
+    yield sse_event({"delta": answer})
+    yield sse_event({}, event="done")
+
+def stream_chat_events(user_input):
+    # Emits {"delta": text} events token-by-token, then "done" (or "error"). A complete answer is cached.
+    try:
+        response = GEMINI_MODEL.generate_content(chat_prompt(user_input), stream=True, endpoint="chat")
+        deltas = []
+        for text in stream_text_chunks(response):
+            deltas.append(text.replace('*', '').replace('#', '')) # Basic Markdown removal
+            yield sse_event({"delta": deltas[-1]})
+        if deltas:
+            remember_chat_answer(user_input, "".join(deltas))
+        else:
+            if response.prompt_feedback and response.prompt_feedback.block_reason:
+                block_reason = response.prompt_feedback.block_reason.name
+                logging.warning(f"Gemini blocked content for chat: {block_reason}")
+                fallback = f"Sorry, I couldn't generate a response for that due to content safety policy. (Reason: {block_reason}). Please try asking differently."
+            else:
+                logging.warning("Gemini generated no text response or had unexpected structure for chat.")
+                fallback = "Sorry, I couldn't generate a response for that. Please try asking differently."
+            yield sse_event({"delta": fallback})
+        yield sse_event({}, event="done")
+    except Exception as e:
+        logging.error(f"Error with Gemini API in streaming chat: {e}", exc_info=True)
+        yield sse_event({"error": "An error occurred while processing your chat request. Please try again."}, event="error")
+
+SUMMARY_SECTIONS = [
+    ("summary", "Summary"), ("genz", "GenZ Translation"),
+    ("impact", "Impact on Young People"), ("impactLevel", "Impact Rating")
+]
+
+def completed_summary_sections(text):
+    # A section is finished once the next SECTION header (or, for the rating, its digit) has arrived
+    done = []
+    for i, (key, header) in enumerate(SUMMARY_SECTIONS):
+        if i + 1 < len(SUMMARY_SECTIONS):
+            finished = re.search(rf"SECTION: {SUMMARY_SECTIONS[i + 1][1]}", text, re.IGNORECASE)
+        else:
+            finished = re.search(r"SECTION: Impact Rating\s*\d", text, re.IGNORECASE)
+        if finished:
+            done.append(key)
+    return done
+
+def summary_result_events(result):
+    for key, _ in SUMMARY_SECTIONS:
+        yield sse_event({"key": key, "value": result[key]}, event="section")
+    yield sse_event(result, event="done")
+
+def stream_summary_events(article_url):
+    # Emits one "section" event ({"key", "value"}) per SECTION as soon as it is parsed, then "done"
+    # with the full result (same shape as the JSON response), or "error". The stream leads the
+    # article's SUMMARY_FLIGHTS entry while it runs; a stream arriving while another request is
+    # already summarizing the article waits for that result instead of starting its own.
+    cache_key = article_cache_key(article_url)
+    cached = SUMMARY_CACHE.get(cache_key)
+    if cached is not CACHE_MISS:
+        yield from summary_result_events(cached)
+        return
+
+    future, leading = SUMMARY_FLIGHTS.lead_or_follow(cache_key)
+    if not leading:
+        yield ": waiting for a summary already in progress\n\n"
+        result, error, _, leader_specific = future.result()
+        if error and leader_specific:
+            result, error, _ = summarize_article(article_url)
+        if error:
+            yield sse_event({"error": error}, event="error")
+        else:
+            yield from summary_result_events(result)
+        return
+
+    outcome = ABANDONED_SUMMARY # Unless the stream completes
+    try:
+        outcome = yield from lead_summary_stream(article_url, cache_key)
+    finally:
+        future.set_result(outcome)
+        SUMMARY_FLIGHTS.done(cache_key)
+
+def lead_summary_stream(article_url, cache_key):
+    # The streaming summary itself; returns the (result, error, status, leader_specific) shared with followers
+    yield ": fetching article\n\n" # Comment line, flushes headers while we scrape
+    content, scraped, error, status = prepare_summary_content(article_url)
+    if error:
+        yield sse_event({"error": error}, event="error")
+        return None, error, status, False
+
+    full_text, sent = "", set()
+    try:
+        response = GEMINI_MODEL.generate_content(build_summary_prompt(content), stream=True, endpoint="summary")
+        for text in stream_text_chunks(response):
+            full_text += text
+            newly_done = [key for key in completed_summary_sections(full_text) if key not in sent]
+            if newly_done:
+                parsed = parse_summary_response(full_text)
+                for key in newly_done:
+                    sent.add(key)
+                    yield sse_event({"key": key, "value": parsed[key]}, event="section")
+        if not full_text:
+            if response.prompt_feedback and response.prompt_feedback.block_reason:
+                raise Exception(f"Content generation blocked by Gemini: {response.prompt_feedback.block_reason.name}")
+            raise Exception("Gemini returned no usable text for summary.")
+    except Exception as e:
+        logging.error(f"Error during streamed Gemini summary for {article_url}: {e}", exc_info=True)
+        error = f"Failed to get or parse Gemini AI summary: {str(e)}"
+        yield sse_event({"error": error}, event="error")
+        return None, error, 503 if isinstance(e, GeminiUnavailableError) else 500, False
+
+    result = parse_summary_response(full_text)
+    for key, _ in SUMMARY_SECTIONS:
+        if key not in sent:
+            yield sse_event({"key": key, "value": result[key]}, event="section")
+    if scraped: # Never cache a summary of the fallback text under the article's URL
+        SUMMARY_CACHE.set(cache_key, result, SUMMARY_CACHE_TTL)
+    yield sse_event(result, event="done")
+    return result, None, 200, False
+
+
 # Function for article summarization (from original)
 def call_gemini_ai_for_summary(prompt_text):
     global GEMINI_MODEL # Ensure global model is used
@@ -431,7 +2716,10 @@ def call_gemini_ai_for_summary(prompt_text):
         logging.error("GEMINI_MODEL not initialized. Cannot generate summary.")
         raise Exception("Gemini model is not available for summarization.")
     logging.info(f"Sending prompt to Gemini for summary (model: {GEMINI_MODEL.model_name})...") # Use GEMINI_MODEL.model_name
-    response = GEMINI_MODEL.generate_content(prompt_text)
+    return summary_text_from_response(GEMINI_MODEL.generate_content(prompt_text, endpoint="summary"))
+
+
+def summary_text_from_response(response):
     if response and hasattr(response, 'text') and response.text: # Check if text attribute exists
         logging.info("Gemini successfully generated text for summary.")
         return response.text
@@ -448,24 +2736,8 @@ def call_gemini_ai_for_summary(prompt_text):
         raise Exception("Gemini returned no usable text for summary.")
 
 
-@app.route('/api/gemini-summary') # From original
-def gemini_summary():
-    if not GEMINI_MODEL:
-        return jsonify({"error": "Summary service is unavailable (Gemini model not configured)."}), 503
-
-    article_url = request.args.get('url')
-    if not article_url:
-        return jsonify({"error": "Missing url parameter"}), 400
-
-    logging.info(f"Gemini summary requested for URL: {article_url}")
-    content = safe_scrape_article(article_url)
-
-    if not content or len(content.strip()) < 50: # Minimum content length
-        logging.warning(f"Scraped content for {article_url} is too short or empty. Cannot summarize.")
-        return jsonify({"error": "Could not retrieve sufficient article content to summarize."}), 400
-
-    logging.info(f"Scraped content for summary (first 100 chars): {content[:100]}")
-    prompt = f"""
+def build_summary_prompt(content):
+    return f"""
     You are an AI assistant specialized in explaining economic news to young people.
     Analyze the following economic news article content.
     Provide your response structured with the following specific section headers, ensuring each section has content:
@@ -487,57 +2759,292 @@ def gemini_summary():
     {content}
     ---
     """
-    try:
-        full_response_text = call_gemini_ai_for_summary(prompt)
-        summary = "Summary not found."
-        genz = "GenZ translation not found."
-        impact = "Impact analysis not found."
-        impact_level = 0
 
-        # Using re.IGNORECASE for robustness
-        summary_match = re.search(r"SECTION: Summary\s*([\s\S]*?)(?=\s*SECTION: GenZ Translation|\Z)", full_response_text, re.IGNORECASE)
-        if summary_match: summary = summary_match.group(1).strip()
 
-        genz_match = re.search(r"SECTION: GenZ Translation\s*([\s\S]*?)(?=\s*SECTION: Impact on Young People|\Z)", full_response_text, re.IGNORECASE)
-        if genz_match: genz = genz_match.group(1).strip()
+def parse_summary_response(full_response_text):
+    summary = "Summary not found."
+    genz = "GenZ translation not found."
+    impact = "Impact analysis not found."
+    impact_level = 0
 
-        impact_match = re.search(r"SECTION: Impact on Young People\s*([\s\S]*?)(?=\s*SECTION: Impact Rating|\Z)", full_response_text, re.IGNORECASE)
-        if impact_match: impact = impact_match.group(1).strip()
+    # Using re.IGNORECASE for robustness
+    summary_match = re.search(r"SECTION: Summary\s*([\s\S]*?)(?=\s*SECTION: GenZ Translation|\Z)", full_response_text, re.IGNORECASE)
+    if summary_match: summary = summary_match.group(1).strip()
 
-        rating_match = re.search(r"SECTION: Impact Rating\s*(\d)", full_response_text, re.IGNORECASE)
-        if rating_match:
-            try:
-                level = int(rating_match.group(1))
-                if 1 <= level <= 5:
-                    impact_level = level
-            except ValueError:
-                logging.warning(f"Could not parse impact level from: {rating_match.group(1)}")
-        
-        logging.info(f"Parsed summary: {summary[:30]}..., GenZ: {genz[:30]}..., Impact: {impact[:30]}..., Rating: {impact_level}")
-        return jsonify({
-            "summary": summary,
-            "genz": genz,
-            "impact": impact,
-            "impactLevel": impact_level
-        })
+    genz_match = re.search(r"SECTION: GenZ Translation\s*([\s\S]*?)(?=\s*SECTION: Impact on Young People|\Z)", full_response_text, re.IGNORECASE)
+    if genz_match: genz = genz_match.group(1).strip()
+
+    impact_match = re.search(r"SECTION: Impact on Young People\s*([\s\S]*?)(?=\s*SECTION: Impact Rating|\Z)", full_response_text, re.IGNORECASE)
+    if impact_match: impact = impact_match.group(1).strip()
+
+    rating_match = re.search(r"SECTION: Impact Rating\s*(\d)", full_response_text, re.IGNORECASE)
+    if rating_match:
+        try:
+            level = int(rating_match.group(1))
+            if 1 <= level <= 5:
+                impact_level = level
+        except ValueError:
+            logging.warning(f"Could not parse impact level from: {rating_match.group(1)}")
+
+    return {
+        "summary": summary,
+        "genz": genz,
+        "impact": impact,
+        "impactLevel": impact_level
+    }
+
+
+def prepare_summary_content(article_url, allow_fallback=True):
+    # Returns (content, scraped text or None, error message, HTTP status)
+    return summary_content_from_scrape(article_url, scrape_article_text(article_url), allow_fallback)
+
+
+def summary_content_from_scrape(article_url, scraped, allow_fallback=True):
+    if not scraped and not allow_fallback:
+        return None, None, "Could not retrieve article content.", 400
+    content = scraped if scraped else fallback_article_content(article_url)
+
+    if not content or len(content.strip()) < 50: # Minimum content length
+        logging.warning(f"Scraped content for {article_url} is too short or empty. Cannot summarize.")
+        return None, None, "Could not retrieve sufficient article content to summarize.", 400
+
+    logging.info(f"Scraped content for summary (first 100 chars): {content[:100]}")
+    return content, scraped, None, 200
+
+
+def summarize_article(article_url, allow_fallback=True, gemini_budget=None):
+    # Returns (result dict, error message, HTTP status). Results are cached per canonical URL, and
+    # concurrent requests for an uncached article (JSON, streams and pre-summarization alike) share
+    # one scrape and one Gemini call, so a popular headline costs one of each in total.
+    # Background callers pass allow_fallback=False and an HourlyBudget to cap their Gemini spend.
+    cache_key = article_cache_key(article_url)
+    cached = SUMMARY_CACHE.get(cache_key)
+    if cached is not CACHE_MISS:
+        logging.info(f"Summary cache hit for URL: {article_url}")
+        return cached, None, 200
+
+    restricted = not allow_fallback or gemini_budget is not None
+    for _ in range(2):
+        result, error, status, leader_specific = SUMMARY_FLIGHTS.do(
+            cache_key, lambda: compute_article_summary(article_url, cache_key, allow_fallback, gemini_budget) + (restricted,)
+        )
+        # The error may come from the leader's limits (a background job without fallback text or
+        # budget) or from a stream that was dropped halfway: not an answer for an unrestricted caller
+        if not (error and leader_specific and not restricted):
+            break
+    return result, error, status
+
+def compute_article_summary(article_url, cache_key, allow_fallback, gemini_budget):
+    cached = SUMMARY_CACHE.get(cache_key) # A flight for this article may have finished since the caller looked
+    if cached is not CACHE_MISS:
+        return cached, None, 200
+
+    content, scraped, error, status = prepare_summary_content(article_url, allow_fallback)
+    if error:
+        return None, error, status
+
+    if gemini_budget and not gemini_budget.try_acquire():
+        return None, "Gemini budget for background summaries is used up for this hour.", 429
+    try:
+        result = parse_summary_response(call_gemini_ai_for_summary(build_summary_prompt(content)))
+        logging.info(f"Parsed summary: {result['summary'][:30]}..., GenZ: {result['genz'][:30]}..., Impact: {result['impact'][:30]}..., Rating: {result['impactLevel']}")
+    except GeminiUnavailableError as e:
+        return None, str(e), 503
     except Exception as e:
         logging.error(f"Error during Gemini summary generation for {article_url}: {e}", exc_info=True)
-        return jsonify({"error": f"Failed to get or parse Gemini AI summary: {str(e)}"}), 500
+        return None, f"Failed to get or parse Gemini AI summary: {str(e)}", 500
 
-# Scraper function (from original)
-def safe_scrape_article(url):
-    try:
-        article = Article(url, fetch_images=False, request_timeout=7)
-        article.download()
+    if scraped: # Never cache a summary of the fallback text under the article's URL
+        SUMMARY_CACHE.set(cache_key, result, SUMMARY_CACHE_TTL)
+    return result, None, 200
+
+
+@app.route('/api/gemini-summary') # From original
+def gemini_summary():
+    if not GEMINI_MODEL:
+        return jsonify({"error": "Summary service is unavailable (Gemini model not configured)."}), 503
+
+    article_url = request.args.get('url')
+    if not article_url:
+        return jsonify({"error": "Missing url parameter"}), 400
+
+    logging.info(f"Gemini summary requested for URL: {article_url}")
+    if wants_event_stream():
+        return event_stream_response(stream_summary_events(article_url))
+    result, error, status = summarize_article(article_url)
+    if error:
+        return jsonify({"error": error}), status
+    return jsonify(result)
+
+# --- Article Scraping ---
+# One pooled keep-alive session for every publisher, a per-domain concurrency cap and request
+# spacing so bulk scraping stays polite, and an on-disk cache of raw HTML plus extracted text
+# that is revalidated with ETag/Last-Modified once it is no longer fresh.
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; YouthEconomyNavigator/1.0; +article-summary)",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+}
+
+def build_scrape_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=SCRAPE_MAX_WORKERS * 2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(SCRAPE_HEADERS)
+    return session
+
+SCRAPE_SESSION = None # Built by the first scrape, so importing app.py doesn't import requests
+SCRAPE_SESSION_LOCK = threading.Lock()
+
+def scrape_session():
+    global SCRAPE_SESSION
+    if SCRAPE_SESSION is None:
+        with SCRAPE_SESSION_LOCK:
+            if SCRAPE_SESSION is None:
+                SCRAPE_SESSION = build_scrape_session()
+    return SCRAPE_SESSION
+
+SCRAPE_CACHE = make_cache('scraped_pages', SCRAPE_CACHE_MAX_ENTRIES)
+DOMAIN_THROTTLE_MIN_PRUNE_SIZE = 256 # Domains tracked before the first prune
+SCRAPE_EXECUTOR = ThreadPoolExecutor(max_workers=SCRAPE_MAX_WORKERS, thread_name_prefix='scrape')
+
+class DomainThrottle:
+    # Limits concurrent requests per domain and spaces out request starts to the same domain.
+    # Every article links a new domain, so idle ones are pruned whenever the table has doubled.
+    def __init__(self, concurrency, min_interval):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_start = {}
+        self.active = {} # Domain -> requests holding or waiting for its semaphore
+        self.prune_at = DOMAIN_THROTTLE_MIN_PRUNE_SIZE
+
+    def prune(self, now):
+        # Drops domains with nothing in flight whose spacing has already passed; call with the lock held
+        for domain in [d for d, start_at in self.next_start.items() if start_at <= now and d not in self.active]:
+            del self.semaphores[domain], self.next_start[domain]
+        self.prune_at = max(DOMAIN_THROTTLE_MIN_PRUNE_SIZE, 2 * len(self.semaphores))
+
+    def acquire(self, domain):
+        with self.lock:
+            if len(self.semaphores) >= self.prune_at:
+                self.prune(time.time())
+            semaphore = self.semaphores.setdefault(domain, threading.BoundedSemaphore(self.concurrency))
+            self.active[domain] = self.active.get(domain, 0) + 1
+        semaphore.acquire()
+        with self.lock:
+            now = time.time()
+            start_at = max(now, self.next_start.get(domain, 0))
+            self.next_start[domain] = start_at + self.min_interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def release(self, domain):
+        with self.lock:
+            self.semaphores[domain].release()
+            self.active[domain] -= 1
+            if not self.active[domain]:
+                del self.active[domain]
+
+SCRAPE_THROTTLE = DomainThrottle(SCRAPE_PER_DOMAIN_CONCURRENCY, SCRAPE_PER_DOMAIN_MIN_INTERVAL)
+
+def extract_article_text(url, html):
+    with METRICS.span("newspaper3k", "parse"):
+        article = newspaper.Article(url, fetch_images=False)
+        article.download(input_html=html)
         article.parse()
-        if article.text and len(article.text.strip()) > 100:
-            logging.info(f"Newspaper3k successfully parsed: {url}")
-            return article.text
-        else:
-            logging.warning(f"Newspaper3k parsing of {url} resulted in short/empty text. Falling back to default content.")
+    return article.text
+
+HTML_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9._:-]+)""", re.IGNORECASE)
+HTTP_CHARSET = re.compile(r"""charset\s*=\s*["']?([A-Za-z0-9._:-]+)""", re.IGNORECASE)
+
+def decode_html(body, content_type):
+    # A BOM, then an explicit charset in Content-Type, then the page's own <meta charset> (or http-equiv),
+    # then UTF-8. requests and httpx both assume ISO-8859-1 for text/html without a charset, which turns
+    # UTF-8 pages into mojibake, so their guess is never used.
+    body = bytes(body)
+    if body.startswith(codecs.BOM_UTF8):
+        return body.decode("utf-8-sig", errors="replace")
+    header_match = HTTP_CHARSET.search(content_type or "")
+    meta_match = HTML_META_CHARSET.search(body[:4096])
+    for charset in (header_match and header_match.group(1), meta_match and meta_match.group(1).decode("ascii")):
+        if charset:
+            try:
+                return body.decode(charset, errors="replace")
+            except LookupError: # Unknown charset name, try the next source
+                pass
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return body.decode("cp1252", errors="replace")
+
+def download_article_html(url, cached=None):
+    # Returns (status, html, headers). Sends validators from `cached` so unchanged pages come back as 304.
+    headers = {}
+    if cached and cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+    domain = urlsplit(url).hostname or ""
+    SCRAPE_THROTTLE.acquire(domain)
+    try:
+        with METRICS.span("newspaper3k", "download"), scrape_session().get(url, headers=headers, timeout=SCRAPE_TIMEOUT, stream=True) as response:
+            if response.status_code == 304:
+                return 304, None, response.headers
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and "html" not in content_type.lower():
+                raise ValueError(f"Unsupported content type '{content_type}'")
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if len(body) > SCRAPE_MAX_BYTES:
+                    raise ValueError(f"Page larger than {SCRAPE_MAX_BYTES} bytes")
+            return response.status_code, decode_html(body, content_type), response.headers
+    finally:
+        SCRAPE_THROTTLE.release(domain)
+
+def store_scrape_result(url, cached, status, html, headers):
+    # Extracts and caches a download_article_html result (or refreshes `cached` on a 304); returns the text.
+    cache_key = article_cache_key(url)
+    if status == 304:
+        logging.info(f"Article unchanged since last scrape (304): {url}")
+        cached["checked_at"] = time.time()
+        SCRAPE_CACHE.set(cache_key, cached, SCRAPE_CACHE_TTL)
+        return cached["text"]
+
+    text = extract_article_text(url, html)
+    text = text if text and len(text.strip()) > 100 else None
+    if text:
+        logging.info(f"Newspaper3k successfully parsed: {url}")
+    else:
+        logging.warning(f"Newspaper3k parsing of {url} resulted in short/empty text. Falling back to default content.")
+    SCRAPE_CACHE.set(cache_key, {
+        "html": html, "text": text, "checked_at": time.time(),
+        "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+    }, SCRAPE_CACHE_TTL)
+    return text
+
+def scrape_article_text(url):
+    # Returns the article text, or None if no usable body could be extracted.
+    cache_key = article_cache_key(url)
+    cached = SCRAPE_CACHE.get(cache_key)
+    if cached is not CACHE_MISS and time.time() - cached["checked_at"] < SCRAPE_FRESH_SECONDS:
+        return cached["text"]
+    cached = cached if cached is not CACHE_MISS else None
+
+    try:
+        status, html, headers = download_article_html(url, cached)
+        return store_scrape_result(url, cached, status, html, headers)
     except Exception as e:
-       logging.warning(f"Newspaper3k failed for URL {url}: {e}. Falling back to default content.")
-    
+        logging.warning(f"Scraping failed for URL {url}: {e}. Falling back to default content.")
+        return cached["text"] if cached else None # A stale copy beats the fallback text
+
+def scrape_articles(urls):
+    # Batch API: scrapes many URLs concurrently (still throttled per domain). Returns {url: text or None}.
+    futures = {url: SCRAPE_EXECUTOR.submit(scrape_article_text, url) for url in dict.fromkeys(urls)}
+    return {url: future.result() for url, future in futures.items()}
+
+def fallback_article_content(url):
     # Fallback content if scraping fails or is insufficient
     logging.info(f"Using fallback content for URL: {url} after failed scrape or short content.")
     content = """Youth Unemployment: A Growing Challenge
@@ -548,11 +3055,25 @@ Solving youth unemployment requires a combination of government policy, private
 Tackling this issue is not just about jobs—it’s about securing the future of entire generations. When young people are empowered and employed, they contribute to a more stable, innovative, and prosperous society."""
     return content
 
+def safe_scrape_article(url):
+    return scrape_article_text(url) or fallback_article_content(url)
+
 
 # --- New Routes (from Teammate's app.py) ---
-@app.route('/api/company_profile', methods=['POST'])
+@app.route('/api/company_profile', methods=['GET', 'POST'])
 def company_profile_route():
+    # GET ?name=... is the cacheable form: the snapshot's build time drives ETag/Last-Modified, so a
+    # dashboard reload gets a 304 until the profile is rebuilt. POST {"company_name"} is kept for old clients.
     if not GEMINI_MODEL: return jsonify({"error": "AI features unavailable."}), 503
+    if request.method == 'GET':
+        company_name = (request.args.get('name') or '').strip()
+        if not company_name: return jsonify({"error": "Company name needed."}), 400
+        logging.info(f"Fetching WATCHED company profile for: {company_name}")
+        snapshot = watched_company_profile_snapshot(company_name)
+        return conditional_response(
+            ("profile", company_name, snapshot["built_at"]), snapshot["built_at"], lambda: jsonify(snapshot["profile"]), "private, no-cache"
+        )
+
     data = request.get_json()
     if not data or 'company_name' not in data:
         return jsonify({"error": "Company name needed."}), 400
@@ -561,22 +3082,323 @@ def company_profile_route():
 
 
     logging.info(f"Fetching WATCHED company profile for: {company_name}")
-    ticker = get_ticker_from_gemini(company_name)
-    stock_data, stock_error = None, None
-    if ticker and ticker.upper() not in ["PRIVATE", "UNKNOWN", "N/A"]:
-        stock_data, stock_error = get_enhanced_stock_data_from_fmp(ticker)
+    return jsonify(watched_company_profile(company_name))
+
+def dedupe_company_names(raw_names):
+    # Drop blanks and case-insensitive duplicates, keeping the caller's order
+    company_names, seen = [], set()
+    for name in raw_names:
+        name = str(name).strip() if name is not None else ''
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            company_names.append(name)
+    return company_names
+
+@app.route('/api/company_profiles', methods=['POST'])
+def company_profiles_route():
+    if not GEMINI_MODEL: return jsonify({"error": "AI features unavailable."}), 503
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('company_names'), list):
+        return jsonify({"error": "A list of company names is needed."}), 400
+
+    company_names = dedupe_company_names(data['company_names'])
+    if not company_names: return jsonify({"error": "Company names cannot be empty."}), 400
+    if len(company_names) > MAX_BATCH_COMPANIES:
+        return jsonify({"error": f"Too many companies (max {MAX_BATCH_COMPANIES} per request)."}), 400
+
+    logging.info(f"Fetching WATCHED company profiles in batch for {len(company_names)} companies")
+    return jsonify({"profiles": watched_company_profiles(company_names)})
+
+@app.route('/api/company_profiles/stream')
+def company_profiles_stream_route():
+    # ?name=A&name=B. Pushes a "profile" event ({company_name, changes, profile}) whenever a watched
+    # company's snapshot is rebuilt with a different price, change or recommendation. At most
+    # PROFILE_PUSH_MAX_STREAMS per process; a refused dashboard polls /api/company_profiles instead.
+    if not GEMINI_MODEL: return jsonify({"error": "AI features unavailable."}), 503
+    company_names = dedupe_company_names(request.args.getlist('name'))
+    if not company_names: return jsonify({"error": "Company names cannot be empty."}), 400
+    if len(company_names) > MAX_BATCH_COMPANIES:
+        return jsonify({"error": f"Too many companies (max {MAX_BATCH_COMPANIES} per request)."}), 400
+    if not PROFILE_PUSH_STREAMS.acquire(blocking=False):
+        return jsonify({"error": "Live profile updates are unavailable; poll /api/company_profiles instead."}), 503
+    try:
+        response = event_stream_response(stream_profile_updates(ProfileWatch(company_names)))
+    except Exception:
+        PROFILE_PUSH_STREAMS.release()
+        raise
+    response.call_on_close(PROFILE_PUSH_STREAMS.release) # Runs whether the stream ended or the client left
+    return response
+
+def cache_stats_snapshot():
+    # Hit/miss counters for monitoring upstream savings
+    return {
+        "company_resolution": RESOLUTION_CACHE.stats(),
+        "fmp_quotes": QUOTE_CACHE.stats(),
+        "fmp_historical": HISTORICAL_CACHE.stats(),
+        "fmp_single_flight": MARKET_DATA_FLIGHTS.stats(),
+        "summary_single_flight": SUMMARY_FLIGHTS.stats(),
+        "profile_single_flight": PROFILE_FLIGHTS.stats(),
+        "recommendation_memo": RECOMMENDATION_MEMO.stats(),
+        "price_history": PRICE_HISTORY.stats(),
+        "article_summaries": SUMMARY_CACHE.stats(),
+        "chat_responses": CHAT_CACHE.stats(),
+        "scraped_pages": SCRAPE_CACHE.stats(),
+        "product_identifications": PRODUCT_IMAGE_CACHE.stats(),
+        "product_image_bands": PRODUCT_IMAGE_BANDS.stats(),
+        "company_profiles": PROFILE_SNAPSHOTS.stats(),
+        "gemini_client": GEMINI_MODEL.stats() if isinstance(GEMINI_MODEL, GeminiClient) else None,
+        "profile_refresh": {"pending": len(PROFILE_REFRESH_PENDING)},
+        "presummarization": {
+            "pending": len(PRESUMMARIZE_PENDING),
+            "gemini_calls_last_hour": PRESUMMARIZE_BUDGET.used(),
+            "gemini_budget_per_hour": PRESUMMARIZE_BUDGET.limit,
+        },
+    }
 
-    gemini_brief_details = get_watched_company_brief_from_gemini(company_name, stock_data)
-    logo_url = get_logo_url(company_name)
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Upload too large (max {MAX_CONTENT_LENGTH // (1024 * 1024)} MB)."}), 413
+
+# --- Health & Readiness ---
+# /healthz: the process is up. /readyz: it can serve the dashboard and /api/news, which is all a
+# load balancer needs to start sending traffic. /readyz/ai: Gemini is initialized too. Both
+# readiness bodies carry the news and AI states so a deploy can watch the AI stack come up.
+def readiness_snapshot():
+    news_error = None if NEWS_API_KEY else "News API key not configured."
+    if not news_error:
+        try:
+            NEWS_STORE.tracked_feeds()
+        except sqlite3.Error as e:
+            news_error = f"News store unavailable: {e}"
+    return {
+        "news": {"ready": news_error is None, "error": news_error},
+        "ai": {"ready": GEMINI_MODEL is not None, **GEMINI_STATUS},
+    }
+
+@app.route('/healthz')
+def healthz_route():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz_route():
+    snapshot = readiness_snapshot()
+    return jsonify(snapshot), 200 if snapshot["news"]["ready"] else 503
+
+@app.route('/readyz/ai')
+def readyz_ai_route():
+    snapshot = readiness_snapshot()
+    return jsonify(snapshot), 200 if snapshot["ai"]["ready"] else 503
+
+@app.route('/api/cache_stats')
+def cache_stats_route():
+    return jsonify(cache_stats_snapshot())
+
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus text exposition: route and upstream latency histograms, error counters,
+    # plus cache and Gemini client counters sampled at scrape time.
+    lines = METRICS.render()
+    snapshot = cache_stats_snapshot()
+    caches = {name: stats for name, stats in snapshot.items() if isinstance(stats, dict) and "hits" in stats}
+    for metric, field, kind in [("econdecode_cache_hits_total", "hits", "counter"), ("econdecode_cache_misses_total", "misses", "counter"), ("econdecode_cache_entries", "size", "gauge")]:
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(
+            f"{metric}{format_metric_labels((('cache', name),))} {stats[field]}"
+            for name, stats in caches.items() if isinstance(stats.get(field), (int, float)) # Redis reports no size
+        )
+    lines.append("# TYPE econdecode_single_flight_coalesced_total counter")
+    lines.extend(
+        f"econdecode_single_flight_coalesced_total{format_metric_labels((('flight', flight),))} {snapshot[f'{flight}_single_flight']['coalesced']}"
+        for flight in ("fmp", "summary", "profile")
+    )
+    gemini = snapshot["gemini_client"]
+    if gemini:
+        lines.append("# TYPE econdecode_gemini_client_events_total counter")
+        lines.extend(f"econdecode_gemini_client_events_total{format_metric_labels((('event', event),))} {gemini[event]}" for event in ("calls", "retries", "failures", "rejected"))
+        lines.append("# TYPE econdecode_gemini_circuit_open gauge")
+        lines.append(f"econdecode_gemini_circuit_open {0 if gemini['circuit'] == 'closed' else 1}")
+    lines.append("# TYPE econdecode_presummarize_pending gauge")
+    lines.append(f"econdecode_presummarize_pending {snapshot['presummarization']['pending']}")
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+# --- Product Image Pipeline ---
+class SpooledUploadRequest(Request):
+    # Werkzeug's request with a configurable in-memory threshold for uploaded files
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY_BYTES, mode="rb+")
+
+app.request_class = SpooledUploadRequest
+
+PRODUCT_IMAGE_CACHE = make_cache('product_identifications', PRODUCT_IMAGE_CACHE_MAX_ENTRIES)
+# Band index for near-duplicate lookups: band key -> recent full hashes that share that band exactly
+PRODUCT_IMAGE_BANDS = make_cache('product_image_bands', PRODUCT_IMAGE_CACHE_MAX_ENTRIES * 8)
+PRODUCT_IMAGE_BAND_MAX_HASHES = 64 # Most recent hashes kept per band bucket
+
+PRODUCT_IDENTIFICATION_PROMPT = (
+    "Identify the primary product and the parent company that makes this product. "
+    "Format your response strictly as: Product: [Identified Product Name] | Company: [Identified Company Name]. "
+    "If you cannot identify the product or company, use 'Unknown' for that part. "
+    "For example: Product: iPhone 15 Pro | Company: Apple. Or Product: Big Mac | Company: McDonald's. "
+    "If only product is clear: Product: Widget X | Company: Unknown. "
+    "If neither is clear: Product: Unknown | Company: Unknown."
+)
+
+class ProductImageTooLargeError(ValueError):
+    pass
+
+def prepare_product_image(image_file):
+    # Returns (downscaled RGB image, JPEG bytes of it) for a binary file object, e.g. the spooled
+    # upload. Phone photos are often 12MP+; the model identifies products just as well at
+    # PRODUCT_IMAGE_MAX_DIMENSION and the payload is a fraction of the size. The full-resolution
+    # bitmap is never built: JPEGs are decoded at a reduced DCT scale (draft) and shrunk before
+    # anything else touches them, so memory stays bounded by the target size, not the upload's.
+    with PIL.Image.open(image_file) as source: # Only reads the header
+        if source.width * source.height > PRODUCT_IMAGE_MAX_PIXELS:
+            raise ProductImageTooLargeError(f"Image is too large ({source.width}x{source.height} pixels).")
+        source.draft("RGB", (PRODUCT_IMAGE_MAX_DIMENSION * 2, PRODUCT_IMAGE_MAX_DIMENSION * 2)) # 2x headroom for a clean resample
+        source.thumbnail((PRODUCT_IMAGE_MAX_DIMENSION, PRODUCT_IMAGE_MAX_DIMENSION))
+        img = PIL.ImageOps.exif_transpose(source) # Camera rotation lives in EXIF, which re-encoding drops
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=PRODUCT_IMAGE_JPEG_QUALITY, optimize=True)
+    return img, buffer.getvalue()
+
+def image_dhash(img):
+    # 64-bit difference hash: shrink to 9x8 greyscale and record whether each pixel is brighter
+    # than its right-hand neighbour. Robust to rescaling, recompression and small lighting changes.
+    pixels = list(img.convert("L").resize((9, 8), PIL.Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+def image_hash_bands(image_hash):
+    # Pigeonhole: split the 64 bits into PRODUCT_IMAGE_HASH_MAX_DISTANCE + 1 bands, so any two hashes
+    # within that distance agree exactly on at least one band. The band count is part of the key,
+    # so changing the distance just starts a fresh index instead of matching against the old one.
+    bands = max(1, min(PRODUCT_IMAGE_HASH_MAX_DISTANCE + 1, 64))
+    value = int(image_hash, 16)
+    bounds = [64 * i // bands for i in range(bands + 1)]
+    return [
+        f"{bands}:{i}:{(value >> bounds[i]) & ((1 << (bounds[i + 1] - bounds[i])) - 1):x}"
+        for i in range(bands)
+    ]
+
+def remember_product_identification(image_hash, identification):
+    PRODUCT_IMAGE_CACHE.set(image_hash, identification, PRODUCT_IMAGE_CACHE_TTL)
+    for band_key in image_hash_bands(image_hash):
+        # Read-modify-write; a lost race only drops a near-duplicate candidate, never an exact hit
+        hashes = [h for h in PRODUCT_IMAGE_BANDS.get(band_key, None) or [] if h != image_hash]
+        hashes.append(image_hash)
+        PRODUCT_IMAGE_BANDS.set(band_key, hashes[-PRODUCT_IMAGE_BAND_MAX_HASHES:], PRODUCT_IMAGE_CACHE_TTL)
+
+def find_cached_product_identification(image_hash):
+    # Exact hash first, then the closest stored hash within PRODUCT_IMAGE_HASH_MAX_DISTANCE bits.
+    # Candidates come from the band index (a handful of lookups), never a walk of the whole cache.
+    cached = PRODUCT_IMAGE_CACHE.get(image_hash, None)
+    if cached is not None:
+        return cached
+    candidates = set()
+    for band_key in image_hash_bands(image_hash):
+        candidates.update(PRODUCT_IMAGE_BANDS.get(band_key, None) or [])
+    for distance, key in sorted((hamming_distance(image_hash, key), key) for key in candidates):
+        if distance > PRODUCT_IMAGE_HASH_MAX_DISTANCE:
+            break
+        cached = PRODUCT_IMAGE_CACHE.get(key, None) # The index can outlive an evicted identification
+        if cached is not None:
+            logging.info(f"Product image {image_hash} matched cached scan {key} ({distance} bits apart).")
+            return cached
+    return None
+
+def identify_product_with_gemini(jpeg_bytes):
+    # Returns (product, company, error). error is set only when Gemini blocked the image.
+    # Use list of parts for multimodal input
+    prompt_parts = [PRODUCT_IDENTIFICATION_PROMPT, {"mime_type": "image/jpeg", "data": jpeg_bytes}]
+
+    logging.info(f"Sending {len(jpeg_bytes)} byte image to Gemini for product/company identification (model: {GEMINI_MODEL_NAME}).")
+    response_id = GEMINI_MODEL.generate_content(prompt_parts, endpoint="vision")
+    identified_product, identified_company, blocked_error = product_identification_from_response(response_id)
+    if blocked_error:
+        return None, None, blocked_error
+
+    if identified_company.lower() == "unknown" and identified_product.lower() != "unknown":
+        # If company is unknown but product is known, try a specific query for the company.
+        try:
+            logging.info(f"Product '{identified_product}' identified, attempting to find company via second Gemini call.")
+            company_res_gen = GEMINI_MODEL.generate_content(parent_company_prompt(identified_product), endpoint="vision")
+            identified_company = parent_company_from_response(identified_product, company_res_gen) or identified_company
+        except Exception as e_comp:
+            logging.warning(f"Error during fallback company identification for '{identified_product}': {e_comp}")
+
+    return identified_product, identified_company, None
+
+
+def product_identification_from_response(response_id):
+    # Returns (product, company, error). error is set only when Gemini blocked the image.
+    identified_product, identified_company = "Unknown", "Unknown" # Defaults
+
+    if response_id and hasattr(response_id, 'text') and response_id.text:
+        text_res = response_id.text.strip()
+        logging.info(f"Gemini raw identification response: {text_res}")
+        # Try to parse based on the requested format
+        product_match = re.search(r"Product:\s*(.*?)\s*\|", text_res, re.IGNORECASE)
+        company_match = re.search(r"Company:\s*(.*?)\s*$", text_res, re.IGNORECASE)
+
+        if product_match:
+            identified_product = product_match.group(1).strip()
+            if not identified_product: identified_product = "Unknown" # If empty after "Product:"
+        if company_match:
+            identified_company = company_match.group(1).strip()
+            if not identified_company: identified_company = "Unknown" # If empty after "Company:"
+
+        # Fallback if parsing fails but some text is there
+        if identified_product == "Unknown" and identified_company == "Unknown" and "Unknown" not in text_res :
+            # If Gemini didn't follow format but gave some text, assume it might be the product
+            # Or, it might be a general description. This is a heuristic.
+            if len(text_res) < 50 : identified_product = text_res # Short response likely product
+            else: logging.warning(f"Gemini response '{text_res}' did not match expected Product/Company format.")
+
+    elif response_id.prompt_feedback and response_id.prompt_feedback.block_reason:
+        logging.warning(f"Gemini image analysis blocked: {response_id.prompt_feedback.block_reason.name}")
+        return None, None, f"Image analysis blocked by AI safety ({response_id.prompt_feedback.block_reason.name})."
+
+    logging.info(f"Identified after parsing: Product='{identified_product}', Company='{identified_company}'")
+    return identified_product, identified_company, None
+
+
+def parent_company_prompt(product_name):
+    return f"What is the primary parent company that makes the product '{product_name}'? Respond with ONLY the company name. If unknown, respond 'Unknown'."
+
+
+def parent_company_from_response(product_name, company_res_gen):
+    if company_res_gen and hasattr(company_res_gen, 'text') and company_res_gen.text:
+        comp_text = company_res_gen.text.strip()
+        if comp_text.lower() != 'unknown' and comp_text:
+            logging.info(f"Company for '{product_name}' identified as '{comp_text}' in fallback.")
+            return comp_text
+    return None
+
+
+def product_stock_summary(stock_data, stock_error):
+    # One-line stock context for the product analyzer prompts
+    if stock_data:
+        summary = (
+            f"Symbol: {stock_data.get('symbol', 'N/A')}, "
+            f"Price: {stock_data.get('price', 'N/A')}, "
+            f"Day Change %: {stock_data.get('change_percent', 'N/A')}%"
+        )
+        if stock_data.get('month_change_percent') is not None:
+             summary += f", Month Change %: {stock_data.get('month_change_percent')}%"
+        return summary
+    if stock_error: # Use the error message from FMP if available
+        return f"Stock data issue: {stock_error}"
+    return "Company might be private or stock data unavailable."
 
-    return jsonify({
-        "company_name": company_name, 
-        "ticker_symbol": ticker or "N/A",
-        "logo_url": logo_url,
-        "stock_data": stock_data, 
-        "stock_error": stock_error, # This will contain error messages from FMP if any
-        "profile_details": gemini_brief_details
-    })
 
 @app.route('/api/analyze_product_image', methods=['POST'])
 def analyze_product_image_route():
@@ -591,68 +3413,22 @@ def analyze_product_image_route():
     if file.filename == '': return jsonify({"error": "No image selected."}), 400
 
     try:
-        image_bytes = file.read()
-        img = PIL.Image.open(io.BytesIO(image_bytes)) # Validate it's an image
-        
-        # Use list of parts for multimodal input
-        prompt_parts = [
-            "Identify the primary product and the parent company that makes this product. "
-            "Format your response strictly as: Product: [Identified Product Name] | Company: [Identified Company Name]. "
-            "If you cannot identify the product or company, use 'Unknown' for that part. "
-            "For example: Product: iPhone 15 Pro | Company: Apple. Or Product: Big Mac | Company: McDonald's. "
-            "If only product is clear: Product: Widget X | Company: Unknown. "
-            "If neither is clear: Product: Unknown | Company: Unknown.",
-            img # Pass the PIL.Image object
-        ]
-        
-        logging.info(f"Sending image to Gemini for product/company identification (model: {GEMINI_MODEL_NAME}).")
-        response_id = GEMINI_MODEL.generate_content(prompt_parts)
-        
-        identified_product, identified_company = "Unknown", "Unknown" # Defaults
-
-        if response_id and hasattr(response_id, 'text') and response_id.text:
-            text_res = response_id.text.strip()
-            logging.info(f"Gemini raw identification response: {text_res}")
-            # Try to parse based on the requested format
-            product_match = re.search(r"Product:\s*(.*?)\s*\|", text_res, re.IGNORECASE)
-            company_match = re.search(r"Company:\s*(.*?)\s*$", text_res, re.IGNORECASE)
-
-            if product_match:
-                identified_product = product_match.group(1).strip()
-                if not identified_product: identified_product = "Unknown" # If empty after "Product:"
-            if company_match:
-                identified_company = company_match.group(1).strip()
-                if not identified_company: identified_company = "Unknown" # If empty after "Company:"
-            
-            # Fallback if parsing fails but some text is there
-            if identified_product == "Unknown" and identified_company == "Unknown" and "Unknown" not in text_res :
-                # If Gemini didn't follow format but gave some text, assume it might be the product
-                # Or, it might be a general description. This is a heuristic.
-                if len(text_res) < 50 : identified_product = text_res # Short response likely product
-                else: logging.warning(f"Gemini response '{text_res}' did not match expected Product/Company format.")
-
-
-        elif response_id.prompt_feedback and response_id.prompt_feedback.block_reason:
-            logging.warning(f"Gemini image analysis blocked: {response_id.prompt_feedback.block_reason.name}")
-            return jsonify({"error": f"Image analysis blocked by AI safety ({response_id.prompt_feedback.block_reason.name})."}), 400
-        
-        logging.info(f"Identified after parsing: Product='{identified_product}', Company='{identified_company}'")
-
-        if identified_company.lower() == "unknown" and identified_product.lower() != "unknown":
-            # If company is unknown but product is known, try a specific query for the company.
-            try:
-                logging.info(f"Product '{identified_product}' identified, attempting to find company via second Gemini call.")
-                company_res_gen = GEMINI_MODEL.generate_content(
-                    f"What is the primary parent company that makes the product '{identified_product}'? Respond with ONLY the company name. If unknown, respond 'Unknown'."
-                )
-                if company_res_gen and hasattr(company_res_gen, 'text') and company_res_gen.text:
-                    comp_text = company_res_gen.text.strip()
-                    if comp_text.lower() != 'unknown' and comp_text:
-                        identified_company = comp_text
-                        logging.info(f"Company for '{identified_product}' identified as '{identified_company}' in fallback.")
-            except Exception as e_comp:
-                logging.warning(f"Error during fallback company identification for '{identified_product}': {e_comp}")
-
+        try:
+            img, jpeg_bytes = prepare_product_image(file.stream) # Also validates it's an image
+        finally:
+            file.close() # Drop the spooled upload now rather than at the end of the request
+        image_hash = image_dhash(img)
+
+        cached_identification = find_cached_product_identification(image_hash)
+        if cached_identification:
+            identified_product, identified_company = cached_identification["product"], cached_identification["company"]
+            logging.info(f"Product image cache hit: Product='{identified_product}', Company='{identified_company}'")
+        else:
+            identified_product, identified_company, blocked_error = identify_product_with_gemini(jpeg_bytes)
+            if blocked_error:
+                return jsonify({"error": blocked_error}), 400
+            if identified_company.lower() != "unknown": # A clearer rescan may still succeed, so don't cache misses
+                remember_product_identification(image_hash, {"product": identified_product, "company": identified_company})
 
         if identified_company.lower() == "unknown":
             # If company is still unknown, return with what we have (product might be known)
@@ -665,21 +3441,10 @@ def analyze_product_image_route():
         # Proceed if company is identified
         ticker = get_ticker_from_gemini(identified_company)
         stock_data, stock_error = None, None
-        stock_data_summary_for_gemini = "Company might be private or stock data unavailable."
-
         if ticker and ticker.upper() not in ["PRIVATE", "UNKNOWN", "N/A"]:
             stock_data, stock_error = get_enhanced_stock_data_from_fmp(ticker)
-            if stock_data:
-                stock_data_summary_for_gemini = (
-                    f"Symbol: {stock_data.get('symbol', 'N/A')}, "
-                    f"Price: {stock_data.get('price', 'N/A')}, "
-                    f"Day Change %: {stock_data.get('change_percent', 'N/A')}%"
-                )
-                if stock_data.get('month_change_percent') is not None:
-                     stock_data_summary_for_gemini += f", Month Change %: {stock_data.get('month_change_percent')}%"
-            elif stock_error: # Use the error message from FMP if available
-                stock_data_summary_for_gemini = f"Stock data issue: {stock_error}"
-        
+        stock_data_summary_for_gemini = product_stock_summary(stock_data, stock_error)
+
         gemini_profile_details = get_product_analyzer_company_details_from_gemini(
             identified_company, 
             stock_data_summary=stock_data_summary_for_gemini, 
@@ -697,9 +3462,14 @@ def analyze_product_image_route():
             "profile_details": gemini_profile_details
         })
 
+    except GeminiUnavailableError as e:
+        return jsonify({"error": f"{e} Please try again in a minute."}), 503
     except PIL.UnidentifiedImageError:
         logging.error("Invalid image file provided for analysis.")
         return jsonify({"error": "Invalid or unsupported image file format."}), 400
+    except (ProductImageTooLargeError, PIL.Image.DecompressionBombError) as e:
+        logging.warning(f"Rejected oversized product image: {e}")
+        return jsonify({"error": f"{e} Please upload a smaller photo."}), 413
     except Exception as e:
         logging.error(f"Product image analysis server error: {e}", exc_info=True)
         return jsonify({"error": f"An unexpected server error occurred during image analysis: {str(e)}"}), 500
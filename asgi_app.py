@@ -0,0 +1,1147 @@
+# Async (ASGI) serving mode. The I/O-bound routes (chat, article summaries, company profiles and
+# product scans) are served by async handlers that share one pooled httpx.AsyncClient and call
+# the Gemini REST API directly, so a slow upstream costs a suspended coroutine instead of a
+# thread. Everything else (dashboard, static files, /api/news from the local store, cache stats,
+# /metrics) is the unchanged Flask app, mounted as WSGI underneath.
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+#
+# Responses match the Flask routes byte-for-byte in shape: same JSON fields, error messages,
+# status codes and SSE events. Caches, prompts, parsers, the Gemini rate limit/circuit breaker
+# and metrics are all app.py's, so both modes can run against the same cache databases.
+import asyncio
+import base64
+import functools
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+from werkzeug.http import http_date, parse_date, parse_etags
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.formparsers import MultiPartParser
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as core
+from app import CACHE_MISS, GeminiUnavailableError, METRICS
+
+# --- Configuration ---
+GEMINI_ASYNC_MAX_CONCURRENCY = int(os.environ.get('GEMINI_ASYNC_MAX_CONCURRENCY', 64)) # In-flight coroutines, not threads
+GEMINI_ASYNC_ENDPOINT_MAX_CONCURRENCY = int(os.environ.get('GEMINI_ASYNC_ENDPOINT_MAX_CONCURRENCY', 32))
+ASGI_HTTP_MAX_CONNECTIONS = int(os.environ.get('ASGI_HTTP_MAX_CONNECTIONS', 100)) # Shared by Gemini, FMP and scraping
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10)) # Threads for the mounted Flask routes
+
+GEMINI_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+GEMINI_AUTH_STATUSES = {401, 403} # Not retried, but they count against the breaker
+
+logging.getLogger("httpx").setLevel(logging.WARNING) # Its INFO lines carry full URLs, FMP's apikey included
+
+HTTP_CLIENT = None # httpx.AsyncClient, opened in lifespan()
+GEMINI = None # AsyncGeminiClient, None when app.py has no Gemini model (yet)
+GEMINI_ATTACHED = None # asyncio.Task that sets GEMINI once app.py's background model init is done
+
+
+# --- Gemini REST Client ---
+class GeminiRestError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"Gemini API error (HTTP {status_code}): {message}")
+        self.status_code = status_code
+        self.retryable = status_code in GEMINI_RETRYABLE_STATUSES
+
+
+class RestGeminiResponse:
+    # Wraps a generateContent JSON payload in the attributes app.py's *_from_response helpers
+    # read from SDK responses: parts, text, prompt_feedback.block_reason.name, candidates[].finish_reason.name.
+    def __init__(self, payload):
+        self.payload = payload
+        block_reason = (payload.get("promptFeedback") or {}).get("blockReason")
+        self.prompt_feedback = SimpleNamespace(block_reason=SimpleNamespace(name=block_reason) if block_reason else None)
+        self.candidates = [
+            SimpleNamespace(
+                finish_reason=SimpleNamespace(name=candidate.get("finishReason", "FINISH_REASON_UNSPECIFIED")),
+                parts=[SimpleNamespace(text=part["text"]) for part in (candidate.get("content") or {}).get("parts", []) if "text" in part],
+            )
+            for candidate in payload.get("candidates") or []
+        ]
+
+    @property
+    def parts(self):
+        return self.candidates[0].parts if self.candidates else []
+
+    @property
+    def text(self):
+        # Like the SDK: no parts (blocked, or an empty candidate) is a ValueError, not ""
+        if not self.parts:
+            raise ValueError("The response did not contain any text parts.")
+        return "".join(part.text for part in self.parts)
+
+    def __repr__(self):
+        return f"RestGeminiResponse({json.dumps(self.payload)[:500]})"
+
+
+def rest_contents(contents):
+    # A prompt string, or a list of strings and {"mime_type", "data"} image blobs, as REST contents
+    parts = []
+    for item in contents if isinstance(contents, list) else [contents]:
+        if isinstance(item, dict) and "data" in item:
+            parts.append({"inlineData": {"mimeType": item["mime_type"], "data": base64.b64encode(item["data"]).decode("ascii")}})
+        else:
+            parts.append({"text": str(item)})
+    return [{"role": "user", "parts": parts}]
+
+def rest_schema(schema):
+    # The REST API expects OpenAPI type names in upper case ("OBJECT", "STRING")
+    converted = {}
+    for key, value in schema.items():
+        if key == "type":
+            converted[key] = value.upper()
+        elif key == "properties":
+            converted[key] = {name: rest_schema(prop) for name, prop in value.items()}
+        elif key == "items":
+            converted[key] = rest_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+def rest_generation_config(generation_config):
+    if generation_config is None:
+        return None
+    fields = {
+        "temperature": generation_config.temperature,
+        "maxOutputTokens": generation_config.max_output_tokens,
+        "responseMimeType": generation_config.response_mime_type,
+        "responseSchema": rest_schema(generation_config.response_schema) if generation_config.response_schema else None,
+    }
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+class AsyncGeminiClient:
+    # Async counterpart of app.GeminiClient. Concurrency is capped by asyncio semaphores (much
+    # higher than the thread-bound limits, since waiting costs no thread); the token bucket,
+    # circuit breaker and call counters are the sync client's, so the project's RPM quota and
+    # the breaker state hold across both serving modes.
+    def __init__(self, sync_client, http):
+        self.sync = sync_client
+        self.http = http
+        self.global_slots = asyncio.Semaphore(GEMINI_ASYNC_MAX_CONCURRENCY)
+        self.endpoint_slots = {}
+
+    def _url(self, method):
+        base = core.GEMINI_API_URL.rstrip('/')
+        return f"{base}/v1beta/models/{core.GEMINI_MODEL_NAME}:{method}"
+
+    async def _acquire(self, semaphore, endpoint, deadline_at):
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=max(0, deadline_at - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.sync._reject(endpoint, "too many concurrent requests")
+
+    async def _take_token(self, endpoint, deadline_at):
+        while True:
+            wait_for = self.sync.bucket.reserve()
+            if wait_for == 0:
+                return
+            if time.monotonic() + wait_for > deadline_at:
+                self.sync._reject(endpoint, "rate limit")
+            await asyncio.sleep(wait_for)
+
+    async def _send(self, endpoint, deadline_at, method, body, stream):
+        # Returns the (open, if stream) httpx response of the first successful attempt
+        if not self.sync.breaker.allow():
+            self.sync._reject(endpoint, "circuit open")
+        endpoint_slot = self.endpoint_slots.setdefault(endpoint, asyncio.Semaphore(GEMINI_ASYNC_ENDPOINT_MAX_CONCURRENCY))
+        await self._acquire(endpoint_slot, endpoint, deadline_at)
+        try:
+            await self._acquire(self.global_slots, endpoint, deadline_at)
+            try:
+                return await self._send_with_retries(endpoint, deadline_at, method, body, stream)
+            finally:
+                self.global_slots.release()
+        finally:
+            endpoint_slot.release()
+
+    async def _send_with_retries(self, endpoint, deadline_at, method, body, stream):
+        url = self._url(method) + ("?alt=sse" if stream else "")
+        headers = {"x-goog-api-key": core.GEMINI_API_KEY}
+        for attempt in range(core.GEMINI_MAX_RETRIES + 1):
+            await self._take_token(endpoint, deadline_at)
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self.sync._reject(endpoint, "deadline exceeded")
+            self.sync._count("calls")
+            try:
+                with METRICS.span("gemini", endpoint):
+                    request = self.http.build_request("POST", url, json=body, headers=headers, timeout=remaining)
+                    response = await self.http.send(request, stream=stream)
+                    if response.status_code >= 400:
+                        error_body = await response.aread()
+                        await response.aclose()
+                        raise GeminiRestError(response.status_code, error_body[:300].decode("utf-8", errors="replace"))
+            except (GeminiRestError, httpx.TimeoutException, httpx.TransportError) as e:
+                if isinstance(e, GeminiRestError) and e.status_code in GEMINI_AUTH_STATUSES:
+                    self.sync.breaker.record_failure()
+                    self.sync._count("failures")
+                    raise
+                if isinstance(e, GeminiRestError) and not e.retryable: # Gemini answered, just not usefully: it is up
+                    self.sync.breaker.record_success()
+                    raise
+                self.sync.breaker.record_failure()
+                self.sync._count("failures")
+                backoff = random.uniform(0, min(core.GEMINI_BACKOFF_MAX, core.GEMINI_BACKOFF_BASE * (2 ** attempt))) # Full jitter
+                if attempt == core.GEMINI_MAX_RETRIES or time.monotonic() + backoff >= deadline_at or not self.sync.breaker.allow():
+                    raise
+                logging.warning(f"Gemini '{endpoint}' call failed ({type(e).__name__}), retrying in {backoff:.2f}s.")
+                self.sync._count("retries")
+                await asyncio.sleep(backoff)
+                continue
+            except BaseException: # Unexpected errors and cancellations say nothing about Gemini
+                self.sync.breaker.release_trial()
+                raise
+            self.sync.breaker.record_success()
+            return response
+
+    def _body(self, contents, generation_config):
+        body = {"contents": rest_contents(contents)}
+        config = rest_generation_config(generation_config)
+        if config:
+            body["generationConfig"] = config
+        return body
+
+    async def generate_content(self, contents, generation_config=None, endpoint="default", deadline=None):
+        deadline_at = time.monotonic() + (deadline or core.GEMINI_CALL_DEADLINE)
+        response = await self._send(endpoint, deadline_at, "generateContent", self._body(contents, generation_config), stream=False)
+        return RestGeminiResponse(response.json())
+
+    async def stream_generate_content(self, contents, generation_config=None, endpoint="default", deadline=None):
+        # Async generator of RestGeminiResponse chunks. Like the sync client, the slots are only
+        # held until the stream is open.
+        deadline_at = time.monotonic() + (deadline or core.GEMINI_CALL_DEADLINE)
+        response = await self._send(endpoint, deadline_at, "streamGenerateContent", self._body(contents, generation_config), stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield RestGeminiResponse(json.loads(line[len("data:"):]))
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            self.sync.record_stream_failure(endpoint, e)
+            raise
+        finally:
+            await response.aclose()
+
+
+# --- Request Plumbing ---
+def instrumented(route):
+    # Same trace ID handling and route metrics as app.py's before/after_request hooks
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            trace_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])[:64]
+            core.TRACE_ID.set(trace_id)
+            if GEMINI_ATTACHED is not None and not GEMINI_ATTACHED.done(): # Still starting up
+                await asyncio.wait([GEMINI_ATTACHED], timeout=core.GEMINI_INIT_WAIT_SECONDS)
+            try:
+                response = await handler(request)
+            except Exception:
+                METRICS.inc("econdecode_http_requests_total", route=route, method=request.method, status=500)
+                raise
+            METRICS.observe("econdecode_http_request_duration_seconds", time.perf_counter() - started, route=route, method=request.method)
+            METRICS.inc("econdecode_http_requests_total", route=route, method=request.method, status=response.status_code)
+            response.headers['X-Request-ID'] = trace_id
+            return response
+        return wrapper
+    return decorator
+
+async def request_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+class RequestTooLargeError(Exception):
+    pass
+
+MultiPartParser.spool_max_size = core.UPLOAD_SPOOL_MEMORY_BYTES # Uploaded files beyond this go to a temp file
+
+def limited_receive(receive, max_bytes):
+    # Wraps an ASGI receive callable so a body (chunked or lying about its length) can't exceed max_bytes
+    received = 0
+
+    async def receive_limited():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise RequestTooLargeError()
+        return message
+    return receive_limited
+
+async def request_form(request):
+    # request.form() bounded by MAX_CONTENT_LENGTH, like Flask's; raises RequestTooLargeError
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > core.MAX_CONTENT_LENGTH:
+        raise RequestTooLargeError()
+    return await Request(request.scope, limited_receive(request.receive, core.MAX_CONTENT_LENGTH)).form()
+
+def wants_event_stream(request):
+    return request.query_params.get('stream') in ('1', 'true') or 'text/event-stream' in request.headers.get('Accept', '')
+
+def event_stream_response(events):
+    return StreamingResponse(events, media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+async def stream_text_chunks(chunks):
+    # Yields (text, chunk) for every chunk; text is "" for blocked or empty candidates
+    async for chunk in chunks:
+        try:
+            text = chunk.text
+        except ValueError:
+            text = ""
+        yield text, chunk
+
+def block_reason(chunk):
+    return chunk.prompt_feedback.block_reason.name if chunk and chunk.prompt_feedback.block_reason else None
+
+
+class AsyncSingleFlight:
+    # Event-loop counterpart of app.SingleFlight: concurrent coroutines asking for the same key share one fetch
+    def __init__(self):
+        self.in_flight = {} # key -> asyncio.Future
+        self.coalesced = 0
+
+    async def do_many(self, keys, fetch):
+        keys = list(dict.fromkeys(keys))
+        loop = asyncio.get_running_loop()
+        following = {key: self.in_flight[key] for key in keys if key in self.in_flight}
+        leading = {key: loop.create_future() for key in keys if key not in self.in_flight}
+        self.in_flight.update(leading)
+        self.coalesced += len(following)
+
+        results = {}
+        if leading:
+            try:
+                fetched = await fetch(list(leading))
+                for key, future in leading.items():
+                    future.set_result(fetched[key])
+            except BaseException as e:
+                for future in leading.values():
+                    if future.done():
+                        continue
+                    if isinstance(e, Exception):
+                        future.set_exception(e)
+                    else: # Cancelled: waiters are cancelled too
+                        future.cancel()
+                raise
+            finally:
+                for key in leading:
+                    del self.in_flight[key]
+            results.update(fetched)
+        for key, future in following.items():
+            results[key] = await asyncio.shield(future)
+        return results
+
+MARKET_DATA_FLIGHTS = AsyncSingleFlight()
+
+async def shared_flights(flights, keys, fetch, abandoned=None):
+    # do_many over one of app.py's SingleFlight registries (summaries, profiles), so these handlers
+    # and app.py's threads (pre-summarization, profile rebuilds) coalesce with each other: either
+    # side may lead, and coroutines wait on the leader's concurrent Future without holding a thread.
+    # A cancelled leader settles its keys with `abandoned`, or an error when that is None.
+    claims = {key: flights.lead_or_follow(key) for key in dict.fromkeys(keys)}
+    leading = [key for key, (_, lead) in claims.items() if lead]
+    results = {}
+    if leading:
+        try:
+            fetched = await fetch(leading)
+            for key in leading:
+                claims[key][0].set_result(fetched[key])
+        except BaseException as e:
+            for key in leading:
+                future = claims[key][0]
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                elif abandoned is not None:
+                    future.set_result(abandoned)
+                else:
+                    future.set_exception(RuntimeError("The request computing this result was cancelled."))
+            raise
+        finally:
+            for key in leading:
+                flights.done(key)
+        results.update(fetched)
+    for key, (future, lead) in claims.items():
+        if not lead:
+            results[key] = await asyncio.shield(asyncio.wrap_future(future)) # A cancelled waiter leaves the Future alone
+    return results
+
+async def shared_flight(flights, key, compute, abandoned=None):
+    async def fetch(_keys):
+        return {key: await compute()}
+    return (await shared_flights(flights, [key], fetch, abandoned))[key]
+
+
+# --- Company Resolution ---
+async def get_company_domain(company_name):
+    cached = await asyncio.to_thread(core.get_cached_resolution, "domain", company_name)
+    if cached is not CACHE_MISS: return cached
+    if not GEMINI: return None
+    try:
+        response = await GEMINI.generate_content(core.domain_prompt(company_name), endpoint="resolution")
+        domain = core.clean_domain(response.text if response.parts else None)
+        await asyncio.to_thread(core.cache_resolution, "domain", company_name, domain, negative=domain is None)
+        return domain
+    except Exception as e:
+        logging.error(f"Error getting domain for {company_name} from Gemini: {e}")
+        return None
+
+async def get_logo_url(company_name):
+    return core.logo_url_for_domain(await get_company_domain(company_name))
+
+async def lookup_ticker(company_name):
+    # (ticker, error), as app.lookup_ticker_with_gemini
+    cached = await asyncio.to_thread(core.get_cached_resolution, "ticker", company_name)
+    if cached is not CACHE_MISS: return cached, None
+    if not GEMINI: return "UNKNOWN", "AI model not available for ticker lookup."
+    try:
+        response = await GEMINI.generate_content(core.ticker_prompt(company_name), endpoint="resolution")
+        ticker = core.clean_ticker(response.text if response.parts else None)
+        logging.info(f"Gemini ticker for {company_name}: {ticker}")
+        await asyncio.to_thread(core.cache_resolution, "ticker", company_name, ticker, negative=not core.is_tradable_ticker(ticker))
+        return ticker, None
+    except Exception as e:
+        logging.error(f"Gemini ticker error for {company_name}: {e}")
+        return "UNKNOWN", f"Error looking up ticker: {str(e)}"
+
+async def get_ticker(company_name):
+    return (await lookup_ticker(company_name))[0]
+
+async def resolve_companies(company_names):
+    # Async counterpart of app.resolve_companies_with_gemini: one prompt for the whole watchlist
+    resolved = {}
+    cached = await asyncio.to_thread(lambda: [(core.get_cached_resolution("ticker", name), core.get_cached_resolution("domain", name)) for name in company_names])
+    for name, (ticker, domain) in zip(company_names, cached):
+        if ticker is not CACHE_MISS and domain is not CACHE_MISS:
+            resolved[name] = {"ticker": ticker, "domain": domain}
+    to_resolve = [name for name in company_names if name not in resolved]
+
+    if GEMINI and to_resolve:
+        try:
+            response = await GEMINI.generate_content(core.batch_resolution_prompt(to_resolve), endpoint="resolution")
+            resolved.update(await asyncio.to_thread(core.apply_batch_resolution, response.text if response.parts else None, to_resolve))
+        except Exception as e:
+            logging.error(f"Gemini batch ticker/domain resolution failed for {len(company_names)} companies: {e}")
+
+    async def single(name):
+        logging.info(f"Batch resolution missed '{name}', falling back to single lookups.")
+        (ticker, ticker_error), domain = await asyncio.gather(lookup_ticker(name), get_company_domain(name))
+        return {"ticker": ticker, "domain": domain, "ticker_error": ticker_error}
+
+    missed = [name for name in company_names if name not in resolved]
+    resolved.update(zip(missed, await asyncio.gather(*(single(name) for name in missed))))
+    return resolved
+
+
+# --- Market Data ---
+async def cached_market_data(kind, cache, ttl, symbols, fetch_uncached):
+    # Same contract as app.cached_market_data, coalescing misses across coroutines instead of threads
+    results, missing = {}, []
+    for t, cached in zip(symbols, await asyncio.to_thread(lambda: [cache.get(t) for t in symbols])):
+        if cached is CACHE_MISS:
+            missing.append(t)
+        else:
+            results[t] = (cached, None)
+
+    async def fetch(keys):
+        fetched = await fetch_uncached([key.split(":", 1)[1] for key in keys])
+
+        def store():
+            for t, (data, _) in fetched.items():
+                if data is not None:
+                    cache.set(t, data, ttl() if callable(ttl) else ttl)
+        await asyncio.to_thread(store)
+        return {f"{kind}:{t}": result for t, result in fetched.items()}
+
+    if missing:
+        fetched = await MARKET_DATA_FLIGHTS.do_many([f"{kind}:{t}" for t in missing], fetch)
+        results.update({key.split(":", 1)[1]: result for key, result in fetched.items()})
+    return results
+
+async def fetch_fmp_quotes_uncached(symbols):
+    try:
+        with METRICS.span("fmp", "quote"):
+            response = await HTTP_CLIENT.get(core.fmp_quote_url(symbols), timeout=10)
+            response.raise_for_status()
+            data = response.json()
+        return core.parse_fmp_quotes(data, symbols)
+    except httpx.HTTPStatusError as http_err:
+        logging.error(f"FMP quote HTTP error for {symbols}: {http_err}")
+        return {t: (None, f"Error fetching FMP quote (HTTP {http_err.response.status_code}).") for t in symbols}
+    except Exception as e:
+        logging.error(f"FMP quote general error for {symbols}: {e}")
+        return {t: (None, f"Error fetching FMP quote: {str(e)}") for t in symbols}
+
+async def fetch_fmp_historical_chunk(url, chunk):
+    try:
+        with METRICS.span("fmp", "historical"):
+            response = await HTTP_CLIENT.get(url, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+        return await asyncio.to_thread(core.apply_price_history_response, data, chunk)
+    except httpx.HTTPStatusError as http_err:
+        logging.error(f"FMP historical HTTP error for {chunk}: {http_err}")
+        return {t: (None, f"Error fetching FMP historical (HTTP {http_err.response.status_code}).") for t in chunk}
+    except Exception as e:
+        logging.error(f"FMP historical data general error for {chunk}: {e}")
+        return {t: (None, f"Error fetching FMP historical data: {str(e)}") for t in chunk}
+
+async def refresh_price_history_uncached(symbols):
+    # app.refresh_price_history_uncached with the FMP_HISTORICAL_BATCH_SIZE chunks fetched concurrently
+    chunk_requests = await asyncio.to_thread(core.price_history_requests, symbols)
+    results = {}
+    for chunk_results in await asyncio.gather(*(fetch_fmp_historical_chunk(url, chunk) for url, chunk in chunk_requests)):
+        results.update(chunk_results)
+    return results
+
+async def fetch_fmp_quotes(ticker_symbols):
+    symbols = list(dict.fromkeys(t.upper() for t in ticker_symbols))
+    return await cached_market_data("quote", core.QUOTE_CACHE, core.QUOTE_CACHE_TTL, symbols, fetch_fmp_quotes_uncached)
+
+async def fetch_fmp_historicals(ticker_symbols):
+    symbols = list(dict.fromkeys(t.upper() for t in ticker_symbols))
+    refreshed = await cached_market_data("historical", core.HISTORICAL_CACHE, core.seconds_until_next_utc_day, symbols, refresh_price_history_uncached)
+    return await asyncio.to_thread(core.price_history_results, refreshed)
+
+async def get_stock_data(ticker_symbol):
+    # Same (stock_info, error) contract as app.stock_data_tasks' "stock" node
+    if not core.is_tradable_ticker(ticker_symbol):
+        return None, None
+    if not core.FMP_API_KEY:
+        return None, "FinancialModelingPrep API Key not configured."
+    quotes, historicals = await asyncio.gather(fetch_fmp_quotes([ticker_symbol]), fetch_fmp_historicals([ticker_symbol]))
+    return core.combine_fmp_stock_data(quotes[ticker_symbol.upper()], historicals[ticker_symbol.upper()])
+
+
+# --- Company Insights ---
+async def get_recommendation(company_name, stock_data=None):
+    settled, source = await asyncio.to_thread(core.settled_recommendation, stock_data)
+    if settled:
+        METRICS.inc("econdecode_recommendations_total", source=source)
+        return settled, None
+    try:
+        response = await GEMINI.generate_content(
+            core.recommendation_prompt(company_name, stock_data), generation_config=core.recommendation_generation_config(), endpoint="insights"
+        )
+        recommendation, error = core.recommendation_from_response(company_name, response)
+        if not error:
+            await asyncio.to_thread(core.remember_recommendation, stock_data, recommendation)
+        return recommendation, error
+    except Exception as e:
+        logging.error(f"Gemini recommendation error for {company_name}: {e}", exc_info=True)
+        return "N/A", f"Error getting AI recommendation: {str(e)}"
+
+async def generate_insight_text(prompt_text, generation_config):
+    try:
+        return core.insight_text_from_response(await GEMINI.generate_content(prompt_text, generation_config=generation_config, endpoint="insights"))
+    except Exception as e:
+        text = f"Error fetching this insight. ({e})" # Match teammate's error format
+        return text, text
+
+async def generate_combined_insights(company_name, stock_data, prompts, generation_config):
+    with_recommendation = (await asyncio.to_thread(core.settled_recommendation, stock_data))[0] is None
+    prompt, combined_config = core.combined_insights_request(company_name, stock_data, prompts, generation_config, with_recommendation)
+    try:
+        response = await GEMINI.generate_content(prompt, generation_config=combined_config, endpoint="insights")
+        combined = core.combined_insights_from_response(company_name, response, prompts, with_recommendation)
+        if "recommendation" in combined:
+            await asyncio.to_thread(core.remember_recommendation, stock_data, combined["recommendation"])
+        return combined
+    except Exception as e:
+        logging.warning(f"Combined insights for {company_name} failed, falling back to per-field prompts: {e}")
+        return {}
+
+async def get_insights(company_name, stock_future, prompts, generation_config):
+    # Async counterpart of app.insight_tasks + assemble_insights. stock_future resolves to (stock_data, error);
+    # without consolidated prompts the free-text fields start before it does.
+    combined = {}
+    if core.GEMINI_CONSOLIDATED_PROMPTS:
+        combined = await generate_combined_insights(company_name, (await stock_future)[0], prompts, generation_config)
+
+    async def recommendation():
+        if "recommendation" in combined:
+            return combined["recommendation"], None
+        return await get_recommendation(company_name, (await stock_future)[0])
+
+    async def insight(key, prompt_text):
+        if key in combined:
+            return combined[key], None
+        return await generate_insight_text(prompt_text, generation_config)
+
+    values = await asyncio.gather(recommendation(), *(insight(key, prompt_text) for key, prompt_text in prompts.items()))
+    return core.assemble_insights(dict(zip(["recommendation", *prompts], values)), prompts)
+
+async def build_watched_company_profile(company_name):
+    ticker_future = asyncio.ensure_future(lookup_ticker(company_name))
+
+    async def stock():
+        return await get_stock_data((await ticker_future)[0])
+
+    stock_future = asyncio.ensure_future(stock())
+    prompts = core.get_watched_company_brief_prompts(company_name)
+    logo_url, profile_details = await asyncio.gather(
+        get_logo_url(company_name), get_insights(company_name, stock_future, prompts, core.watched_company_brief_config())
+    )
+    ticker, ticker_error = await ticker_future
+    stock_data, stock_error = await stock_future
+    return {
+        "company_name": company_name,
+        "ticker_symbol": ticker or "N/A",
+        "ticker_error": ticker_error,
+        "logo_url": logo_url,
+        "stock_data": stock_data,
+        "stock_error": stock_error,
+        "profile_details": profile_details
+    }
+
+async def build_watched_company_profiles(company_names):
+    # Async counterpart of app.build_watched_company_profiles: one resolution prompt, one quote call,
+    # chunked history, then every company's brief concurrently.
+    resolved = await resolve_companies(company_names)
+    tradable = [r["ticker"] for r in resolved.values() if core.is_tradable_ticker(r["ticker"])] if core.FMP_API_KEY else []
+
+    async def fetch_market_data():
+        quotes, historicals = await asyncio.gather(fetch_fmp_quotes(tradable), fetch_fmp_historicals(tradable))
+        return quotes, historicals, core.watchlist_price_analytics(historicals) # The whole watchlist in one pass
+
+    market_data = asyncio.ensure_future(fetch_market_data())
+
+    async def company_stock(name):
+        ticker = resolved[name]["ticker"]
+        if not core.is_tradable_ticker(ticker):
+            return None, None
+        if not core.FMP_API_KEY:
+            return None, "FinancialModelingPrep API Key not configured."
+        quotes, historicals, analytics = await market_data
+        return core.combine_fmp_stock_data(quotes[ticker.upper()], historicals[ticker.upper()], analytics.get(ticker.upper()))
+
+    async def profile(name):
+        stock_future = asyncio.ensure_future(company_stock(name))
+        prompts = core.get_watched_company_brief_prompts(name)
+        profile_details = await get_insights(name, stock_future, prompts, core.watched_company_brief_config())
+        stock_data, stock_error = await stock_future
+        return {
+            "company_name": name,
+            "ticker_symbol": resolved[name]["ticker"] or "N/A",
+            "ticker_error": resolved[name].get("ticker_error"),
+            "logo_url": core.logo_url_for_domain(resolved[name]["domain"]),
+            "stock_data": stock_data,
+            "stock_error": stock_error,
+            "profile_details": profile_details
+        }
+
+    return list(await asyncio.gather(*(profile(name) for name in company_names)))
+
+
+async def watched_company_profiles(company_names):
+    # Same snapshot handling as app.watched_company_profiles; rebuilds of stale ones run on app.py's refresh pool
+    snapshots = dict(zip(company_names, await asyncio.to_thread(lambda: [core.get_profile_snapshot(name) for name in company_names])))
+    missing = {core.profile_snapshot_key(name): name for name in company_names if snapshots[name] is None}
+
+    async def build(keys):
+        names = [missing[key] for key in keys]
+        profiles = await build_watched_company_profiles(names)
+        return dict(zip(keys, await asyncio.to_thread(lambda: [core.store_profile_snapshot(n, p) for n, p in zip(names, profiles)])))
+
+    built = await shared_flights(core.PROFILE_FLIGHTS, list(missing), build) if missing else {}
+    return [(snapshots[name] or core.snapshot_for_caller(built[core.profile_snapshot_key(name)], name))["profile"] for name in company_names]
+
+async def stream_profile_updates(watch):
+    # Async counterpart of app.stream_profile_updates, without its lifetime: an open stream holds no thread
+    # and a closed connection cancels the sleep
+    while True:
+        for event in await asyncio.to_thread(watch.poll):
+            yield event
+        yield ": keepalive\n\n"
+        await asyncio.sleep(core.PROFILE_PUSH_POLL_SECONDS)
+
+
+# --- Article Scraping ---
+class AsyncDomainThrottle:
+    # Event-loop counterpart of app.DomainThrottle, idle domains pruned the same way
+    def __init__(self, concurrency, min_interval):
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.semaphores = {}
+        self.next_start = {}
+        self.active = {}
+        self.prune_at = core.DOMAIN_THROTTLE_MIN_PRUNE_SIZE
+
+    def prune(self, now):
+        for domain in [d for d, start_at in self.next_start.items() if start_at <= now and d not in self.active]:
+            del self.semaphores[domain], self.next_start[domain]
+        self.prune_at = max(core.DOMAIN_THROTTLE_MIN_PRUNE_SIZE, 2 * len(self.semaphores))
+
+    @asynccontextmanager
+    async def slot(self, domain):
+        if len(self.semaphores) >= self.prune_at:
+            self.prune(time.time())
+        semaphore = self.semaphores.setdefault(domain, asyncio.Semaphore(self.concurrency))
+        self.active[domain] = self.active.get(domain, 0) + 1
+        try:
+            async with semaphore:
+                now = time.time()
+                start_at = max(now, self.next_start.get(domain, 0))
+                self.next_start[domain] = start_at + self.min_interval
+                if start_at > now:
+                    await asyncio.sleep(start_at - now)
+                yield
+        finally:
+            self.active[domain] -= 1
+            if not self.active[domain]:
+                del self.active[domain]
+
+SCRAPE_THROTTLE = AsyncDomainThrottle(core.SCRAPE_PER_DOMAIN_CONCURRENCY, core.SCRAPE_PER_DOMAIN_MIN_INTERVAL)
+
+async def download_article_html(url, cached=None):
+    # Same contract as app.download_article_html: (status, html, headers), validators sent from `cached`
+    headers = dict(core.SCRAPE_HEADERS)
+    if cached and cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+    async with SCRAPE_THROTTLE.slot(urlsplit(url).hostname or ""):
+        with METRICS.span("newspaper3k", "download"):
+            async with HTTP_CLIENT.stream("GET", url, headers=headers, timeout=core.SCRAPE_TIMEOUT, follow_redirects=True) as response:
+                if response.status_code == 304:
+                    return 304, None, response.headers
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "")
+                if content_type and "html" not in content_type.lower():
+                    raise ValueError(f"Unsupported content type '{content_type}'")
+                body = bytearray()
+                async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                    body.extend(chunk)
+                    if len(body) > core.SCRAPE_MAX_BYTES:
+                        raise ValueError(f"Page larger than {core.SCRAPE_MAX_BYTES} bytes")
+                return response.status_code, core.decode_html(body, content_type), response.headers
+
+async def scrape_article_text(url):
+    cached = await asyncio.to_thread(core.SCRAPE_CACHE.get, core.article_cache_key(url))
+    if cached is not CACHE_MISS and time.time() - cached["checked_at"] < core.SCRAPE_FRESH_SECONDS:
+        return cached["text"]
+    cached = cached if cached is not CACHE_MISS else None
+
+    try:
+        status, html, headers = await download_article_html(url, cached)
+        # newspaper3k parsing is CPU-bound, keep it off the event loop
+        return await asyncio.to_thread(core.store_scrape_result, url, cached, status, html, headers)
+    except Exception as e:
+        logging.warning(f"Scraping failed for URL {url}: {e}. Falling back to default content.")
+        return cached["text"] if cached else None # A stale copy beats the fallback text
+
+
+# --- Summaries and Chat ---
+async def summarize_article(article_url):
+    # Same (result, error, status) contract, caching and SUMMARY_FLIGHTS sharing as app.summarize_article
+    cache_key = core.article_cache_key(article_url)
+    cached = await asyncio.to_thread(core.SUMMARY_CACHE.get, cache_key)
+    if cached is not CACHE_MISS:
+        logging.info(f"Summary cache hit for URL: {article_url}")
+        return cached, None, 200
+
+    for _ in range(2):
+        result, error, status, leader_specific = await shared_flight(
+            core.SUMMARY_FLIGHTS, cache_key, lambda: compute_article_summary(article_url, cache_key), core.ABANDONED_SUMMARY
+        )
+        if not (error and leader_specific): # A background leader's limits or a dropped stream: try once more
+            break
+    return result, error, status
+
+async def compute_article_summary(article_url, cache_key):
+    cached = await asyncio.to_thread(core.SUMMARY_CACHE.get, cache_key)
+    if cached is not CACHE_MISS:
+        return cached, None, 200, False
+
+    content, scraped, error, status = core.summary_content_from_scrape(article_url, await scrape_article_text(article_url))
+    if error:
+        return None, error, status, False
+    try:
+        logging.info(f"Sending prompt to Gemini for summary (model: {core.GEMINI_MODEL_NAME})...")
+        response = await GEMINI.generate_content(core.build_summary_prompt(content), endpoint="summary")
+        result = core.parse_summary_response(core.summary_text_from_response(response))
+        logging.info(f"Parsed summary: {result['summary'][:30]}..., GenZ: {result['genz'][:30]}..., Impact: {result['impact'][:30]}..., Rating: {result['impactLevel']}")
+    except GeminiUnavailableError as e:
+        return None, str(e), 503, False
+    except Exception as e:
+        logging.error(f"Error during Gemini summary generation for {article_url}: {e}", exc_info=True)
+        return None, f"Failed to get or parse Gemini AI summary: {str(e)}", 500, False
+
+    if scraped: # Never cache a summary of the fallback text under the article's URL
+        await asyncio.to_thread(core.SUMMARY_CACHE.set, cache_key, result, core.SUMMARY_CACHE_TTL)
+    return result, None, 200, False
+
+async def stream_summary_events(article_url):
+    # Same events and SUMMARY_FLIGHTS leading/following as app.stream_summary_events
+    cache_key = core.article_cache_key(article_url)
+    cached = await asyncio.to_thread(core.SUMMARY_CACHE.get, cache_key)
+    if cached is not CACHE_MISS:
+        for event in core.summary_result_events(cached):
+            yield event
+        return
+
+    future, leading = core.SUMMARY_FLIGHTS.lead_or_follow(cache_key)
+    if not leading:
+        yield ": waiting for a summary already in progress\n\n"
+        result, error, _, leader_specific = await asyncio.shield(asyncio.wrap_future(future))
+        if error and leader_specific:
+            result, error, _ = await summarize_article(article_url)
+        if error:
+            yield core.sse_event({"error": error}, event="error")
+        else:
+            for event in core.summary_result_events(result):
+                yield event
+        return
+
+    outcome = core.ABANDONED_SUMMARY # Unless the stream completes
+    try:
+        async for item in lead_summary_stream(article_url, cache_key):
+            if isinstance(item, tuple): # Last item: the (result, error, status, leader_specific) for followers
+                outcome = item
+            else:
+                yield item
+    finally:
+        future.set_result(outcome)
+        core.SUMMARY_FLIGHTS.done(cache_key)
+
+async def lead_summary_stream(article_url, cache_key):
+    yield ": fetching article\n\n" # Comment line, flushes headers while we scrape
+    content, scraped, error, status = core.summary_content_from_scrape(article_url, await scrape_article_text(article_url))
+    if error:
+        yield core.sse_event({"error": error}, event="error")
+        yield None, error, status, False
+        return
+
+    full_text, sent, last_chunk = "", set(), None
+    try:
+        chunks = GEMINI.stream_generate_content(core.build_summary_prompt(content), endpoint="summary")
+        async for text, last_chunk in stream_text_chunks(chunks):
+            if not text:
+                continue
+            full_text += text
+            newly_done = [key for key in core.completed_summary_sections(full_text) if key not in sent]
+            if newly_done:
+                parsed = core.parse_summary_response(full_text)
+                for key in newly_done:
+                    sent.add(key)
+                    yield core.sse_event({"key": key, "value": parsed[key]}, event="section")
+        if not full_text:
+            if block_reason(last_chunk):
+                raise Exception(f"Content generation blocked by Gemini: {block_reason(last_chunk)}")
+            raise Exception("Gemini returned no usable text for summary.")
+    except Exception as e:
+        logging.error(f"Error during streamed Gemini summary for {article_url}: {e}", exc_info=True)
+        error = f"Failed to get or parse Gemini AI summary: {str(e)}"
+        yield core.sse_event({"error": error}, event="error")
+        yield None, error, 503 if isinstance(e, GeminiUnavailableError) else 500, False
+        return
+
+    result = core.parse_summary_response(full_text)
+    for key, _ in core.SUMMARY_SECTIONS:
+        if key not in sent:
+            yield core.sse_event({"key": key, "value": result[key]}, event="section")
+    if scraped:
+        await asyncio.to_thread(core.SUMMARY_CACHE.set, cache_key, result, core.SUMMARY_CACHE_TTL)
+    yield core.sse_event(result, event="done")
+    yield result, None, 200, False
+
+async def stream_chat_events(user_input):
+    # Same events as app.stream_chat_events: {"delta": text} per chunk, then "done" (or "error")
+    try:
+        deltas, last_chunk = [], None
+        async for text, last_chunk in stream_text_chunks(GEMINI.stream_generate_content(core.chat_prompt(user_input), endpoint="chat")):
+            if text:
+                deltas.append(text.replace('*', '').replace('#', '')) # Basic Markdown removal
+                yield core.sse_event({"delta": deltas[-1]})
+        if deltas:
+            await asyncio.to_thread(core.remember_chat_answer, user_input, "".join(deltas))
+        else:
+            if block_reason(last_chunk):
+                logging.warning(f"Gemini blocked content for chat: {block_reason(last_chunk)}")
+                fallback = f"Sorry, I couldn't generate a response for that due to content safety policy. (Reason: {block_reason(last_chunk)}). Please try asking differently."
+            else:
+                logging.warning("Gemini generated no text response or had unexpected structure for chat.")
+                fallback = "Sorry, I couldn't generate a response for that. Please try asking differently."
+            yield core.sse_event({"delta": fallback})
+        yield core.sse_event({}, event="done")
+    except Exception as e:
+        logging.error(f"Error with Gemini API in streaming chat: {e}", exc_info=True)
+        yield core.sse_event({"error": "An error occurred while processing your chat request. Please try again."}, event="error")
+
+
+# --- Product Image Pipeline ---
+async def identify_product(jpeg_bytes):
+    # Async counterpart of app.identify_product_with_gemini: (product, company, error)
+    prompt_parts = [core.PRODUCT_IDENTIFICATION_PROMPT, {"mime_type": "image/jpeg", "data": jpeg_bytes}]
+    logging.info(f"Sending {len(jpeg_bytes)} byte image to Gemini for product/company identification (model: {core.GEMINI_MODEL_NAME}).")
+    response_id = await GEMINI.generate_content(prompt_parts, endpoint="vision")
+    identified_product, identified_company, blocked_error = core.product_identification_from_response(response_id)
+    if blocked_error:
+        return None, None, blocked_error
+
+    if identified_company.lower() == "unknown" and identified_product.lower() != "unknown":
+        try:
+            logging.info(f"Product '{identified_product}' identified, attempting to find company via second Gemini call.")
+            company_res_gen = await GEMINI.generate_content(core.parent_company_prompt(identified_product), endpoint="vision")
+            identified_company = core.parent_company_from_response(identified_product, company_res_gen) or identified_company
+        except Exception as e_comp:
+            logging.warning(f"Error during fallback company identification for '{identified_product}': {e_comp}")
+
+    return identified_product, identified_company, None
+
+def hash_product_image(image_file):
+    img, jpeg_bytes = core.prepare_product_image(image_file)
+    return core.image_dhash(img), jpeg_bytes
+
+
+def conditional_json_response(request, version, last_modified, build_payload, cache_control):
+    # Starlette counterpart of core.conditional_response: 304 without building the body when current
+    etag = core.response_etag(version)
+    last_modified = core.http_last_modified(last_modified)
+    if_none_match = parse_etags(request.headers['if-none-match']) if 'if-none-match' in request.headers else None
+    not_modified = core.client_copy_current(if_none_match, parse_date(request.headers.get('if-modified-since')), etag, last_modified)
+    response = Response(status_code=304) if not_modified else JSONResponse(build_payload())
+    response.headers['ETag'] = f'W/"{etag}"'
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+# --- Routes ---
+@instrumented('/api/chat')
+async def chat_route(request):
+    if not GEMINI:
+        if core.GEMINI_API_KEY:
+             return JSONResponse({"error": "Chatbot failed to initialize. Check model name or API key in server logs."}, 503)
+        else:
+            return JSONResponse({"error": "Chatbot is not configured (API key missing)."}, 503)
+
+    data = await request_json(request)
+    user_input = data.get('message') if isinstance(data, dict) else None
+    if not user_input:
+        return JSONResponse({"error": "No message provided."}, 400)
+
+    cached_answer = await asyncio.to_thread(core.cached_chat_answer, user_input)
+    if cached_answer is not None:
+        logging.info(f"Chat cache hit: {user_input[:50]}...")
+        return event_stream_response(core.cached_chat_events(cached_answer)) if wants_event_stream(request) else JSONResponse({"response": cached_answer})
+
+    if wants_event_stream(request):
+        logging.info(f"Streaming chat prompt to Gemini (model: {core.GEMINI_MODEL_NAME}): {user_input[:50]}...")
+        return event_stream_response(stream_chat_events(user_input))
+
+    try:
+        logging.info(f"Sending prompt to Gemini (model: {core.GEMINI_MODEL_NAME}): {user_input[:50]}...")
+        response = await GEMINI.generate_content(core.chat_prompt(user_input), endpoint="chat")
+        answer, answered = core.chat_text_from_response(response)
+        if answered:
+            await asyncio.to_thread(core.remember_chat_answer, user_input, answer)
+        return JSONResponse({"response": answer})
+    except GeminiUnavailableError as e:
+        return JSONResponse({"error": f"{e} Please try again in a minute."}, 503)
+    except Exception as e:
+        logging.error(f"Error with Gemini API in chat: {e}", exc_info=True)
+        return JSONResponse({"error": "An error occurred while processing your chat request. Please try again."}, 500)
+
+@instrumented('/api/gemini-summary')
+async def gemini_summary_route(request):
+    if not GEMINI:
+        return JSONResponse({"error": "Summary service is unavailable (Gemini model not configured)."}, 503)
+
+    article_url = request.query_params.get('url')
+    if not article_url:
+        return JSONResponse({"error": "Missing url parameter"}, 400)
+
+    logging.info(f"Gemini summary requested for URL: {article_url}")
+    if wants_event_stream(request):
+        return event_stream_response(stream_summary_events(article_url))
+    result, error, status = await summarize_article(article_url)
+    if error:
+        return JSONResponse({"error": error}, status)
+    return JSONResponse(result)
+
+async def watched_company_profile_snapshot(company_name):
+    snapshot = await asyncio.to_thread(core.get_profile_snapshot, company_name)
+    if snapshot:
+        return snapshot
+
+    async def build():
+        profile = await build_watched_company_profile(company_name)
+        return await asyncio.to_thread(core.store_profile_snapshot, company_name, profile)
+
+    return core.snapshot_for_caller(await shared_flight(core.PROFILE_FLIGHTS, core.profile_snapshot_key(company_name), build), company_name)
+
+@instrumented('/api/company_profile')
+async def company_profile_route(request):
+    if not GEMINI: return JSONResponse({"error": "AI features unavailable."}, 503)
+    if request.method == 'GET':
+        company_name = (request.query_params.get('name') or '').strip()
+        if not company_name: return JSONResponse({"error": "Company name needed."}, 400)
+        logging.info(f"Fetching WATCHED company profile for: {company_name}")
+        snapshot = await watched_company_profile_snapshot(company_name)
+        return conditional_json_response(
+            request, ("profile", company_name, snapshot["built_at"]), snapshot["built_at"], lambda: snapshot["profile"], "private, no-cache"
+        )
+
+    data = await request_json(request)
+    if not isinstance(data, dict) or 'company_name' not in data:
+        return JSONResponse({"error": "Company name needed."}, 400)
+    company_name = data.get('company_name')
+    if not company_name: return JSONResponse({"error": "Company name cannot be empty."}, 400)
+
+    logging.info(f"Fetching WATCHED company profile for: {company_name}")
+    snapshot = await watched_company_profile_snapshot(company_name)
+    return JSONResponse(snapshot["profile"])
+
+@instrumented('/api/company_profiles')
+async def company_profiles_route(request):
+    if not GEMINI: return JSONResponse({"error": "AI features unavailable."}, 503)
+    data = await request_json(request)
+    if not isinstance(data, dict) or not isinstance(data.get('company_names'), list):
+        return JSONResponse({"error": "A list of company names is needed."}, 400)
+
+    company_names = core.dedupe_company_names(data['company_names'])
+    if not company_names: return JSONResponse({"error": "Company names cannot be empty."}, 400)
+    if len(company_names) > core.MAX_BATCH_COMPANIES:
+        return JSONResponse({"error": f"Too many companies (max {core.MAX_BATCH_COMPANIES} per request)."}, 400)
+
+    logging.info(f"Fetching WATCHED company profiles in batch for {len(company_names)} companies")
+    return JSONResponse({"profiles": await watched_company_profiles(company_names)})
+
+@instrumented('/api/company_profiles/stream')
+async def company_profiles_stream_route(request):
+    if not GEMINI: return JSONResponse({"error": "AI features unavailable."}, 503)
+    company_names = core.dedupe_company_names(request.query_params.getlist('name'))
+    if not company_names: return JSONResponse({"error": "Company names cannot be empty."}, 400)
+    if len(company_names) > core.MAX_BATCH_COMPANIES:
+        return JSONResponse({"error": f"Too many companies (max {core.MAX_BATCH_COMPANIES} per request)."}, 400)
+    return event_stream_response(stream_profile_updates(await asyncio.to_thread(core.ProfileWatch, company_names)))
+
+@instrumented('/api/analyze_product_image')
+async def analyze_product_image_route(request):
+    if not GEMINI:
+        return JSONResponse({"error": "AI model for image analysis is not available."}, 503)
+    if core.GEMINI_MODEL_NAME == 'gemini-pro':
+        return JSONResponse({"error": "Image analysis requires a multimodal AI model (e.g., Gemini Flash/Pro Vision). Current model may not support it."}, 503)
+
+    try:
+        form = await request_form(request)
+    except RequestTooLargeError:
+        return JSONResponse({"error": f"Upload too large (max {core.MAX_CONTENT_LENGTH // (1024 * 1024)} MB)."}, 413)
+    file = form.get('product_image')
+    if file is None or isinstance(file, str): return JSONResponse({"error": "No image file found in request."}, 400)
+    if not file.filename: return JSONResponse({"error": "No image selected."}, 400)
+
+    try:
+        # Decoding, downscaling and hashing are CPU-bound, as is the near-duplicate hash scan
+        try:
+            image_hash, jpeg_bytes = await asyncio.to_thread(hash_product_image, file.file)
+        finally:
+            await form.close() # Drop the spooled upload now rather than when the request ends
+        cached_identification = await asyncio.to_thread(core.find_cached_product_identification, image_hash)
+        if cached_identification:
+            identified_product, identified_company = cached_identification["product"], cached_identification["company"]
+            logging.info(f"Product image cache hit: Product='{identified_product}', Company='{identified_company}'")
+        else:
+            identified_product, identified_company, blocked_error = await identify_product(jpeg_bytes)
+            if blocked_error:
+                return JSONResponse({"error": blocked_error}, 400)
+            if identified_company.lower() != "unknown": # A clearer rescan may still succeed, so don't cache misses
+                await asyncio.to_thread(
+                    core.remember_product_identification, image_hash, {"product": identified_product, "company": identified_company}
+                )
+
+        if identified_company.lower() == "unknown":
+            return JSONResponse({
+                "error": "Could not definitively identify the parent company.",
+                "identified_product": identified_product,
+                "identified_company": "Unknown"
+            }, 404)
+
+        ticker = await get_ticker(identified_company)
+        stock_data, stock_error = None, None
+        if core.is_tradable_ticker(ticker):
+            stock_data, stock_error = await get_stock_data(ticker) if core.FMP_API_KEY else (None, "FinancialModelingPrep API Key not configured.")
+        prompts = core.get_product_analyzer_prompts(identified_company, core.product_stock_summary(stock_data, stock_error))
+        stock_future = asyncio.get_running_loop().create_future()
+        stock_future.set_result((stock_data, None))
+        profile_details, logo_url = await asyncio.gather(
+            get_insights(identified_company, stock_future, prompts, core.product_analyzer_config()), get_logo_url(identified_company)
+        )
+
+        return JSONResponse({
+            "identified_product": identified_product,
+            "identified_company": identified_company,
+            "ticker_symbol": ticker or "N/A",
+            "logo_url": logo_url,
+            "stock_data": stock_data,
+            "stock_error": stock_error,
+            "profile_details": profile_details
+        })
+
+    except GeminiUnavailableError as e:
+        return JSONResponse({"error": f"{e} Please try again in a minute."}, 503)
+    except core.PIL.UnidentifiedImageError:
+        logging.error("Invalid image file provided for analysis.")
+        return JSONResponse({"error": "Invalid or unsupported image file format."}, 400)
+    except (core.ProductImageTooLargeError, core.PIL.Image.DecompressionBombError) as e:
+        logging.warning(f"Rejected oversized product image: {e}")
+        return JSONResponse({"error": f"{e} Please upload a smaller photo."}, 413)
+    except Exception as e:
+        logging.error(f"Product image analysis server error: {e}", exc_info=True)
+        return JSONResponse({"error": f"An unexpected server error occurred during image analysis: {str(e)}"}, 500)
+
+
+async def attach_gemini_client():
+    # app.py initializes the model on its gemini-init thread; wrap it once that has finished
+    global GEMINI
+    await asyncio.to_thread(core.GEMINI_INIT_DONE.wait)
+    if core.GEMINI_MODEL:
+        GEMINI = AsyncGeminiClient(core.GEMINI_MODEL, HTTP_CLIENT)
+
+@asynccontextmanager
+async def lifespan(_app):
+    global HTTP_CLIENT, GEMINI_ATTACHED
+    HTTP_CLIENT = httpx.AsyncClient(limits=httpx.Limits(max_connections=ASGI_HTTP_MAX_CONNECTIONS, max_keepalive_connections=ASGI_HTTP_MAX_CONNECTIONS))
+    await asyncio.to_thread(core.start_background_workers) # Starts the model init, doesn't wait for it
+    GEMINI_ATTACHED = asyncio.create_task(attach_gemini_client())
+    try:
+        yield
+    finally:
+        GEMINI_ATTACHED.cancel()
+        await HTTP_CLIENT.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat_route, methods=['POST']),
+        Route('/api/gemini-summary', gemini_summary_route, methods=['GET']),
+        Route('/api/company_profile', company_profile_route, methods=['GET', 'POST']),
+        Route('/api/company_profiles', company_profiles_route, methods=['POST']),
+        Route('/api/company_profiles/stream', company_profiles_stream_route, methods=['GET']),
+        Route('/api/analyze_product_image', analyze_product_image_route, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(core.app, workers=ASGI_WSGI_THREADS)), # Dashboard, static files, /api/news, stats, metrics
+    ],
+    # Compresses the native routes; the Flask mount compresses its own responses, which this then passes through
+    middleware=[Middleware(GZipMiddleware, minimum_size=core.COMPRESS_MIN_BYTES, compresslevel=core.GZIP_COMPRESS_LEVEL)],
+    lifespan=lifespan,
+)
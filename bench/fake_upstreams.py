@@ -0,0 +1,275 @@
+# Local stand-ins for every upstream the app talks to, so throughput and latency can be
+# measured without NewsAPI, FMP or Gemini keys. One HTTP server serves:
+#   /newsapi/top-headlines, /newsapi/everything          NewsAPI v2 (point NEWS_API_BASE_URL at /newsapi/)
+#   /fmp/quote/<syms>, /fmp/historical-price-full/<syms> FMP v3 (point FMP_BASE_URL at /fmp)
+#   /v1beta/models/<model>:generateContent               Gemini REST (point GEMINI_API_URL at the server root)
+#   /v1beta/models/<model>:streamGenerateContent
+#   /v1beta/models/<model>                               model metadata (the app's startup health check)
+#   /articles/<n>                                        publisher pages for the newspaper3k scraper
+# Each upstream has its own latency (mean, +/-25% jitter) and error rate.
+#
+# Standalone: python bench/fake_upstreams.py --port 8765 --gemini-latency-ms 800 --gemini-error-rate 0.05
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+UPSTREAMS = ("newsapi", "fmp", "gemini", "articles")
+DEFAULT_LATENCY_MS = {"newsapi": 150, "fmp": 80, "gemini": 700, "articles": 200}
+ARTICLE_PARAGRAPH = (
+    "Central banks around the world kept interest rates on hold this quarter as inflation cooled "
+    "but remained above target. Economists said young workers entering the job market would feel "
+    "the effects first, through slower hiring and higher borrowing costs for cars and student loans. "
+)
+
+
+class UpstreamProfile:
+    def __init__(self, latency_ms, error_rate):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+
+    def delay(self):
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms * random.uniform(0.75, 1.25) / 1000.0)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+def ticker_for(company_name):
+    letters = re.sub(r"[^A-Za-z]", "", company_name).upper()
+    digits = re.sub(r"\D", "", company_name)
+    return (letters[:3] or "FAK") + digits[:3]
+
+
+def fake_quote(symbol):
+    price = 50 + (sum(map(ord, symbol)) % 400)
+    return {"symbol": symbol, "name": f"{symbol} Holdings", "price": float(price), "change": 1.25,
+            "changesPercentage": 0.84, "marketCap": price * 1_000_000_000}
+
+
+def fake_history(symbol, days, since=None):
+    # Weekday closes ending today, most recent first like FMP: the last `days` of them, or all from `since` on
+    price = fake_quote(symbol)["price"]
+    bars, day, i = [], date.today(), 0
+    while len(bars) < days and (since is None or day.isoformat() >= since):
+        if day.weekday() < 5:
+            bars.append({"date": day.isoformat(), "close": round(price * (1 - 0.0008 * i) + 2 * ((i * 7) % 5 - 2), 2)})
+            i += 1
+        day -= timedelta(days=1)
+    return {"symbol": symbol, "historical": bars}
+
+
+def fake_gemini_text(body):
+    parts = [p for c in body.get("contents", []) for p in c.get("parts", [])]
+    prompt = "\n".join(p.get("text", "") for p in parts)
+    has_image = any("inlineData" in p for p in parts)
+    schema = (body.get("generationConfig") or {}).get("responseSchema")
+
+    if schema:
+        fields = list((schema.get("properties") or {}).keys())
+        return json.dumps({f: ("Wait" if f == "recommendation" else f"Stand-in text for {f}.") for f in fields})
+    if "SECTION: Summary" in prompt:
+        return ("SECTION: Summary\nRates are on hold while inflation cools.\n"
+                "SECTION: GenZ Translation\nRates are chilling, prices are lowkey calming down.\n"
+                "SECTION: Impact on Young People\nHiring may slow and loans stay pricey for a while.\n"
+                "SECTION: Impact Rating\n3\n")
+    if "JSON object mapping each company name" in prompt:
+        names = re.findall(r"^- (.+)$", prompt, re.MULTILINE)
+        return json.dumps({n: {"ticker": ticker_for(n), "domain": f"{ticker_for(n).lower()}.example"} for n in names})
+    if has_image:
+        return "Product: Fizz Cola | Company: Fizz Beverages"
+    quoted = re.search(r"'([^']+)'", prompt)
+    if "stock ticker symbol" in prompt:
+        return ticker_for(quoted.group(1) if quoted else "Fake")
+    if "website domain" in prompt:
+        return f"{ticker_for(quoted.group(1) if quoted else 'Fake').lower()}.example"
+    if "investment signal" in prompt:
+        return "Wait"
+    return "This is a short stand-in answer from the fake Gemini upstream, long enough to look like a real one."
+
+
+def gemini_response(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": len(text) // 4}}
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeUpstream/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def begin(self, upstream):
+        # Returns False (after sending an error) when this call should fail
+        self.server.count(upstream)
+        profile = self.server.profiles[upstream]
+        profile.delay()
+        if profile.should_fail():
+            self.server.count(f"{upstream}_errors")
+            if upstream == "gemini":
+                self.send_json(503, {"error": {"code": 503, "message": "Fake overload", "status": "UNAVAILABLE"}})
+            else:
+                self.send_json(500, {"status": "error", "message": "Fake upstream failure"})
+            return False
+        return True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path, query = parts.path, parse_qs(parts.query)
+        if path.startswith("/newsapi/"):
+            if not self.begin("newsapi"): return
+            page = int(query.get("page", ["1"])[0])
+            page_size = int(query.get("pageSize", ["20"])[0])
+            base = f"http://{self.headers.get('Host')}"
+            articles = [{
+                "source": {"id": None, "name": f"Fake Wire {n % 7}"},
+                "title": f"Fake economy headline {n}",
+                "description": f"What headline {n} means for markets and young people.",
+                "url": f"{base}/articles/{n}",
+                "urlToImage": None,
+                "publishedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - n * 60)),
+            } for n in range((page - 1) * page_size, page * page_size)]
+            self.send_json(200, {"status": "ok", "totalResults": 500, "articles": articles})
+        elif path.startswith("/fmp/quote/"):
+            if not self.begin("fmp"): return
+            symbols = unquote(path[len("/fmp/quote/"):]).split(",")
+            self.send_json(200, [fake_quote(s.upper()) for s in symbols if s])
+        elif path.startswith("/fmp/historical-price-full/"):
+            if not self.begin("fmp"): return
+            symbols = [s.upper() for s in unquote(path[len("/fmp/historical-price-full/"):]).split(",") if s]
+            days = int(query.get("timeseries", ["400"])[0])
+            histories = [fake_history(s, days, query.get("from", [None])[0]) for s in symbols]
+            self.send_json(200, histories[0] if len(histories) == 1 else {"historicalStockList": histories})
+        elif re.match(r"^/v1beta/models/[^/:]+$", path): # models.get, the app's startup health check
+            self.server.count("gemini_model_info")
+            name = path[len("/v1beta/"):]
+            self.send_json(200, {"name": name, "baseModelId": name.split("/")[-1], "version": "001", "displayName": "Fake Gemini",
+                                 "inputTokenLimit": 1048576, "outputTokenLimit": 8192,
+                                 "supportedGenerationMethods": ["generateContent", "streamGenerateContent"]})
+        elif path.startswith("/articles/"):
+            article_id = path.rsplit("/", 1)[-1]
+            etag = f'"article-{article_id}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.server.count("articles_not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if not self.begin("articles"): return
+            html = (f"<html><head><title>Fake economy headline {article_id}</title></head><body><article>"
+                    f"<h1>Fake economy headline {article_id}</h1>"
+                    + "".join(f"<p>{ARTICLE_PARAGRAPH}</p>" for _ in range(8)) + "</article></body></html>").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(html)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(html)
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = urlsplit(self.path).path
+        if not re.match(r"^/v1beta/models/[^/]+:(generateContent|streamGenerateContent)$", path):
+            self.send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+        if not self.begin("gemini"): return
+        text = fake_gemini_text(body)
+        if path.endswith(":streamGenerateContent"):
+            step = max(1, len(text) // 4)
+            chunks = [gemini_response(text[i:i + step]) for i in range(0, len(text), step)]
+            if parse_qs(urlsplit(self.path).query).get("alt") == ["sse"]: # asgi_app's REST client
+                data = "".join(f"data: {json.dumps(chunk)}\r\n\r\n" for chunk in chunks).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else: # The SDK's REST transport reads a streamed JSON array of partial responses
+                self.send_json(200, chunks)
+        else:
+            self.send_json(200, gemini_response(text))
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, profiles):
+        super().__init__(address, FakeUpstreamHandler)
+        self.profiles = profiles
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+def add_upstream_arguments(parser):
+    for upstream in UPSTREAMS:
+        parser.add_argument(f"--{upstream}-latency-ms", type=float, default=DEFAULT_LATENCY_MS[upstream])
+        parser.add_argument(f"--{upstream}-error-rate", type=float, default=0.0)
+
+
+def profiles_from_args(args):
+    return {u: UpstreamProfile(getattr(args, f"{u}_latency_ms"), getattr(args, f"{u}_error_rate")) for u in UPSTREAMS}
+
+
+def start_fake_upstreams(profiles, host="127.0.0.1", port=0):
+    server = FakeUpstreamServer((host, port), profiles)
+    threading.Thread(target=server.serve_forever, name="fake-upstreams", daemon=True).start()
+    return server
+
+
+def app_environment(base_url):
+    # Environment that points app.py at a FakeUpstreamServer
+    return {
+        "NEWS_API_KEY": "bench", "FMP_API_KEY": "bench", "GEMINI_API_KEY": "bench",
+        "NEWS_API_BASE_URL": f"{base_url}/newsapi/",
+        "FMP_BASE_URL": f"{base_url}/fmp",
+        "GEMINI_API_URL": base_url,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake NewsAPI/FMP/Gemini/article upstreams.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+    server = start_fake_upstreams(profiles_from_args(args), args.host, args.port)
+    print(f"Fake upstreams listening on {server.base_url}. Point the app at them with:")
+    for name, value in app_environment(server.base_url).items():
+        print(f"  export {name}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
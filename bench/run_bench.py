@@ -0,0 +1,235 @@
+# Offline load test: starts the fake upstreams, launches app.py against them in a subprocess
+# (fresh cache/news databases each run), drives the hot endpoints at a fixed concurrency and
+# reports p50/p95/p99 latency, throughput, and how many upstream calls the app actually made.
+#
+#   python bench/run_bench.py --requests 200 --concurrency 16
+#   python bench/run_bench.py --scenarios summary --distinct 5 --gemini-latency-ms 1500 --gemini-error-rate 0.1
+#   python bench/run_bench.py --asgi   # serve through asgi_app.py on uvicorn instead of flask run
+#   python bench/run_bench.py --app-url http://127.0.0.1:5007   # an already running app (already pointed at fakes)
+#
+# --distinct controls how many different articles/companies/images are requested, so a low
+# value exercises the caches and a high one measures the cold path. --json prints a machine
+# readable report for comparing runs in CI.
+import argparse
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import PIL.Image
+import PIL.ImageDraw
+
+from fake_upstreams import add_upstream_arguments, profiles_from_args, start_fake_upstreams, app_environment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("news", "profile", "summary", "image")
+
+
+def product_images(count):
+    # Distinct synthetic "products": different shapes/colours so they hash apart
+    images = []
+    for i in range(count):
+        img = PIL.Image.new("RGB", (1600, 1200), (240, 240, 240))
+        draw = PIL.ImageDraw.Draw(img)
+        draw.rectangle([200 + 60 * i, 150, 900 + 40 * i, 1000 - 30 * i], fill=((70 * i) % 256, 40, 200 - (20 * i) % 200))
+        draw.ellipse([900, 200 + 50 * i, 1400, 800], fill=(200, (90 * i) % 256, 60))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def scenario_requests(name, distinct, upstream_url):
+    # Returns a function(session, i) that issues the i-th request of the scenario
+    if name == "news":
+        return lambda session, i: session.get("/api/news", params={"type": ("local", "global")[i % 2], "page": 1 + (i // 2) % distinct})
+    if name == "profile":
+        return lambda session, i: session.get("/api/company_profile", params={"name": f"Bench Company {i % distinct}"})
+    if name == "summary":
+        return lambda session, i: session.get("/api/gemini-summary", params={"url": f"{upstream_url}/articles/{i % distinct}"})
+    if name == "image":
+        images = product_images(distinct)
+        return lambda session, i: session.post("/api/analyze_product_image", files={"product_image": ("scan.jpg", images[i % distinct], "image/jpeg")})
+    raise ValueError(f"Unknown scenario '{name}'")
+
+
+class BenchSession:
+    # requests.Session bound to the app's base URL, one per worker thread
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def get(self, path, **kwargs):
+        return self.session.get(self.base_url + path, timeout=self.timeout, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.session.post(self.base_url + path, timeout=self.timeout, **kwargs)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100.0) - 1)) # Nearest rank
+    return sorted_values[index]
+
+
+def run_scenario(name, app_url, upstream_url, total, concurrency, distinct, timeout):
+    issue = scenario_requests(name, distinct, upstream_url)
+    local = threading.local()
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def one(i):
+        if not hasattr(local, "session"):
+            local.session = BenchSession(app_url, timeout)
+        start = time.perf_counter()
+        try:
+            status = issue(local.session, i).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        "scenario": name, "requests": total, "concurrency": concurrency, "distinct": distinct,
+        "ok": ok, "errors": total - ok, "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "rps": round(total / wall, 2) if wall else None, "wall_seconds": round(wall, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+def launch_app(upstream_url, port, workdir, asgi=False):
+    env = dict(os.environ)
+    env.update(app_environment(upstream_url))
+    env.update({
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "NEWS_DB_PATH": os.path.join(workdir, "news.sqlite3"),
+        "FLASK_APP": "app",
+    })
+    # Keep production-only throttles from dominating the numbers unless explicitly set
+    env.setdefault("GEMINI_RATE_PER_MINUTE", "100000")
+    env.setdefault("GEMINI_RATE_BURST", "1000")
+    env.setdefault("SCRAPE_PER_DOMAIN_MIN_INTERVAL", "0")
+    env.setdefault("SCRAPE_PER_DOMAIN_CONCURRENCY", "64")
+    env.setdefault("PRESUMMARIZE_TOP_N", "0") # Background warming would blur per-scenario numbers
+    log = open(os.path.join(workdir, "app.log"), "w")
+    if asgi:
+        command = [sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", str(port), "--no-access-log"]
+    else:
+        command = [sys.executable, "-m", "flask", "run", "--host", "127.0.0.1", "--port", str(port), "--with-threads", "--no-reload", "--no-debugger"]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    app_url = f"http://127.0.0.1:{port}"
+    # Time to serving news (/readyz), then to AI ready (/readyz/ai); scenarios start after both
+    startup = {}
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup, see {log.name}")
+        probe = "/readyz" if "ready_seconds" not in startup else "/readyz/ai"
+        try:
+            if requests.get(app_url + probe, timeout=2).ok:
+                key = "ready_seconds" if probe == "/readyz" else "ai_ready_seconds"
+                startup[key] = round(time.perf_counter() - started, 3)
+                if key == "ai_ready_seconds":
+                    return process, app_url, startup
+                continue
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"App did not become ready within 60s, see {log.name}")
+
+
+def print_report(report):
+    if report.get("startup"):
+        print(f"Startup: serving news after {report['startup']['ready_seconds']}s, AI ready after {report['startup']['ai_ready_seconds']}s\n")
+    header = f"{'scenario':<10}{'reqs':>6}{'conc':>6}{'ok':>6}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in report["scenarios"]:
+        print(f"{r['scenario']:<10}{r['requests']:>6}{r['concurrency']:>6}{r['ok']:>6}{r['errors']:>6}{r['rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+        if r["errors"]:
+            print(f"{'':<10}statuses: {r['statuses']}")
+    print("\nUpstream calls made by the app:")
+    for name, count in sorted(report["upstream_calls"].items()):
+        print(f"  {name:<24}{count}")
+    caches = {k: v for k, v in (report.get("cache_stats") or {}).items() if isinstance(v, dict) and "hits" in v}
+    if caches:
+        print("\nCache hit rates:")
+        for name, stats in caches.items():
+            lookups = stats["hits"] + stats["misses"]
+            rate = f"{100.0 * stats['hits'] / lookups:.1f}%" if lookups else "n/a"
+            print(f"  {name:<24}{rate:>8}  ({stats['hits']}/{lookups})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's hot endpoints against local fake upstreams.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct", type=int, default=10, help="Distinct articles/companies/images/pages per scenario")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request client timeout, seconds")
+    parser.add_argument("--app-url", help="Benchmark an already running app instead of launching one")
+    parser.add_argument("--app-port", type=int, default=5107)
+    parser.add_argument("--asgi", action="store_true", help="Launch asgi_app.py on uvicorn instead of the Flask dev server")
+    parser.add_argument("--upstream-port", type=int, default=0, help="Fake upstream port (0 picks a free one)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    upstreams = start_fake_upstreams(profiles_from_args(args), port=args.upstream_port)
+    process, startup = None, None
+    with tempfile.TemporaryDirectory(prefix="econdecode-bench-") as workdir:
+        try:
+            if args.app_url:
+                app_url = args.app_url.rstrip("/")
+            else:
+                process, app_url, startup = launch_app(upstreams.base_url, args.app_port, workdir, args.asgi)
+            results = []
+            for name in scenarios:
+                results.append(run_scenario(name, app_url, upstreams.base_url, args.requests, args.concurrency, args.distinct, args.timeout))
+            try:
+                cache_stats = requests.get(app_url + "/api/cache_stats", timeout=10).json()
+            except (requests.RequestException, ValueError):
+                cache_stats = None
+            report = {"startup": startup, "scenarios": results, "upstream_calls": upstreams.snapshot(), "cache_stats": cache_stats}
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=10)
+            upstreams.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -382,6 +382,46 @@ function renderNewsArticle(article, type) {
     `;
 }
 
+function isEventStream(response) {
+    return (response.headers.get('Content-Type') || '').includes('text/event-stream');
+}
+
+// Reads a text/event-stream body and calls onEvent(eventName, data) for each event.
+async function readServerSentEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    const dispatch = (rawEvent) => {
+        let eventName = 'message';
+        const dataLines = [];
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) eventName = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+        });
+        if (dataLines.length) onEvent(eventName, JSON.parse(dataLines.join('\n')));
+    };
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            dispatch(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+        }
+    }
+    if (buffer.trim()) dispatch(buffer);
+}
+
+function renderImpactScale(modalImpactScale, level) {
+    modalImpactScale.innerHTML = ''; 
+    for (let i = 1; i <= 5; i++) {
+        const dot = document.createElement('div');
+        dot.className = `w-5 h-5 sm:w-6 sm:h-6 rounded-full ${i <= level ? 'bg-red-500 dark:bg-red-400' : 'bg-gray-300 dark:bg-gray-600'}`;
+        modalImpactScale.appendChild(dot);
+    }
+}
+
 async function openModalWithArticle(articleUrl) {
     const url = decodeURIComponent(articleUrl);
     let currentArticleData = null;
@@ -428,7 +468,7 @@ async function openModalWithArticle(articleUrl) {
     if (modalImpactScale) modalImpactScale.innerHTML = "";
 
     try {
-        const response = await fetch(`/api/gemini-summary?url=${encodeURIComponent(url)}`);
+        const response = await fetch(`/api/gemini-summary?url=${encodeURIComponent(url)}&stream=1`);
         if (!response.ok) {
             let errorMsg = `Failed to load summary (Status: ${response.status})`;
             try {
@@ -437,7 +477,33 @@ async function openModalWithArticle(articleUrl) {
             } catch (e) { /* ignore */ }
             throw new Error(errorMsg);
         }
-        const data = await response.json();
+
+        let data = null;
+        if (isEventStream(response)) {
+            // Sections arrive one at a time; show each as soon as it is parsed
+            const sectionTargets = { summary: modalSummary, genz: modalGenZ, impact: modalImpact, impactLevel: modalImpactScale };
+            let streamError = null;
+            await readServerSentEvents(response, (eventName, payload) => {
+                if (eventName === 'section') {
+                    const target = sectionTargets[payload.key];
+                    if (!target) return;
+                    if (payload.key === 'impactLevel') renderImpactScale(target, payload.value || 0);
+                    else target.innerText = payload.value;
+                    if (modalTitle) modalTitle.innerText = articleDisplayTitle;
+                    if (modalSkeletonLoader) modalSkeletonLoader.style.display = 'none';
+                    const block = target.closest('.section-block');
+                    if (block && (payload.key === 'impactLevel' || payload.value)) block.style.display = 'block';
+                } else if (eventName === 'done') {
+                    data = payload;
+                } else if (eventName === 'error') {
+                    streamError = payload.error;
+                }
+            });
+            if (streamError) { throw new Error(streamError); }
+            if (!data) { throw new Error('The summary stream ended unexpectedly.'); }
+        } else {
+            data = await response.json();
+        }
         if (data.error) { throw new Error(data.error); }
 
         if (modalTitle) modalTitle.innerText = articleDisplayTitle;
@@ -445,15 +511,7 @@ async function openModalWithArticle(articleUrl) {
         if (modalGenZ) modalGenZ.innerText = data.genz || "No GenZ translation available.";
         if (modalImpact) modalImpact.innerText = data.impact || "No impact analysis available.";
 
-        if (modalImpactScale) {
-            modalImpactScale.innerHTML = ''; 
-            const level = data.impactLevel || 0;
-            for (let i = 1; i <= 5; i++) {
-                const dot = document.createElement('div');
-                dot.className = `w-5 h-5 sm:w-6 sm:h-6 rounded-full ${i <= level ? 'bg-red-500 dark:bg-red-400' : 'bg-gray-300 dark:bg-gray-600'}`;
-                modalImpactScale.appendChild(dot);
-            }
-        }
+        if (modalImpactScale) renderImpactScale(modalImpactScale, data.impactLevel || 0);
     } catch (error) {
         if (modalTitle) modalTitle.innerText = "Error Loading Analysis";
         if (modalSummary) modalSummary.innerText = error.message || "An unknown error occurred.";
@@ -716,11 +774,38 @@ async function sendMessage() {
     renderChatMessages(); 
 
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat?stream=1', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message: message })
         });
+        if (response.ok && isEventStream(response)) {
+            // Append tokens to a single bot message as they arrive
+            const botMessage = { id: generateUniqueId(), text: '', isBot: true };
+            await readServerSentEvents(response, (eventName, payload) => {
+                if (eventName === 'error') {
+                    state.isChatLoading = false;
+                    state.chatError = payload.error;
+                    if (!botMessage.text) botMessage.text = `Error: ${payload.error}`;
+                } else if (payload.delta) {
+                    if (state.isChatLoading) {
+                        state.isChatLoading = false;
+                        state.chatMessages.push(botMessage);
+                    }
+                    botMessage.text += payload.delta;
+                } else {
+                    return;
+                }
+                if (!state.chatMessages.includes(botMessage)) state.chatMessages.push(botMessage);
+                renderChatMessages();
+            });
+            state.isChatLoading = false;
+            if (!botMessage.text) {
+                state.chatError = 'Received an unexpected response from the bot.';
+                state.chatMessages.push({ id: generateUniqueId(), text: 'Received an unexpected response from the bot.', isBot: true });
+            }
+            return;
+        }
         const result = await response.json();
         state.isChatLoading = false; 
 
@@ -16,6 +16,9 @@ let tempWatchedCompanies = []; // For the modal
 // --- Other file-scoped variables ---
 let videoStream = null;
 let selectedProductFile = null;
+let profileUpdatesSource = null; // EventSource following server-side profile snapshot rebuilds
+let profileRefreshTimer = null; // Interval re-requesting the watchlist while the tab is visible
+const PROFILE_REFRESH_INTERVAL_MS = 60000;
 
 // === DOM Element References ===
 const insightsElements = {}; // insights.js specific elements
@@ -117,6 +120,7 @@ function renderCompanyProfileCard(companyName, fullProfileData, errorMsg, isProd
         stockPriceArrow: cardElement.querySelector('[data-role="stock-price-arrow"]'),
         stockDayChange: cardElement.querySelector('[data-role="stock-day-change"]'),
         stockMonthChange: cardElement.querySelector('[data-role="stock-month-change"]'),
+        stockAnalytics: cardElement.querySelector('[data-role="stock-analytics"]'),
         geminiInsightsContainer: cardElement.querySelector('[data-role="gemini-insights-container"]'),
         cardFooter: cardElement.querySelector('[data-role="card-footer"]'),
         addToWatchlistButton: cardElement.querySelector('[data-role="add-to-watchlist-button"]')
@@ -240,6 +244,15 @@ function renderCompanyProfileCard(companyName, fullProfileData, errorMsg, isProd
             const monthChangeNumeric = parseFloat(String(stock_data.month_change_percent || "0").replace(/[^0-9.-]+/g, ""));
             fields.stockMonthChange.className = `text-base sm:text-lg font-semibold ${monthChangeNumeric > 0 ? 'text-green-600 dark:text-green-400' : (monthChangeNumeric < 0 ? 'text-red-600 dark:text-red-400' : 'text-gray-700 dark:text-gray-200')}`;
 
+            // Longer-horizon stats from the server's price history, when it has enough of it
+            const analytics = stock_data.analytics;
+            const analyticsParts = analytics ? [
+                ["1W", analytics.return_1w], ["3M", analytics.return_3m], ["YTD", analytics.return_ytd],
+                ["Vol", analytics.volatility_3m], ["Max DD", analytics.max_drawdown]
+            ].filter(([, value]) => value !== null && value !== undefined).map(([label, value]) => `${label} ${formatStockValue(value, true)}`) : [];
+            fields.stockAnalytics.textContent = analyticsParts.join(' · ');
+            fields.stockAnalytics.classList.toggle('hidden', analyticsParts.length === 0);
+
         } else if (ticker_symbol && ticker_symbol.toUpperCase() !== 'PRIVATE' && ticker_symbol.toUpperCase() !== 'UNKNOWN') {
             fields.stockVitalsSection.classList.remove('hidden');
             const vitalsGrid = fields.stockVitalsSection.querySelector('.grid');
@@ -514,10 +527,8 @@ async function fetchCompanyProfile(companyObjectInState) {
     renderWatchedCompanies();
 
     try {
-        const response = await fetchApi('/api/company_profile', {
-            method: 'POST',
-            body: JSON.stringify({ company_name: companyObjectInState.name })
-        });
+        // GET so the browser can revalidate with If-None-Match and reuse its copy on a 304
+        const response = await fetchApi(`/api/company_profile?name=${encodeURIComponent(companyObjectInState.name)}`);
 
         const responseData = await response.json().catch(async () => {
             const textError = await response.text().catch(() => "Unparseable server response.");
@@ -545,6 +556,135 @@ async function fetchCompanyProfile(companyObjectInState) {
 }
 
 
+async function fetchCompanyProfilesBatch(companyObjectsInState) {
+    if (!companyObjectsInState.length) return;
+
+    companyObjectsInState.forEach(company => {
+        company.isLoading = true;
+        company.error = null;
+        company.data = null;
+    });
+    renderWatchedCompanies();
+
+    try {
+        const response = await fetchApi('/api/company_profiles', {
+            method: 'POST',
+            body: JSON.stringify({ company_names: companyObjectsInState.map(c => c.name) })
+        });
+
+        const responseData = await response.json().catch(async () => {
+            const textError = await response.text().catch(() => "Unparseable server response.");
+            throw new Error(`API Error (${response.status}): ${textError}`);
+        });
+
+        if (!response.ok || !Array.isArray(responseData.profiles)) {
+            throw new Error(responseData.error || `Failed to load watched profiles (Status: ${response.status})`);
+        }
+
+        const profilesByName = new Map(responseData.profiles.map(p => [String(p.company_name).toLowerCase(), p]));
+        companyObjectsInState.forEach(company => {
+            const profile = profilesByName.get(company.name.toLowerCase());
+            if (profile) {
+                company.data = profile;
+            } else {
+                company.error = `Server returned no profile for "${company.name}".`;
+            }
+        });
+    } finally {
+        companyObjectsInState.forEach(company => { company.isLoading = false; });
+        renderWatchedCompanies();
+    }
+}
+
+
+function applyPushedProfile(profile) {
+    const company = watchedCompanies.find(c => c.name.toLowerCase() === String(profile.company_name).toLowerCase());
+    if (!company || company.isLoading) return;
+    company.data = profile;
+    company.error = null;
+}
+
+// While the tab is visible the loaded watchlist is re-requested every PROFILE_REFRESH_INTERVAL_MS; the
+// server answers from its snapshots and rebuilds stale ones in the background. Hidden tabs ask for nothing.
+async function refreshWatchedProfiles() {
+    const names = watchedCompanies.filter(c => c.data && !c.isLoading).map(c => c.name).slice(0, 20); // MAX_BATCH_COMPANIES
+    if (!names.length) return;
+    try {
+        const response = await fetchApi('/api/company_profiles', { method: 'POST', body: JSON.stringify({ company_names: names }) });
+        if (!response.ok) return;
+        const responseData = await response.json();
+        (responseData.profiles || []).forEach(applyPushedProfile);
+        renderWatchedCompanies();
+    } catch (error) {
+        console.warn("Watchlist refresh failed:", error);
+    }
+}
+
+function startProfileRefresh() {
+    if (profileRefreshTimer) return;
+    profileRefreshTimer = setInterval(async () => {
+        if (document.hidden) return;
+        await refreshWatchedProfiles();
+        if (!profileUpdatesSource) connectProfileUpdates(); // The last stream ended or was refused
+    }, PROFILE_REFRESH_INTERVAL_MS);
+}
+
+function closeProfileUpdates() {
+    if (profileUpdatesSource) {
+        profileUpdatesSource.close();
+        profileUpdatesSource = null;
+    }
+}
+
+// Follows the server's profile snapshots for the loaded watchlist: when a background rebuild moves
+// the price, change or recommendation, the server pushes the new profile and the card re-renders.
+// A server that refuses the stream, or ends it, leaves the dashboard on the refresh interval alone.
+function connectProfileUpdates() {
+    closeProfileUpdates();
+    startProfileRefresh();
+    if (typeof EventSource === 'undefined') return;
+    const names = watchedCompanies.filter(c => c.data).map(c => c.name).slice(0, 20); // MAX_BATCH_COMPANIES
+    if (!names.length) return;
+
+    const query = names.map(name => `name=${encodeURIComponent(name)}`).join('&');
+    const source = new EventSource(`/api/company_profiles/stream?${query}`);
+    profileUpdatesSource = source;
+    source.addEventListener('profile', (event) => {
+        let payload;
+        try { payload = JSON.parse(event.data); } catch (e) { return; }
+        if (!payload.profile) return;
+        applyPushedProfile(payload.profile);
+        renderWatchedCompanies();
+    });
+    source.addEventListener('end', () => { if (profileUpdatesSource === source) closeProfileUpdates(); });
+    source.addEventListener('error', () => {
+        // A refused stream (503) is CLOSED; a dropped one is CONNECTING and reconnects by itself
+        if (source.readyState === EventSource.CLOSED && profileUpdatesSource === source) closeProfileUpdates();
+    });
+}
+
+
+const PRODUCT_UPLOAD_MAX_DIMENSION = 1024;
+
+// Shrinks large photos in the browser before upload; the server downscales further for the model.
+async function downscaleImageForUpload(file) {
+    try {
+        const bitmap = await createImageBitmap(file);
+        const scale = Math.min(1, PRODUCT_UPLOAD_MAX_DIMENSION / Math.max(bitmap.width, bitmap.height));
+        if (scale === 1 && file.size < 500 * 1024) return file;
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(bitmap.width * scale);
+        canvas.height = Math.round(bitmap.height * scale);
+        canvas.getContext('2d').drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+        const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.85));
+        if (!blob || blob.size >= file.size) return file;
+        return new File([blob], 'product.jpg', { type: 'image/jpeg' });
+    } catch (e) {
+        console.warn("Could not downscale image in the browser, uploading original:", e);
+        return file;
+    }
+}
+
 async function analyzeProductImage() {
     if (!selectedProductFile) {
         productAnalysis.error = "No image selected or captured to analyze.";
@@ -560,7 +700,7 @@ async function analyzeProductImage() {
     renderProductAnalysis();
 
     const formData = new FormData();
-    formData.append('product_image', selectedProductFile);
+    formData.append('product_image', await downscaleImageForUpload(selectedProductFile));
 
     try {
         const response = await fetch('/api/analyze_product_image', {
@@ -731,6 +871,18 @@ function handleProductFileSelection(event) {
 }
 
 async function loadWatchedCompaniesWithDelay(delay = 13000) { 
+    // Batch requests for the whole watchlist; anything a failed batch leaves unloaded falls back to one-by-one loading.
+    const batchSize = 20; // Matches MAX_BATCH_COMPANIES on the server
+    const companiesToBatch = watchedCompanies.filter(c => !c.data && !c.error && !c.isLoading);
+    for (let i = 0; i < companiesToBatch.length; i += batchSize) {
+        try {
+            await fetchCompanyProfilesBatch(companiesToBatch.slice(i, i + batchSize));
+        } catch (error) {
+            console.warn("Batch profile request failed, loading companies one by one:", error);
+        }
+    }
+    connectProfileUpdates();
+
     const companiesToFetch = watchedCompanies.filter(c => !c.data && !c.error && !c.isLoading);
 
     for (let i = 0; i < companiesToFetch.length; i++) {
@@ -741,6 +893,7 @@ async function loadWatchedCompaniesWithDelay(delay = 13000) {
             await new Promise(resolve => setTimeout(resolve, delay));
         }
     }
+    if (companiesToFetch.length) connectProfileUpdates();
 }
 
 function handleAddFromAnalyzerToWatchlist(event) {
@@ -766,7 +919,9 @@ function handleAddFromAnalyzerToWatchlist(event) {
         renderWatchedCompanies();
 
         if (!newCompany.data) {
-            fetchCompanyProfile(newCompany);
+            fetchCompanyProfile(newCompany).then(connectProfileUpdates);
+        } else {
+            connectProfileUpdates();
         }
 
         button.textContent = '✅ On Watchlist';
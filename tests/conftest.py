@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# app.py opens its SQLite stores at import time, so point them at a scratch directory first
+_STATE_DIR = tempfile.mkdtemp(prefix="econdecode-tests-")
+os.environ["CACHE_DB_PATH"] = os.path.join(_STATE_DIR, "cache.sqlite3")
+os.environ["NEWS_DB_PATH"] = os.path.join(_STATE_DIR, "news.sqlite3")
+os.environ["CACHE_BACKEND"] = "sqlite"
+os.environ.pop("GEMINI_API_KEY", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+class Clock:
+    # Stands in for time.time(), starting at the real time and only moving when advanced
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(app.time, "time", fake)
+    return fake
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+import app
+from app import CACHE_MISS, RedisTTLCache, SQLiteTTLCache, TTLCache
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    # TEST_REDIS_URL points at a real server; otherwise fakeredis serves the protocol on a local port
+    pytest.importorskip("redis")
+    if os.environ.get("TEST_REDIS_URL"):
+        yield os.environ["TEST_REDIS_URL"]
+        return
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def new_cache(request, tmp_path):
+    # new_cache(max_entries) -> an empty cache on the parametrized backend
+    def build(max_entries):
+        if request.param == "memory":
+            return TTLCache(max_entries)
+        if request.param == "sqlite":
+            return SQLiteTTLCache(str(tmp_path / "cache.sqlite3"), f"t_{uuid.uuid4().hex}", max_entries)
+        return RedisTTLCache(request.getfixturevalue("redis_url"), f"t_{uuid.uuid4().hex}", max_entries)
+    return build
+
+
+def test_miss_returns_default_and_none_is_a_cacheable_value(new_cache):
+    cache = new_cache(10)
+    cache.set("no-domain", None, 60)
+
+    assert cache.get("missing") is CACHE_MISS
+    assert cache.get("missing", "fallback") == "fallback"
+    assert cache.get("no-domain") is None
+    assert cache.get("no-domain", "fallback") is None
+
+
+def test_values_round_trip(new_cache):
+    cache = new_cache(10)
+    cache.set("quote", {"price": 189.5, "tags": ["tech"]}, 60)
+
+    assert cache.get("quote") == {"price": 189.5, "tags": ["tech"]}
+
+
+def test_entries_expire_after_their_ttl(new_cache):
+    cache = new_cache(10)
+    cache.set("short", 1, 0.2)
+    cache.set("long", 2, 60)
+    time.sleep(0.4) # Real time: Redis expires entries on its own clock
+
+    assert cache.get("short") is CACHE_MISS
+    assert cache.get("long") == 2
+    assert cache.keys() == ["long"]
+
+
+def test_least_recently_used_entry_is_evicted(new_cache, clock):
+    cache = new_cache(3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper(), 60)
+        clock.advance(1)
+    assert cache.get("a") == "A" # Now "b" is the least recently used
+    clock.advance(1)
+    cache.set("d", "D", 60)
+
+    assert cache.get("b") is CACHE_MISS
+    assert sorted(cache.keys()) == ["a", "c", "d"]
+    assert cache.stats()["size"] == 3
+
+
+def test_stats_count_hits_and_misses(new_cache):
+    cache = new_cache(10)
+    cache.set("a", 1, 60)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["max_entries"]) == (2, 1, 10)
+
+
+@pytest.mark.parametrize("backend, expected", [("memory", TTLCache), ("sqlite", SQLiteTTLCache), ("redis", RedisTTLCache)])
+def test_make_cache_follows_cache_backend(monkeypatch, backend, expected):
+    if backend == "redis":
+        pytest.importorskip("redis")
+    monkeypatch.setattr(app, "CACHE_BACKEND", backend)
+
+    assert isinstance(app.make_cache(f"t_{uuid.uuid4().hex}", 5), expected)
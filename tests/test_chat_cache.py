@@ -0,0 +1,70 @@
+from app import ChatResponseCache, TTLCache
+
+
+def new_chat_cache(store=None, max_entries=100, ttl=3600, min_similarity=0.8):
+    return ChatResponseCache(store or TTLCache(max_entries), max_entries, ttl, min_similarity)
+
+
+def test_exact_match_ignores_case_punctuation_and_spacing():
+    cache = new_chat_cache()
+    cache.set("What is inflation?", "Prices rising over time.")
+
+    assert cache.get("what is   INFLATION") == "Prices rising over time."
+    assert cache.stats()["hits"] == 1 and cache.stats()["similar_hits"] == 0
+
+
+def test_rephrased_question_is_a_similarity_hit():
+    cache = new_chat_cache()
+    cache.set("What is inflation?", "Prices rising over time.")
+
+    assert cache.get("Can you explain inflation please?") == "Prices rising over time." # Only stopwords differ
+    stats = cache.stats()
+    assert (stats["hits"], stats["similar_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_most_similar_question_wins():
+    cache = new_chat_cache(min_similarity=0.5)
+    cache.set("What is inflation?", "inflation answer")
+    cache.set("What is deflation?", "deflation answer")
+    cache.set("How do interest rates affect inflation?", "rates answer")
+
+    assert cache.get("explain deflation to me") == "deflation answer"
+    assert cache.get("interest rates and inflation") == "rates answer"
+
+
+def test_questions_below_min_similarity_miss():
+    cache = new_chat_cache(min_similarity=0.9)
+    cache.set("How do interest rates affect inflation?", "rates answer")
+
+    assert cache.get("Why is inflation high in Europe?") is None
+    assert cache.get("What is a stock?") is None # No shared term at all
+    assert cache.stats()["misses"] == 2
+
+
+def test_similarity_hits_stop_after_ttl(clock):
+    cache = new_chat_cache(ttl=60)
+    cache.set("What is inflation?", "Prices rising over time.")
+    clock.advance(61)
+
+    assert cache.get("explain inflation") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_similarity_index_is_lru_bounded():
+    cache = new_chat_cache(max_entries=2)
+    cache.set("What is inflation?", "inflation answer")
+    cache.set("What is deflation?", "deflation answer")
+    cache.set("What is a recession?", "recession answer")
+
+    assert cache.stats()["size"] == 2
+    assert cache.get("explain inflation") is None
+
+
+def test_another_worker_answer_is_found_and_indexed():
+    store = TTLCache(100)
+    new_chat_cache(store).set("What is inflation?", "Prices rising over time.")
+    other_worker = new_chat_cache(store)
+
+    assert other_worker.get("explain inflation") is None # Not in this worker's similarity index yet
+    assert other_worker.get("what is inflation") == "Prices rising over time."
+    assert other_worker.get("explain inflation") == "Prices rising over time."
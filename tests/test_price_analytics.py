@@ -0,0 +1,111 @@
+import math
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app import compute_price_analytics
+
+
+def make_series(closes, last_day=date(2024, 6, 28)):
+    # (dates, closes) as PriceHistoryStore.series returns them, one calendar day apart
+    days = [last_day - timedelta(days=len(closes) - 1 - i) for i in range(len(closes))]
+    return np.array([d.isoformat() for d in days], dtype="datetime64[D]"), np.array(closes, dtype=np.float64)
+
+
+def pct(now, then):
+    return round((now / then - 1) * 100, 2)
+
+
+def reference_analytics(closes):
+    # The same metrics, one series at a time, with plain Python
+    returns = {name: pct(closes[-1], closes[-1 - days]) if len(closes) > days else None
+               for name, days in (("return_1w", 5), ("return_1m", 21), ("return_3m", 63))}
+    window = closes[-64:]
+    log_returns = [math.log(b / a) for a, b in zip(window, window[1:])]
+    volatility = None
+    if len(log_returns) >= 20:
+        mean = sum(log_returns) / len(log_returns)
+        variance = sum((r - mean) ** 2 for r in log_returns) / (len(log_returns) - 1)
+        volatility = round(math.sqrt(variance) * math.sqrt(252) * 100, 2)
+    peak, drawdowns = 0.0, []
+    for close in closes:
+        peak = max(peak, close)
+        drawdowns.append((close / peak - 1) * 100)
+    return {
+        **returns,
+        "volatility_3m": volatility,
+        "drawdown": round(drawdowns[-1], 2),
+        "max_drawdown": round(min(drawdowns), 2),
+        "sma_20": round(sum(closes[-20:]) / 20, 2) if len(closes) >= 20 else None,
+        "sma_50": round(sum(closes[-50:]) / 50, 2) if len(closes) >= 50 else None,
+        "history_days": len(closes),
+    }
+
+
+def without_ytd(analytics):
+    return {k: v for k, v in analytics.items() if k not in ("return_ytd", "as_of")}
+
+
+def test_steady_growth():
+    closes = [100 * 1.01 ** i for i in range(100)]
+    result = compute_price_analytics([make_series(closes)])[0]
+
+    assert result["return_1w"] == pct(1.01 ** 5, 1)
+    assert result["return_1m"] == pct(1.01 ** 21, 1)
+    assert result["return_3m"] == pct(1.01 ** 63, 1)
+    assert result["volatility_3m"] == 0.0 # Identical daily returns
+    assert result["drawdown"] == result["max_drawdown"] == 0.0
+    assert result["sma_20"] == round(sum(closes[-20:]) / 20, 2)
+    assert result["history_days"] == 100
+    assert result["as_of"] == "2024-06-28"
+
+
+def test_matches_reference_for_series_of_different_lengths():
+    rng = random.Random(7)
+    series = []
+    for length in (120, 64, 30, 8, 1):
+        closes = [50.0]
+        for _ in range(length - 1):
+            closes.append(closes[-1] * math.exp(rng.gauss(0, 0.02)))
+        series.append(closes)
+
+    results = compute_price_analytics([make_series(closes) for closes in series])
+
+    for closes, result in zip(series, results):
+        assert without_ytd(result) == pytest.approx(reference_analytics(closes), abs=0.011)
+
+
+def test_batched_results_match_single_series_results():
+    long, short = make_series([10, 12, 9, 11, 13, 8, 14] * 10), make_series([5, 4, 6])
+
+    assert compute_price_analytics([long, short]) == [compute_price_analytics([long])[0], compute_price_analytics([short])[0]]
+
+
+def test_missing_and_empty_series_give_none():
+    empty = (np.array([], dtype="datetime64[D]"), np.array([], dtype=np.float64))
+    results = compute_price_analytics([None, make_series([1.0, 2.0]), empty])
+
+    assert results[0] is None and results[2] is None
+    assert results[1]["history_days"] == 2
+    assert compute_price_analytics([None]) == [None]
+    assert compute_price_analytics([]) == []
+
+
+def test_drawdown_from_running_peak():
+    result = compute_price_analytics([make_series([100, 120, 90, 110, 60, 80])])[0]
+
+    assert result["max_drawdown"] == -50.0 # 120 -> 60
+    assert result["drawdown"] == pct(80, 120)
+
+
+def test_year_to_date_uses_last_close_before_january_first():
+    year = datetime.now(timezone.utc).year
+    dates = np.array([f"{year - 1}-12-30", f"{year - 1}-12-31", f"{year}-01-02", f"{year}-01-03"], dtype="datetime64[D]")
+    result = compute_price_analytics([(dates, np.array([50.0, 40.0, 44.0, 48.0]))])[0]
+
+    assert result["return_ytd"] == 20.0
+
+    this_year_only = (dates[2:], np.array([44.0, 48.0]))
+    assert compute_price_analytics([this_year_only])[0]["return_ytd"] is None
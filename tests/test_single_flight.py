@@ -0,0 +1,105 @@
+import threading
+import time
+
+from app import SingleFlight
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def in_thread(func, *args):
+    # Starts func(*args) on a thread; the returned dict gets its "value" or "error" once joined
+    outcome = {}
+    def run():
+        try:
+            outcome["value"] = func(*args)
+        except Exception as e:
+            outcome["error"] = e
+    outcome["thread"] = threading.Thread(target=run)
+    outcome["thread"].start()
+    return outcome
+
+
+def test_follower_shares_leader_result():
+    flights, release, calls = SingleFlight(), threading.Event(), []
+
+    def fetch():
+        calls.append("leader")
+        release.wait(5)
+        return "quote"
+
+    leader = in_thread(flights.do, "AAPL", fetch)
+    wait_for(lambda: flights.stats()["in_flight"] == 1)
+    follower = in_thread(flights.do, "AAPL", lambda: calls.append("follower"))
+    wait_for(lambda: flights.stats()["coalesced"] == 1)
+    release.set()
+    leader["thread"].join(5)
+    follower["thread"].join(5)
+
+    assert leader["value"] == follower["value"] == "quote"
+    assert calls == ["leader"]
+    assert flights.stats() == {"in_flight": 0, "coalesced": 1}
+
+
+def test_follower_gets_leader_exception_and_next_call_retries():
+    flights, release = SingleFlight(), threading.Event()
+
+    def failing_fetch():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    leader = in_thread(flights.do, "AAPL", failing_fetch)
+    wait_for(lambda: flights.stats()["in_flight"] == 1)
+    follower = in_thread(flights.do, "AAPL", lambda: "unused")
+    wait_for(lambda: flights.stats()["coalesced"] == 1)
+    release.set()
+    leader["thread"].join(5)
+    follower["thread"].join(5)
+
+    assert isinstance(leader["error"], RuntimeError)
+    assert follower["error"] is leader["error"]
+    assert flights.stats()["in_flight"] == 0
+    assert flights.do("AAPL", lambda: "recovered") == "recovered" # Failures are not remembered
+
+
+def test_do_many_only_fetches_keys_nobody_else_is_fetching():
+    flights, release, fetched = SingleFlight(), threading.Event(), []
+
+    def fetch(keys):
+        fetched.append(list(keys))
+        if "A" in keys:
+            release.wait(5)
+        return {key: key.lower() for key in keys}
+
+    first = in_thread(flights.do_many, ["A", "B"], fetch)
+    wait_for(lambda: flights.stats()["in_flight"] == 2)
+    second = in_thread(flights.do_many, ["B", "C", "C"], fetch)
+    wait_for(lambda: ["C"] in fetched)
+    release.set()
+    first["thread"].join(5)
+    second["thread"].join(5)
+
+    assert fetched == [["A", "B"], ["C"]]
+    assert first["value"] == {"A": "a", "B": "b"}
+    assert second["value"] == {"B": "b", "C": "c"}
+    assert flights.stats() == {"in_flight": 0, "coalesced": 1}
+
+
+def test_lead_or_follow_hands_the_future_to_followers():
+    flights = SingleFlight()
+    future, leading = flights.lead_or_follow("summary:1")
+    same_future, follower_leads = flights.lead_or_follow("summary:1")
+
+    assert leading and not follower_leads
+    assert same_future is future
+    future.set_result("done")
+    flights.done("summary:1")
+    assert same_future.result(0) == "done"
+
+    _, leads_again = flights.lead_or_follow("summary:1")
+    assert leads_again